@@ -0,0 +1,450 @@
+"""
+Banc de performance du moteur de tarification, des équipements et du PDF.
+
+Chaque banc mesure une opération sur plusieurs échantillons (après un appel
+d'échauffement) et rapporte les percentiles du temps par appel, puis le pic
+de mémoire allouée par un appel (tracemalloc, mesuré à part pour ne pas
+fausser les temps).
+
+Les résultats peuvent être enregistrés comme référence (JSON) ; les
+exécutions suivantes s'y comparent et échouent (code de sortie 1) si le
+temps médian ou le pic de mémoire d'un banc dépasse la référence de plus du
+seuil.
+
+Usage :
+    python banc_performance.py --enregistrer          # nouvelle référence
+    python banc_performance.py [--seuil 0.2]          # comparaison
+    python banc_performance.py --selection pdf equipements
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+# Référence par défaut (à régénérer sur la machine qui compare)
+FICHIER_REFERENCE = Path(__file__).with_name("banc_performance.json")
+
+# Hausse relative tolérée du temps médian et du pic de mémoire
+SEUIL_DEFAUT = 0.20
+
+# Écart de pic de mémoire ignoré (bruit des petites allocations)
+TOLERANCE_MEMOIRE = 64 * 1024
+
+PERCENTILES = (50, 90, 99)
+
+# Tailles des listes d'équipements tarifées
+TAILLES_EQUIPEMENTS = (10, 1_000, 100_000)
+
+# Chantiers des portefeuilles tarifés (flottants et FCFA entiers)
+TAILLE_PORTEFEUILLE = 100_000
+
+# Versions des barèmes du portefeuille daté
+VERSIONS_PORTEFEUILLE = 8
+
+# Lignes du texte d'exclusions du PDF « pire cas »
+LIGNES_EXCLUSIONS = 200
+
+# Date fixe des cotations du banc (PDF identiques d'une exécution à l'autre)
+DATE_BANC = "01.01.2025"
+
+# =========================================================
+# DONNÉES
+# =========================================================
+
+def equipements_aleatoires(n, graine=0):
+    """Liste de n équipements A21/A22 valides (tirage reproductible)"""
+    from tarification import (
+        CLASSES_EQUIPEMENTS, COEF_DUREE_EQUIPEMENTS, HAUTEURS_GRUE,
+        RABAIS_FRANCHISE_EQUIPEMENTS, TARIFS_ENGINS, TYPES_EQUIPEMENTS,
+    )
+
+    rng = np.random.default_rng(graine)
+    types = rng.choice(TYPES_EQUIPEMENTS, n).tolist()
+    hauteurs = rng.choice(HAUTEURS_GRUE, n).tolist()
+    classes = rng.choice(CLASSES_EQUIPEMENTS, n).tolist()
+    durees = rng.choice(list(COEF_DUREE_EQUIPEMENTS), n).tolist()
+    franchises = rng.choice(list(RABAIS_FRANCHISE_EQUIPEMENTS), n).tolist()
+    valeurs = rng.integers(1_000_000, 500_000_000, n).tolist()
+    return [
+        {
+            "type": t,
+            "valeur": v,
+            "duree": d,
+            "hauteur": h if t == "Grue à tour" else None,
+            "classe": c if t == "Grue à tour" or t in TARIFS_ENGINS else None,
+            "franchise": f,
+        }
+        for t, v, d, h, c, f in zip(types, valeurs, durees, hauteurs, classes, franchises)
+    ]
+
+
+def portefeuille_aleatoire(n, graine=0):
+    """DataFrame de n chantiers valides pour price_portfolio (tirage reproductible)"""
+    import pandas as pd
+
+    from tarification import AXES_CUBE
+
+    rng = np.random.default_rng(graine)
+    return pd.DataFrame({
+        "type_travaux": rng.choice(AXES_CUBE["type_travaux"], n),
+        "montant": rng.integers(10_000_000, 20_000_000_000, n),
+        "duree": rng.integers(6, 25, n),
+        "usage": rng.choice(AXES_CUBE["usage"], n),
+        "structure": rng.choice(AXES_CUBE["structure"], n),
+        "franchise": rng.choice(AXES_CUBE["franchise"], n),
+        "trafic": rng.choice(AXES_CUBE["trafic"], n),
+        "proximite": rng.choice(AXES_CUBE["proximite"], n),
+        "rc_croisee": rng.random(n) < 0.2,
+        "ext_rc": rng.random(n) < 0.5,
+        "ext_existants": rng.random(n) < 0.3,
+    })
+
+
+def pdf_data_minimal():
+    """Cotation réduite au strict nécessaire (aucune extension)"""
+    return {
+        "souscripteur": "Banc",
+        "montant": 100_000_000,
+        "montant_f": "100,000,000",
+        "duree": 12,
+        "date_cotation": DATE_BANC,
+        "prime_nette": 110_000,
+        "accessoires": 6_600,
+        "taxes": 16_907,
+        "prime_ttc": 133_507,
+    }
+
+
+def pdf_data_pire_cas():
+    """Cotation avec toutes les extensions et un texte d'exclusions de 200 lignes"""
+    from pdf_cotation import EXCLUSIONS_DEFAUT
+
+    data = pdf_data_minimal()
+    texte = "Intervenant avec un nom à rallonge, accents compris (éèêàç)"
+    for champ in ("souscripteur", "proposant", "intermediaire", "entreprise_principale",
+                  "maitre_ouvrage", "maitrise_oeuvre", "bureau_controle", "labo_geotechnique",
+                  "autres_intervenants", "nature_travaux", "situation_geo"):
+        data[champ] = texte
+    extensions = {
+        "honoraires_expert": "honoraires", "existants": "existants", "erreur_conception": "erreur",
+        "heures_suppl": "heures", "vol_entrepose": "vol_entrepose",
+        "transport_terrestre": "transport_terrestre", "transport_aerien": "transport_aerien",
+        "conduits_souterrains": "conduits", "baraquement": "baraquement", "materiel": "materiel",
+        "rc": "rc", "vol_preposes": "vol_preposes", "defense_recours": "defense_recours",
+    }
+    for extension, prefixe in extensions.items():
+        data[f"ext_{extension}"] = True
+        data[f"{prefixe}_capitaux"] = "50 000 000 par sinistre et 100 000 000 par période"
+        data[f"{prefixe}_franchises"] = "10% des dommages, minimum 1 000 000 par sinistre"
+    data.update(ext_gemp=True, gemp_capitaux="100 000 000", ext_deblais=True, ext_maintenance=True)
+    lignes = [l for l in EXCLUSIONS_DEFAUT.splitlines() if l.strip()]
+    data["exclusions_spe"] = "\n".join(lignes[i % len(lignes)] for i in range(LIGNES_EXCLUSIONS))
+    return data
+
+# =========================================================
+# BANCS
+# =========================================================
+# Chaque banc prépare ses données (hors mesure) et retourne l'appel à mesurer.
+# BANCS : nom -> (préparation, appels par échantillon, échantillons)
+
+def banc_tarif_scalaire():
+    from tarification import calc_prime, calc_taux_rc, get_taux_base
+
+    def appel():
+        taux = get_taux_base("Bâtiment", 18, "public_industriel", "B")
+        taux_rc = calc_taux_rc("Bâtiment", taux, "Trafic moyen (+30%)", "de 50 à 100 m (+10%)", True)
+        return calc_prime(250_000_000, taux) + calc_prime(250_000_000, taux_rc)
+
+    return appel
+
+
+def banc_price_quote():
+    from tarification import QuoteInput, price_quote
+
+    quote = QuoteInput(
+        montant=250_000_000, duree=18, usage_key="public_industriel", structure="B",
+        ext_rc=True, ext_existants=True, equipements=equipements_aleatoires(5),
+    )
+    return lambda: price_quote(quote)
+
+
+def banc_price_quote_fcfa():
+    from montants import price_quote_fcfa
+    from tarification import QuoteInput
+
+    quote = QuoteInput(
+        montant=250_000_000, duree=18, usage_key="public_industriel", structure="B",
+        ext_rc=True, ext_existants=True, equipements=equipements_aleatoires(5),
+    )
+    return lambda: price_quote_fcfa(quote)
+
+
+def versions_annuelles(n):
+    """n versions des barèmes (référence puis une par année, taux des routes relevés de 5 % par an)"""
+    from dataclasses import replace
+
+    from baremes import VersionsTarif
+    from tarification import BAREMES_REFERENCE
+
+    versions = [BAREMES_REFERENCE]
+    for k in range(1, n):
+        versions.append(replace(
+            versions[-1], version=str(2020 + k), debut=datetime.date(2020 + k, 1, 1),
+            tarif_routes={duree: round(taux * 1.05, 2) for duree, taux in versions[-1].tarif_routes.items()},
+        ))
+    return VersionsTarif(versions)
+
+
+def banc_portefeuille(fcfa, nb_versions=1):
+    """Portefeuille tarifé sous une version, ou daté sur nb_versions versions (une par ligne)"""
+    def preparer():
+        from portefeuille import price_portfolio, price_portfolio_fcfa
+
+        df = portefeuille_aleatoire(TAILLE_PORTEFEUILLE)
+        versions = versions_annuelles(nb_versions)
+        if nb_versions > 1:
+            rng = np.random.default_rng(1)
+            df["date_cotation"] = np.datetime64("2019-01-01") + rng.integers(0, 365 * (nb_versions + 1), len(df))
+        tarifer = price_portfolio_fcfa if fcfa else price_portfolio
+        return lambda: tarifer(df, versions)
+
+    return preparer
+
+
+def banc_equipements(n):
+    def preparer():
+        from tarification import calc_prime_equipements
+
+        equipements = equipements_aleatoires(n)
+        return lambda: calc_prime_equipements(equipements)
+
+    return preparer
+
+
+def banc_flotte(n):
+    def preparer():
+        import pandas as pd
+
+        from flotte import Flotte, prime_flotte
+
+        flotte = Flotte.depuis_dataframe(pd.DataFrame(equipements_aleatoires(n)))
+        return lambda: prime_flotte(flotte)
+
+    return preparer
+
+
+def banc_pdf(fabrique):
+    def preparer():
+        from pdf_cotation import generate_pdf, precharger_ressources
+
+        precharger_ressources()
+        data = fabrique()
+        return lambda: generate_pdf(data)
+
+    return preparer
+
+
+def banc_appli(calcul):
+    """
+    Ré-exécution complète du script Streamlit (AppTest), formulaire seul ou
+    avec le calcul de la prime. L'historique est écrit dans une base
+    temporaire (voir main).
+    """
+    def preparer():
+        from streamlit.testing.v1 import AppTest
+
+        appli = AppTest.from_file(str(Path(__file__).with_name("TRCAssurDefender.py")), default_timeout=120)
+        appli.run()
+        if calcul:
+            # Premier calcul : attendre le PDF généré en arrière-plan, sinon les
+            # premiers échantillons mesureraient le lancement des workers
+            limite = time.monotonic() + 120
+            next(b for b in appli.button if b.label == "Calculer la prime").click()
+            appli.run()
+            while not appli.get("download_button") and time.monotonic() < limite:
+                time.sleep(0.5)
+                appli.run()
+
+        def appel():
+            if calcul:
+                next(b for b in appli.button if b.label == "Calculer la prime").click()
+            appli.run()
+            if appli.exception:
+                raise RuntimeError(appli.exception[0].message)
+
+        return appel
+
+    return preparer
+
+
+BANCS = {
+    "tarif_scalaire": (banc_tarif_scalaire, 10_000, 20),
+    "price_quote": (banc_price_quote, 1_000, 20),
+    "price_quote_fcfa": (banc_price_quote_fcfa, 1_000, 20),
+    f"portefeuille_{TAILLE_PORTEFEUILLE}": (banc_portefeuille(False), 1, 10),
+    f"portefeuille_fcfa_{TAILLE_PORTEFEUILLE}": (banc_portefeuille(True), 1, 10),
+    f"portefeuille_versions_{TAILLE_PORTEFEUILLE}": (banc_portefeuille(True, VERSIONS_PORTEFEUILLE), 1, 10),
+    **{f"equipements_{n}": (banc_equipements(n), max(1, 10_000 // n), 10) for n in TAILLES_EQUIPEMENTS},
+    **{f"flotte_{n}": (banc_flotte(n), max(1, 1_000 // n), 10) for n in TAILLES_EQUIPEMENTS},
+    "pdf_minimal": (banc_pdf(pdf_data_minimal), 1, 15),
+    "pdf_pire_cas": (banc_pdf(pdf_data_pire_cas), 1, 15),
+    "appli_formulaire": (banc_appli(False), 1, 5),
+    "appli_calcul": (banc_appli(True), 1, 5),
+}
+
+# =========================================================
+# MESURE ET COMPARAISON
+# =========================================================
+
+def mesurer(appel, nombre, echantillons):
+    """
+    Temps par appel (s) : percentiles et minimum sur `echantillons` séries de
+    `nombre` appels, puis pic de mémoire (octets) d'un appel isolé.
+    """
+    appel()
+    temps = []
+    for _ in range(echantillons):
+        debut = time.perf_counter()
+        for _ in range(nombre):
+            appel()
+        temps.append((time.perf_counter() - debut) / nombre)
+
+    tracemalloc.start()
+    try:
+        appel()
+        _, pic = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    mesure = {f"p{p}_s": float(v) for p, v in zip(PERCENTILES, np.percentile(temps, PERCENTILES))}
+    mesure.update(min_s=min(temps), pic_memoire_octets=pic, nombre=nombre, echantillons=echantillons)
+    return mesure
+
+
+def executer(noms, progression=None):
+    """Mesure les bancs `noms` dans l'ordre et retourne {nom: mesure}"""
+    resultats = {}
+    for nom in noms:
+        preparer, nombre, echantillons = BANCS[nom]
+        resultats[nom] = mesurer(preparer(), nombre, echantillons)
+        if progression:
+            progression(nom, resultats[nom])
+    return resultats
+
+
+def comparer(resultats, reference, seuil=SEUIL_DEFAUT):
+    """
+    Régressions par rapport à la référence : liste de (banc, grandeur,
+    référence, mesure). Un banc absent de la référence n'est pas comparé ; un
+    écart de pic de mémoire inférieur à TOLERANCE_MEMOIRE est ignoré.
+    """
+    regressions = []
+    for nom, mesure in resultats.items():
+        ancienne = reference.get(nom)
+        if ancienne is None:
+            continue
+        if mesure["p50_s"] > ancienne["p50_s"] * (1 + seuil):
+            regressions.append((nom, "p50_s", ancienne["p50_s"], mesure["p50_s"]))
+        pic, ancien_pic = mesure["pic_memoire_octets"], ancienne["pic_memoire_octets"]
+        if pic > ancien_pic * (1 + seuil) and pic - ancien_pic > TOLERANCE_MEMOIRE:
+            regressions.append((nom, "pic_memoire_octets", ancien_pic, pic))
+    return regressions
+
+
+def lire_reference(chemin):
+    with open(chemin, encoding="utf-8") as fichier:
+        return json.load(fichier)["bancs"]
+
+
+def ecrire_reference(chemin, resultats):
+    """Enregistre les résultats (complète une référence existante)"""
+    bancs = lire_reference(chemin) if os.path.exists(chemin) else {}
+    bancs.update(resultats)
+    contenu = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "machine": platform.node(),
+        "processeur": platform.processor() or platform.machine(),
+        "python": platform.python_version(),
+        "bancs": bancs,
+    }
+    with open(chemin, "w", encoding="utf-8") as fichier:
+        json.dump(contenu, fichier, indent=2, ensure_ascii=False)
+        fichier.write("\n")
+
+
+def format_duree(secondes):
+    if secondes < 1e-3:
+        return f"{secondes * 1e6:.1f} µs"
+    if secondes < 1:
+        return f"{secondes * 1e3:.2f} ms"
+    return f"{secondes:.2f} s"
+
+
+def format_octets(octets):
+    for unite in ("o", "Kio", "Mio"):
+        if octets < 1024:
+            return f"{octets:.0f} {unite}"
+        octets /= 1024
+    return f"{octets:.1f} Gio"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de performance de la tarification TRC et du PDF")
+    parser.add_argument("--selection", nargs="+", metavar="MOT",
+                        help="Bancs dont le nom contient l'un de ces mots (défaut : tous)")
+    parser.add_argument("--reference", default=FICHIER_REFERENCE, help=f"Fichier de référence (défaut : {FICHIER_REFERENCE.name})")
+    parser.add_argument("--enregistrer", action="store_true", help="Enregistrer les résultats comme référence")
+    parser.add_argument("--seuil", type=float, default=SEUIL_DEFAUT,
+                        help=f"Hausse relative tolérée (défaut : {SEUIL_DEFAUT * 100:.0f} %%)")
+    parser.add_argument("--liste", action="store_true", help="Afficher les bancs disponibles")
+    args = parser.parse_args(argv)
+
+    if args.liste:
+        print("\n".join(BANCS))
+        return 0
+    noms = [n for n in BANCS if not args.selection or any(mot in n for mot in args.selection)]
+    if not noms:
+        parser.error("aucun banc ne correspond à la sélection")
+
+    def progression(nom, mesure):
+        percentiles = "  ".join(f"p{p} {format_duree(mesure[f'p{p}_s']):>10}" for p in PERCENTILES)
+        print(f"{nom:<22} {percentiles}  mémoire {format_octets(mesure['pic_memoire_octets']):>9}", flush=True)
+
+    # L'interface enregistre ses cotations : base temporaire, pas l'historique réel
+    with tempfile.TemporaryDirectory() as dossier:
+        os.environ["TRC_BASE_COTATIONS"] = os.path.join(dossier, "cotations.db")
+        resultats = executer(noms, progression)
+
+    if args.enregistrer:
+        ecrire_reference(args.reference, resultats)
+        print(f"Référence enregistrée -> {args.reference}", file=sys.stderr)
+        return 0
+    if not os.path.exists(args.reference):
+        print(f"Pas de référence ({args.reference}) : relancer avec --enregistrer", file=sys.stderr)
+        return 0
+
+    regressions = comparer(resultats, lire_reference(args.reference), args.seuil)
+    for nom, grandeur, ancienne, nouvelle in regressions:
+        formater = format_duree if grandeur.endswith("_s") else format_octets
+        hausse = f"+{nouvelle / ancienne - 1:.0%}" if ancienne else "référence nulle"
+        print(
+            f"RÉGRESSION {nom} ({grandeur}) : {formater(ancienne)} -> {formater(nouvelle)} "
+            f"({hausse}, seuil {args.seuil:.0%})",
+            file=sys.stderr,
+        )
+    if regressions:
+        return 1
+    print(f"Aucune régression au-delà de {args.seuil:.0%}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
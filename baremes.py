@@ -0,0 +1,227 @@
+"""
+Versions datées des barèmes.
+
+Chaque révision du tarif est un fichier JSON du répertoire baremes/ (ou de
+TRC_REPERTOIRE_BAREMES), sans déploiement de code :
+
+    {"version": "2026-T1", "debut": "2026-01-01", "fin": "2026-12-31",
+     "tarifs_engins": {...}, "taux_taxes": 0.15}
+
+Seules les tables modifiées sont écrites : les autres sont reprises de la
+version précédente. Les modalités (clés des tables) sont celles de
+tarification.py, seules les valeurs changent. Avant la première date
+d'effet, ce sont les barèmes de référence (tarification.BAREMES_REFERENCE)
+qui s'appliquent ; une version sans fin court jusqu'au début de la suivante.
+
+VersionsTarif range les versions par date d'effet et retrouve celle en
+vigueur à une date (version_au) ou à chaque date d'un tableau (indices, un
+np.searchsorted sur les débuts, sans boucle par ligne) ; cubes() empile leurs
+cubes de taux pour tarifer un portefeuille dont chaque ligne a sa version.
+
+Usage :
+    python baremes.py [--repertoire baremes]                  (versions et périodes)
+    python baremes.py --exporter baremes/2026-01-01.json --debut 2026-01-01 [--version NOM] [--fin 2026-12-31]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+from dataclasses import fields
+from functools import cached_property, lru_cache
+
+import numpy as np
+
+from tarification import BAREMES_REFERENCE, Baremes, get_cube
+
+# Répertoire des versions (à côté de ce module), modifiable par variable d'environnement
+REPERTOIRE_BAREMES = os.environ.get(
+    "TRC_REPERTOIRE_BAREMES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "baremes"),
+)
+
+# Tables d'une version (champs de Baremes lus dans les fichiers)
+TABLES = [champ.name for champ in fields(Baremes) if champ.name not in ("version", "debut", "fin")]
+
+# Bornes des périodes sans limite
+DATE_MIN = np.datetime64(datetime.date.min, "D")
+DATE_MAX = np.datetime64(datetime.date.max, "D")
+
+# =========================================================
+# LECTURE DES FICHIERS
+# =========================================================
+
+def _valider(reference, valeur, chemin):
+    """
+    Retourne `valeur` avec les clés (et leur type) de `reference` : mêmes
+    modalités à tous les niveaux, valeurs numériques. ValueError sinon.
+    """
+    if isinstance(reference, dict):
+        if not isinstance(valeur, dict):
+            raise ValueError(f"{chemin} : table attendue")
+        brut = {str(cle): v for cle, v in valeur.items()}
+        if set(brut) != {str(cle) for cle in reference}:
+            raise ValueError(f"{chemin} : modalités attendues : {', '.join(map(str, reference))}")
+        return {cle: _valider(reference[cle], brut[str(cle)], f"{chemin}.{cle}") for cle in reference}
+    if isinstance(valeur, bool) or not isinstance(valeur, (int, float)):
+        raise ValueError(f"{chemin} : nombre attendu, reçu {valeur!r}")
+    return float(valeur)
+
+
+def _date(valeur, chemin, champ):
+    try:
+        return datetime.date.fromisoformat(valeur)
+    except (TypeError, ValueError):
+        raise ValueError(f"{chemin} : {champ} invalide (aaaa-mm-jj attendu) : {valeur!r}") from None
+
+
+def _version(chemin, donnees, precedente):
+    """Version décrite par `donnees` (fichier `chemin`), tables absentes reprises de `precedente`"""
+    inconnus = sorted(set(donnees) - set(TABLES) - {"version", "debut", "fin"})
+    if inconnus:
+        raise ValueError(f"{chemin} : champs inconnus : {', '.join(inconnus)}")
+    tables = {
+        table: _valider(getattr(BAREMES_REFERENCE, table), donnees[table], f"{chemin}:{table}")
+        if table in donnees else getattr(precedente, table)
+        for table in TABLES
+    }
+    return Baremes(
+        version=str(donnees.get("version") or os.path.splitext(os.path.basename(chemin))[0]),
+        debut=_date(donnees.get("debut"), chemin, "debut"),
+        fin=_date(donnees["fin"], chemin, "fin") if donnees.get("fin") else None,
+        **tables,
+    )
+
+
+def charger_versions(repertoire=REPERTOIRE_BAREMES):
+    """
+    Lit les versions (*.json) de `repertoire` et retourne l'ensemble des
+    versions (VersionsTarif), barèmes de référence compris. Répertoire
+    absent : barèmes de référence seuls.
+    """
+    fichiers = []
+    if os.path.isdir(repertoire):
+        for nom in sorted(os.listdir(repertoire)):
+            if nom.endswith(".json"):
+                chemin = os.path.join(repertoire, nom)
+                with open(chemin, encoding="utf-8") as fichier:
+                    donnees = json.load(fichier)
+                if not isinstance(donnees, dict):
+                    raise ValueError(f"{chemin} : objet JSON attendu")
+                fichiers.append((_date(donnees.get("debut"), chemin, "debut"), chemin, donnees))
+
+    versions = [BAREMES_REFERENCE]
+    for _, chemin, donnees in sorted(fichiers, key=lambda f: f[0]):
+        versions.append(_version(chemin, donnees, versions[-1]))
+    return VersionsTarif(versions)
+
+
+@lru_cache(maxsize=None)
+def versions_tarif(repertoire=REPERTOIRE_BAREMES):
+    """Versions des barèmes de `repertoire`, lues une fois par processus"""
+    return charger_versions(repertoire)
+
+
+def exporter_version(baremes, chemin, debut, version=None, fin=None):
+    """Écrit toutes les tables de `baremes` dans un fichier de version (point de départ d'une révision)"""
+    donnees = {"version": version or os.path.splitext(os.path.basename(chemin))[0], "debut": debut.isoformat()}
+    if fin is not None:
+        donnees["fin"] = fin.isoformat()
+    donnees.update({table: getattr(baremes, table) for table in TABLES})
+    with open(chemin, "w", encoding="utf-8") as fichier:
+        json.dump(donnees, fichier, ensure_ascii=False, indent=2)
+        fichier.write("\n")
+
+# =========================================================
+# INDEX DES PÉRIODES
+# =========================================================
+
+class VersionsTarif:
+    """
+    Versions des barèmes rangées par date d'effet, avec l'index de leurs
+    périodes : début (inclus) et fin (exclue) en datetime64[D]. Les périodes
+    ne se chevauchent pas ; il peut y avoir des trous (version avec une fin
+    explicite avant le début de la suivante).
+    """
+
+    def __init__(self, versions):
+        self.versions = sorted(versions, key=lambda b: b.debut or datetime.date.min)
+        debuts = [np.datetime64(b.debut or datetime.date.min, "D") for b in self.versions]
+        fins = []
+        for k, baremes in enumerate(self.versions):
+            suivant = debuts[k + 1] if k + 1 < len(debuts) else DATE_MAX
+            if suivant <= debuts[k]:
+                raise ValueError(f"Versions {baremes.version} et {self.versions[k + 1].version} : même date d'effet")
+            if baremes.fin is None:
+                fins.append(suivant)
+                continue
+            fin = np.datetime64(baremes.fin, "D") + 1
+            if fin <= debuts[k]:
+                raise ValueError(f"Version {baremes.version} : fin antérieure au début")
+            if fin > suivant:
+                raise ValueError(f"Versions {baremes.version} et {self.versions[k + 1].version} : périodes qui se chevauchent")
+            fins.append(fin)
+        self.debuts = np.array(debuts, dtype="datetime64[D]")
+        self.fins = np.array(fins, dtype="datetime64[D]")
+
+    def __len__(self):
+        return len(self.versions)
+
+    def indices(self, dates):
+        """
+        Position (dans versions) de la version en vigueur à chaque date, -1
+        pour les dates sans barème (trou entre deux périodes, NaT).
+        """
+        dates = np.asarray(dates, dtype="datetime64[D]")
+        positions = np.searchsorted(self.debuts, dates, side="right") - 1
+        hors = (positions < 0) | np.isnat(dates) | (dates >= self.fins[np.maximum(positions, 0)])
+        return np.where(hors, -1, positions)
+
+    def version_au(self, date=None):
+        """Version en vigueur à `date` (aujourd'hui par défaut) ; ValueError s'il n'y en a pas"""
+        date = date or datetime.date.today()
+        position = int(self.indices([date])[0])
+        if position < 0:
+            raise ValueError(f"Aucune version des barèmes en vigueur le {date}")
+        return self.versions[position]
+
+    @cached_property
+    def cubes(self):
+        """Cubes de taux (‰) de toutes les versions, empilés sur un premier axe"""
+        return np.stack([get_cube(baremes) for baremes in self.versions])
+
+    @cached_property
+    def cubes_fcfa(self):
+        """Cubes de taux entiers (montants.get_cube_fcfa) de toutes les versions, empilés"""
+        from montants import get_cube_fcfa
+
+        return np.stack([get_cube_fcfa(baremes) for baremes in self.versions])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Versions datées des barèmes TRC")
+    parser.add_argument("--repertoire", default=REPERTOIRE_BAREMES, help="Répertoire des versions (*.json)")
+    parser.add_argument("--exporter", metavar="FICHIER",
+                        help="Écrire les tables de la version en vigueur à --debut dans un nouveau fichier de version")
+    parser.add_argument("--debut", type=datetime.date.fromisoformat, help="Date d'effet de la version exportée (aaaa-mm-jj)")
+    parser.add_argument("--fin", type=datetime.date.fromisoformat, help="Dernier jour de la version exportée")
+    parser.add_argument("--version", help="Nom de la version exportée (défaut : nom du fichier)")
+    args = parser.parse_args(argv)
+
+    versions = charger_versions(args.repertoire)
+    if args.exporter:
+        if args.debut is None:
+            parser.error("--exporter demande --debut")
+        exporter_version(versions.version_au(args.debut), args.exporter, args.debut, args.version, args.fin)
+        print(f"Version écrite dans {args.exporter} (à modifier, puis à placer dans {args.repertoire})", file=sys.stderr)
+        return 0
+
+    for baremes, debut, fin in zip(versions.versions, versions.debuts, versions.fins):
+        periode_debut = "…" if debut == DATE_MIN else str(debut)
+        periode_fin = "…" if fin == DATE_MAX else str(fin - 1)
+        print(f"{baremes.version:<24} {periode_debut:>10} -> {periode_fin}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,319 @@
+"""
+Cotation en masse depuis un fichier Excel (.xlsx) ou CSV.
+
+Les lignes sont lues en flux (openpyxl en lecture seule ou module csv),
+validées et tarifées par lots avec portefeuille.price_portfolio_fcfa() (primes
+en FCFA entiers, mêmes francs que l'interface et le PDF), puis
+écrites au fur et à mesure (openpyxl en écriture seule ou csv) : la mémoire
+utilisée ne dépend que de la taille d'un lot, pas de celle du fichier.
+
+Une colonne date_cotation (date Excel, jj.mm.aaaa ou aaaa-mm-jj) fait
+tarifer chaque ligne sous la version des barèmes en vigueur à cette date
+(voir baremes.py) ; sans date, la version du jour.
+
+Usage :
+    python cotation_lot.py demandes.xlsx cotations.xlsx [--taille-lot 5000]
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from baremes import versions_tarif
+from portefeuille import COLONNES_DEFAUT, COLONNES_OBLIGATOIRES, price_portfolio_fcfa
+from tarification import AXES_CUBE, DUREE_MAX, DUREE_MIN, MONTANT_MAX, lire_booleen
+
+TAILLE_LOT = 5000
+
+# Colonnes ajoutées en sortie : (libellé, colonne de price_portfolio_fcfa, décimales).
+# Les primes (0 décimale) sont écrites en entiers, sans passer par un flottant.
+# Les libellés reprennent ceux du tableau "Décomposition de la prime" et du total.
+COLONNES_SORTIE = [
+    ("Prime Dommages à l'ouvrage (Travaux)", "prime_travaux", 0),
+    ("Taux travaux (‰)", "taux_net_travaux", 3),
+    ("Prime Maintenance Visite (A05)", "prime_maintenance", 0),
+    ("Prime Responsabilité Civile (A17)", "prime_rc", 0),
+    ("Taux RC (‰)", "taux_rc", 3),
+    ("Prime Dommages aux Existants (A20)", "prime_existants", 0),
+    ("Taux existants (‰)", "taux_existants", 3),
+    ("Prime Équipements et Installations (A21/A22)", "prime_equipements", 0),
+    ("Prime Maintenance étendue (A06)", "prime_maint_etendue", 0),
+    ("Prime Maintenance constructeur (A07)", "prime_maint_const", 0),
+    ("Prime Matériel et installations (A21)", "prime_materiel", 0),
+    ("Prime Baraquements provisoires (A22)", "prime_baraquement", 0),
+    ("Prime Garantie Environnement (FANAF01)", "prime_gemp", 0),
+    ("Prime Nette", "prime_nette", 0),
+    ("Accessoires", "accessoires", 0),
+    ("Taxes", "taxes", 0),
+    ("Taux taxes (%)", "taux_taxes", 2),
+    ("PRIME TTC", "prime_ttc", 0),
+    ("Version du tarif", "version_tarif", 0),
+]
+
+COLONNE_ERREUR = "Erreur"
+
+# Colonnes catégorielles et modalités acceptées
+MODALITES = {
+    "type_travaux": AXES_CUBE["type_travaux"],
+    "usage": AXES_CUBE["usage"],
+    "structure": AXES_CUBE["structure"],
+    "franchise": AXES_CUBE["franchise"],
+    "trafic": AXES_CUBE["trafic"],
+    "proximite": AXES_CUBE["proximite"],
+}
+
+COLONNES_BOOLEENNES = ["rc_croisee", "ext_maintenance", "ext_deblais", "ext_rc", "ext_existants"]
+
+# =========================================================
+# LECTURE / ÉCRITURE EN FLUX
+# =========================================================
+
+def _ajuster(ligne, nb_colonnes):
+    """Complète ou tronque une ligne au nombre de colonnes de l'en-tête"""
+    ligne = list(ligne[:nb_colonnes])
+    ligne.extend([None] * (nb_colonnes - len(ligne)))
+    return ligne
+
+
+def lire_lignes(chemin):
+    """Retourne (en-têtes, itérateur de lignes) pour un fichier .xlsx ou .csv"""
+    if chemin.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        classeur = load_workbook(chemin, read_only=True, data_only=True)
+        lignes = classeur.active.iter_rows(values_only=True)
+        entetes = [str(v).strip() if v is not None else "" for v in next(lignes, ())]
+
+        def generer():
+            try:
+                for ligne in lignes:
+                    if any(v is not None for v in ligne):
+                        yield _ajuster(ligne, len(entetes))
+            finally:
+                classeur.close()
+
+        return entetes, generer()
+
+    fichier = open(chemin, newline="", encoding="utf-8-sig")
+    echantillon = fichier.read(4096)
+    fichier.seek(0)
+    try:
+        dialecte = csv.Sniffer().sniff(echantillon, delimiters=",;\t")
+    except csv.Error:
+        dialecte = csv.excel
+    lecteur = csv.reader(fichier, dialecte)
+    entetes = [v.strip() for v in next(lecteur, [])]
+
+    def generer():
+        with fichier:
+            for ligne in lecteur:
+                if any(v.strip() for v in ligne):
+                    yield _ajuster(ligne, len(entetes))
+
+    return entetes, generer()
+
+
+class EcrivainLot:
+    """Écrit les lignes tarifées au fur et à mesure dans un fichier .xlsx ou .csv"""
+
+    def __init__(self, chemin, entetes):
+        self.chemin = chemin
+        if chemin.lower().endswith(".xlsx"):
+            from openpyxl import Workbook
+
+            self.classeur = Workbook(write_only=True)
+            self.feuille = self.classeur.create_sheet("Cotations")
+            self.ecrire = self.feuille.append
+            self.fichier = None
+        else:
+            self.classeur = None
+            self.fichier = open(chemin, "w", newline="", encoding="utf-8-sig")
+            self.ecrire = csv.writer(self.fichier, delimiter=";").writerow
+        self.ecrire(entetes)
+
+    def ecrire_lignes(self, lignes):
+        for ligne in lignes:
+            self.ecrire(ligne)
+
+    def fermer(self):
+        if self.classeur is not None:
+            self.classeur.save(self.chemin)
+        else:
+            self.fichier.close()
+
+
+def par_lots(lignes, taille):
+    """Découpe un itérateur en listes d'au plus `taille` éléments"""
+    while True:
+        lot = list(itertools.islice(lignes, taille))
+        if not lot:
+            return
+        yield lot
+
+# =========================================================
+# VALIDATION ET TARIFICATION D'UN LOT
+# =========================================================
+
+def _date(valeur):
+    """Date d'une cellule (date Excel, jj.mm.aaaa ou aaaa-mm-jj) ; None si vide"""
+    if isinstance(valeur, datetime.datetime):
+        return valeur.date()
+    if isinstance(valeur, datetime.date):
+        return valeur
+    if valeur is None or (isinstance(valeur, float) and np.isnan(valeur)):
+        return None
+    texte = str(valeur).strip()
+    if not texte:
+        return None
+    try:
+        return datetime.datetime.strptime(texte, "%d.%m.%Y").date()
+    except ValueError:
+        return datetime.date.fromisoformat(texte)
+
+
+def preparer_lot(entetes, lignes):
+    """
+    Convertit un lot de lignes brutes en DataFrame typé pour price_portfolio_fcfa().
+
+    Retourne (DataFrame, erreurs) où erreurs est un tableau de messages
+    ('' pour les lignes valides).
+    """
+    df = pd.DataFrame(lignes, columns=entetes)
+    erreurs = np.full(len(df), "", dtype=object)
+
+    def signaler(masque, message):
+        masque = np.asarray(masque) & (erreurs == "")
+        erreurs[masque] = message
+
+    for colonne in COLONNES_OBLIGATOIRES:
+        if colonne not in df.columns:
+            raise ValueError(f"Colonne obligatoire absente du fichier : {colonne}")
+
+    for colonne in ("montant", "duree"):
+        df[colonne] = pd.to_numeric(df[colonne], errors="coerce")
+    signaler(df["montant"].isna() | (df["montant"] < 0) | (df["montant"] > MONTANT_MAX), "montant invalide")
+    signaler(df["duree"].isna() | (df["duree"] < DUREE_MIN) | (df["duree"] > DUREE_MAX),
+             f"duree invalide ({DUREE_MIN} à {DUREE_MAX} mois)")
+
+    batiment = (df["type_travaux"] == "Bâtiment").to_numpy()
+    for colonne, modalites in MODALITES.items():
+        if colonne not in df.columns:
+            continue
+        valeurs = df[colonne].where(df[colonne].notna() & (df[colonne] != ""), None)
+        if colonne in ("usage", "structure"):
+            # Seuls les bâtiments ont un usage et une structure
+            signaler(batiment & ~valeurs.isin(modalites).to_numpy(), f"{colonne} invalide")
+            valeurs = valeurs.where(batiment, None)
+        else:
+            valeurs = valeurs.fillna(COLONNES_DEFAUT.get(colonne))
+            signaler(~valeurs.isin(modalites).to_numpy(), f"{colonne} invalide")
+        df[colonne] = valeurs
+
+    for colonne in COLONNES_BOOLEENNES:
+        if colonne not in df.columns:
+            continue
+        valeurs = []
+        invalides = np.zeros(len(df), dtype=bool)
+        for i, valeur in enumerate(df[colonne]):
+            try:
+                booleen = lire_booleen(valeur)
+            except ValueError:
+                invalides[i] = True
+                booleen = None
+            valeurs.append(COLONNES_DEFAUT[colonne] if booleen is None else booleen)
+        signaler(invalides, f"{colonne} invalide")
+        df[colonne] = valeurs
+
+    for colonne in COLONNES_DEFAUT:
+        if not colonne.startswith("prime_") or colonne not in df.columns:
+            continue
+        brut = df[colonne]
+        valeurs = pd.to_numeric(brut, errors="coerce")
+        signaler((valeurs.isna() & brut.notna() & (brut != "")).to_numpy(), f"{colonne} invalide")
+        df[colonne] = valeurs.fillna(0.0)
+
+    if "date_cotation" in df.columns:
+        dates = []
+        invalides = np.zeros(len(df), dtype=bool)
+        for i, valeur in enumerate(df["date_cotation"]):
+            try:
+                dates.append(_date(valeur))
+            except ValueError:
+                invalides[i] = True
+                dates.append(None)
+        signaler(invalides, "date_cotation invalide")
+        df["date_cotation"] = pd.Series(dates, index=df.index, dtype=object).astype("datetime64[s]")
+        datees = df["date_cotation"].notna().to_numpy()
+        sans_bareme = versions_tarif().indices(df["date_cotation"].to_numpy(dtype="datetime64[D]")) < 0
+        signaler(datees & sans_bareme, "aucune version des barèmes à cette date")
+
+    return df, erreurs
+
+
+def tarifer_lot(entetes, lignes):
+    """Tarifie un lot et retourne les lignes de sortie (entrée + décomposition + erreur)"""
+    df, erreurs = preparer_lot(entetes, lignes)
+    valides = erreurs == ""
+
+    sortie = pd.DataFrame(index=df.index, columns=[c for _, c, _ in COLONNES_SORTIE], dtype=object)
+    if valides.any():
+        resultat = price_portfolio_fcfa(df[valides]).reindex(columns=sortie.columns, fill_value=0)
+        for _, colonne, decimales in COLONNES_SORTIE:
+            valeurs = resultat[colonne]
+            if decimales:
+                valeurs = valeurs.astype(np.float64).round(decimales)
+            sortie.loc[valides, colonne] = valeurs.to_numpy()
+
+    sortie = sortie.astype(object).where(sortie.notna(), None)
+    lignes_sortie = []
+    for ligne, valeurs, erreur in zip(lignes, sortie.to_numpy().tolist(), erreurs):
+        lignes_sortie.append(list(ligne) + valeurs + [erreur or None])
+    return lignes_sortie, int((~valides).sum())
+
+# =========================================================
+# POINT D'ENTRÉE
+# =========================================================
+
+def coter_fichier(entree, sortie, taille_lot=TAILLE_LOT, progression=None):
+    """Tarifie toutes les lignes de `entree` et les écrit dans `sortie`. Retourne (lignes, erreurs)"""
+    entetes, lignes = lire_lignes(entree)
+    ecrivain = EcrivainLot(sortie, entetes + [libelle for libelle, _, _ in COLONNES_SORTIE] + [COLONNE_ERREUR])
+    total = nb_erreurs = 0
+    try:
+        for lot in par_lots(lignes, taille_lot):
+            lignes_sortie, erreurs_lot = tarifer_lot(entetes, lot)
+            ecrivain.ecrire_lignes(lignes_sortie)
+            total += len(lot)
+            nb_erreurs += erreurs_lot
+            if progression:
+                progression(total, nb_erreurs)
+    finally:
+        ecrivain.fermer()
+    return total, nb_erreurs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cotation TRC en masse (Excel/CSV)")
+    parser.add_argument("entree", help="Fichier de demandes (.xlsx ou .csv)")
+    parser.add_argument("sortie", help="Fichier de cotations à produire (.xlsx ou .csv)")
+    parser.add_argument("--taille-lot", type=int, default=TAILLE_LOT, help="Nombre de lignes tarifées par lot")
+    args = parser.parse_args(argv)
+
+    debut = time.perf_counter()
+
+    def progression(total, nb_erreurs):
+        print(f"\r{total} lignes traitées ({nb_erreurs} en erreur)", end="", file=sys.stderr, flush=True)
+
+    total, nb_erreurs = coter_fichier(args.entree, args.sortie, args.taille_lot, progression)
+    duree = time.perf_counter() - debut
+    print(f"\n{total} lignes tarifées en {duree:.1f} s ({nb_erreurs} en erreur) -> {args.sortie}", file=sys.stderr)
+    return 1 if nb_erreurs else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+"""
+Démarrage à froid : imports différés, préchauffage et rapport des imports.
+
+Les modules lourds (pandas, fpdf, fontTools) ne sont importés qu'à leur
+premier usage (module_differe) : l'interface affiche sa première page sans
+les payer, et le processus principal n'importe jamais fpdf (les PDF sont
+rendus par les workers). TRC_IMPORTS_DIFFERES=0 rétablit les imports
+immédiats.
+
+Le préchauffage (prechauffer) charge ensuite ces modules et les cubes de taux
+(flottants et entiers) de toutes les versions des barèmes,
+et lance les workers de rendu (qui chargent fpdf, les polices et le logo),
+pour que le premier utilisateur après un déploiement ne paie pas ce
+démarrage. Il est lancé au démarrage du service HTTP
+(serveur_cotation.py --prechauffage) et, dans l'interface, à la première
+session si TRC_PRECHAUFFAGE=1 (une sonde de disponibilité qui ouvre la page
+suffit à le déclencher).
+
+Usage (rapport de démarrage à froid, dans un processus neuf) :
+    python demarrage.py [--top 15] [--module pdf_cotation ...] [--prechauffage] [--json]
+"""
+import argparse
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import types
+
+IMPORTS_DIFFERES = os.environ.get("TRC_IMPORTS_DIFFERES", "1") != "0"
+PRECHAUFFAGE = os.environ.get("TRC_PRECHAUFFAGE", "0") == "1"
+
+# Modules importés par le préchauffage de l'interface (différés ailleurs)
+MODULES_LOURDS = ["pandas"]
+
+# Modules importés par l'interface (rapport par défaut)
+MODULES_APPLI = [
+    "streamlit", "metriques", "tarification", "flotte", "pdf_cotation",
+    "file_rendus", "stockage", "profilage",
+]
+
+# =========================================================
+# IMPORTS DIFFÉRÉS
+# =========================================================
+
+class ModuleDiffere(types.ModuleType):
+    """
+    Module importé au premier accès à l'un de ses attributs (sous verrou :
+    un seul import même si plusieurs threads y accèdent ensemble). Ses
+    attributs sont ensuite copiés : les accès suivants sont directs.
+    """
+
+    def __init__(self, nom):
+        super().__init__(nom)
+        self._verrou = threading.Lock()
+
+    def __getattr__(self, attribut):
+        return getattr(self.charger(), attribut)
+
+    def charger(self):
+        """Importe le module (une seule fois) et le retourne"""
+        with self._verrou:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update(module.__dict__)
+        return module
+
+
+def module_differe(nom):
+    """
+    Module `nom`, importé à son premier usage. Déjà importé, ou imports
+    différés désactivés (TRC_IMPORTS_DIFFERES=0) : le module lui-même.
+    """
+    if not IMPORTS_DIFFERES or nom in sys.modules:
+        return importlib.import_module(nom)
+    return ModuleDiffere(nom)
+
+# =========================================================
+# PRÉCHAUFFAGE
+# =========================================================
+
+def prechauffer(file=None, modules=MODULES_LOURDS):
+    """
+    Charge ce que paie sinon le premier utilisateur : `modules`, cubes de taux
+    et, si `file` (FileRendus) est donnée, ses workers de rendu ; sans file,
+    les polices et le logo du PDF dans ce processus. Retourne la durée (s) de
+    chaque étape, également enregistrée dans metriques
+    (« prechauffage.<étape> »).
+    """
+    import metriques
+    import pdf_cotation
+    from baremes import versions_tarif
+
+    etapes = [
+        ("imports", lambda: [importlib.import_module(nom) for nom in modules]),
+        ("tarifs", lambda: (versions_tarif().cubes, versions_tarif().cubes_fcfa)),
+    ]
+    if file is not None:
+        etapes.append(("workers", file.prechauffer))
+    else:
+        etapes.append(("ressources_pdf", pdf_cotation.precharger_ressources))
+    durees = {}
+    for etape, action in etapes:
+        debut = time.perf_counter()
+        action()
+        durees[etape] = time.perf_counter() - debut
+        metriques.observer(f"prechauffage.{etape}", durees[etape])
+    return durees
+
+
+def prechauffer_en_fond(file=None, modules=MODULES_LOURDS):
+    """Lance prechauffer() dans un thread (le démarrage n'attend pas)"""
+    fil = threading.Thread(target=prechauffer, args=(file, modules), name="prechauffage", daemon=True)
+    fil.start()
+    return fil
+
+# =========================================================
+# RAPPORT DES IMPORTS
+# =========================================================
+
+_LIGNE_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+def rapport_imports(modules=None):
+    """
+    Temps d'import à froid de `modules` (python -X importtime dans un
+    processus neuf). Retourne le temps total (s) et le temps propre (s) par
+    paquet de premier niveau, du plus coûteux au moins coûteux.
+    """
+    modules = modules or MODULES_APPLI
+    dossier = os.path.dirname(os.path.abspath(__file__))
+    sortie = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        cwd=dossier, capture_output=True, text=True, check=True,
+    ).stderr
+    total = 0
+    paquets = {}
+    for ligne in sortie.splitlines():
+        correspondance = _LIGNE_IMPORTTIME.match(ligne)
+        if correspondance is None:
+            continue
+        propre, cumule, retrait, nom = correspondance.groups()
+        if not retrait:
+            total += int(cumule)
+        paquet = nom.partition(".")[0]
+        paquets[paquet] = paquets.get(paquet, 0) + int(propre)
+    par_paquet = sorted(((p, us / 1e6) for p, us in paquets.items()), key=lambda x: x[1], reverse=True)
+    return total / 1e6, par_paquet
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rapport de démarrage à froid (imports et préchauffage)")
+    parser.add_argument("--module", action="append", help=f"Module à importer (défaut : {', '.join(MODULES_APPLI)})")
+    parser.add_argument("--top", type=int, default=15, help="Nombre de paquets affichés")
+    parser.add_argument("--prechauffage", action="store_true",
+                        help="Mesurer aussi le préchauffage (ressources PDF et lancement des workers)")
+    parser.add_argument("--workers", type=int, default=None, help="Workers de rendu lancés (défaut : cœurs disponibles)")
+    parser.add_argument("--json", action="store_true", help="Rapport en JSON (suivi d'un déploiement à l'autre)")
+    args = parser.parse_args(argv)
+
+    total, par_paquet = rapport_imports(args.module)
+    rapport = {
+        "python": sys.version.split()[0],
+        "imports_differes": IMPORTS_DIFFERES,
+        "imports_s": total,
+        "paquets_s": dict(par_paquet[:args.top]),
+    }
+    if args.prechauffage:
+        from file_rendus import FileRendus
+
+        file = FileRendus(args.workers)
+        try:
+            rapport["prechauffage_s"] = prechauffer(file)
+        finally:
+            file.fermer()
+
+    if args.json:
+        print(json.dumps(rapport, indent=2, ensure_ascii=False))
+        return 0
+    print(f"Imports : {total * 1000:.0f} ms (imports différés : {'oui' if IMPORTS_DIFFERES else 'non'})")
+    for paquet, duree in par_paquet[:args.top]:
+        print(f"  {paquet:<28} {duree * 1000:8.1f} ms")
+    for etape, duree in rapport.get("prechauffage_s", {}).items():
+        print(f"Préchauffage {etape:<16} {duree * 1000:8.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+"""
+File de génération des PDF de cotation.
+
+Les rendus sont confiés à un pool borné de processus, et la file a une
+profondeur maximale : au-delà, soumettre() refuse le travail (FileSaturee)
+au lieu d'allonger le délai de tous les utilisateurs. L'attente d'un PDF
+accepté reste ainsi bornée (au plus profondeur_max / workers rendus devant
+lui).
+
+Les travaux sont identifiés par l'empreinte de leur pdf_data : une cotation
+soumise deux fois n'est rendue qu'une fois, et les derniers PDF terminés
+restent disponibles en mémoire.
+
+Les workers renvoient leurs mesures (durées des sections du PDF, voir
+metriques.py) par une file de messages ; elles sont ajoutées à celles du
+processus principal à la fin de chaque rendu.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+
+import metriques
+from pdf_cotation import empreinte_pdf_data
+from pdf_lot import RENDUS_PAR_WORKER, nb_workers_disponibles
+
+# Statuts d'un travail
+EN_ATTENTE = "en_attente"
+EN_COURS = "en_cours"
+TERMINE = "termine"
+ECHEC = "echec"
+
+# Nombre de PDF terminés gardés en mémoire
+CONSERVATION = 64
+
+journal = logging.getLogger(__name__)
+
+
+class FileSaturee(RuntimeError):
+    """La file de rendus est pleine : réessayer plus tard"""
+
+
+# File des mesures du worker vers le processus principal (dans le worker)
+_mesures = None
+
+
+def _initialiser_worker(mesures):
+    """Exécuté une fois par processus : importe fpdf et charge les ressources du PDF"""
+    global _mesures
+    import pdf_cotation
+
+    pdf_cotation.precharger_ressources()
+    _mesures = mesures
+
+
+def _pret():
+    return os.getpid()
+
+
+def _rendre(data, empreinte):
+    from pdf_cotation import generate_pdf
+
+    with metriques.trace() as etapes:
+        pdf = generate_pdf(data)
+    # Envoyées avant le résultat : déjà lisibles quand le rendu est terminé
+    _mesures.put((empreinte, metriques.extraire(), etapes))
+    return pdf
+
+
+class FileRendus:
+    """
+    File de rendus PDF (une par processus). Les workers sont lancés par spawn :
+    l'interface et le service HTTP ont des threads, qu'un fork copierait dans
+    un état quelconque.
+
+    `a_la_fin(empreinte, pdf_bytes)` est appelé (depuis un thread du pool) à
+    chaque PDF terminé, par exemple pour l'enregistrer dans l'historique.
+    """
+
+    def __init__(self, workers=None, profondeur_max=None, conservation=CONSERVATION, a_la_fin=None):
+        self.workers = workers or nb_workers_disponibles()
+        self.profondeur_max = profondeur_max or self.workers * RENDUS_PAR_WORKER
+        self.conservation = conservation
+        self._a_la_fin = a_la_fin
+        contexte = multiprocessing.get_context("spawn")
+        self._mesures = contexte.SimpleQueue()
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=contexte,
+            initializer=_initialiser_worker,
+            initargs=(self._mesures,),
+        )
+        # empreinte -> Future, du plus ancien au plus récemment utilisé
+        self._travaux = OrderedDict()
+        # empreinte -> durées des sections du rendu, en attendant sa fin
+        self._etapes = {}
+        self._actifs = 0
+        self._verrou = threading.Lock()
+
+    def soumettre(self, pdf_data, empreinte=None):
+        """
+        Confie le rendu de pdf_data à la file et retourne son empreinte. Un
+        travail en cours ou terminé pour le même contenu est réutilisé (un
+        échec est relancé). Lève FileSaturee si la file est pleine.
+        """
+        empreinte = empreinte or empreinte_pdf_data(pdf_data)
+        with self._verrou:
+            futur = self._travaux.get(empreinte)
+            if futur is not None and not (futur.done() and futur.exception() is not None):
+                self._travaux.move_to_end(empreinte)
+                return empreinte
+            if self._actifs >= self.profondeur_max:
+                metriques.compter("pdf_refuse")
+                raise FileSaturee(
+                    f"{self._actifs} PDF en cours de génération (maximum {self.profondeur_max})"
+                )
+            soumission = time.perf_counter()
+            futur = self._pool.submit(_rendre, pdf_data, empreinte)
+            self._actifs += 1
+            self._travaux[empreinte] = futur
+            self._travaux.move_to_end(empreinte)
+        futur.add_done_callback(lambda f: self._terminer(empreinte, f, soumission))
+        return empreinte
+
+    def deposer(self, empreinte, pdf_bytes):
+        """Ajoute aux PDF terminés un PDF déjà disponible (relu de l'historique par exemple)"""
+        with self._verrou:
+            futur = self._travaux.get(empreinte)
+            if futur is not None and not futur.done():
+                return
+            self._travaux[empreinte] = futur = Future()
+            futur.set_result(pdf_bytes)
+            self._travaux.move_to_end(empreinte)
+            self._elaguer()
+
+    def _terminer(self, empreinte, futur, soumission):
+        duree = time.perf_counter() - soumission
+        with self._verrou:
+            self._actifs -= 1
+            self._elaguer()
+            while not self._mesures.empty():
+                empreinte_rendu, mesures, etapes = self._mesures.get()
+                metriques.fusionner(mesures)
+                self._etapes[empreinte_rendu] = etapes
+            etapes = self._etapes.pop(empreinte, {})
+        # Attente dans la file comprise
+        metriques.observer("pdf.file", duree)
+        echec = futur.cancelled() or futur.exception() is not None
+        metriques.compter("pdf_echec" if echec else "pdf")
+        metriques.journaliser("pdf", empreinte=empreinte, echec=echec, duree_s=duree, etapes=etapes)
+        if self._a_la_fin is None or echec:
+            return
+        try:
+            self._a_la_fin(empreinte, futur.result())
+        except Exception:
+            journal.exception("Échec du traitement du PDF %s", empreinte)
+
+    def _elaguer(self):
+        """Oublie les travaux terminés les moins récents au-delà de `conservation`"""
+        termines = [e for e, f in self._travaux.items() if f.done()]
+        for empreinte in termines[:max(0, len(termines) - self.conservation)]:
+            del self._travaux[empreinte]
+
+    def statut(self, empreinte):
+        """EN_ATTENTE, EN_COURS, TERMINE, ECHEC, ou None pour un travail inconnu"""
+        futur = self._travaux.get(empreinte)
+        if futur is None:
+            return None
+        if futur.done():
+            return ECHEC if futur.cancelled() or futur.exception() is not None else TERMINE
+        return EN_COURS if futur.running() else EN_ATTENTE
+
+    def attendre(self, empreinte, timeout=None):
+        """Attend au plus `timeout` secondes la fin d'un travail et retourne son statut"""
+        futur = self._travaux.get(empreinte)
+        if futur is not None:
+            wait([futur], timeout=timeout)
+        return self.statut(empreinte)
+
+    def travail(self, empreinte):
+        """Future (concurrent.futures) d'un travail ; KeyError pour un travail inconnu"""
+        with self._verrou:
+            futur = self._travaux[empreinte]
+            self._travaux.move_to_end(empreinte)
+        return futur
+
+    def resultat(self, empreinte, timeout=None):
+        """
+        PDF d'un travail, en attendant au plus `timeout` secondes. Lève KeyError
+        pour un travail inconnu, TimeoutError s'il n'est pas terminé à temps,
+        ou l'exception du rendu.
+        """
+        return self.travail(empreinte).result(timeout)
+
+    def prechauffer(self):
+        """
+        Lance tous les workers (import de fpdf, polices et logo) et attend
+        qu'ils soient prêts : le premier rendu ne paie pas leur démarrage.
+        """
+        wait([self._pool.submit(_pret) for _ in range(self.workers)])
+
+    def charge(self):
+        """Travaux acceptés et non terminés, et profondeur maximale de la file"""
+        return {"actifs": self._actifs, "profondeur_max": self.profondeur_max, "workers": self.workers}
+
+    def fermer(self):
+        self._pool.shutdown(cancel_futures=True)
@@ -0,0 +1,361 @@
+"""
+Flotte d'équipements A21/A22 stockée en colonnes.
+
+La classe Flotte garde les équipements dans des tableaux NumPy compacts :
+un code int8 par colonne catégorielle (type, hauteur, classe, franchise),
+la durée en int8 et la valeur à neuf en int64. Elle peut être remplie en
+masse depuis un fichier Excel ou CSV (lire_flotte) et se tarifie sans boucle
+Python par équipement : le taux est calculé une seule fois par clé (type,
+classe, hauteur, durée, franchise) distincte puis appliqué à toutes les
+lignes en une opération NumPy.
+"""
+import numpy as np
+
+from demarrage import module_differe
+from montants import appliquer_taux_tableau, taux_equipement_fcfa
+from tarification import (
+    BAREMES_REFERENCE, CLASSES_EQUIPEMENTS, COEF_DUREE_EQUIPEMENTS, HAUTEURS_GRUE,
+    RABAIS_FRANCHISE_EQUIPEMENTS, TARIFS_ENGINS, TYPES_EQUIPEMENTS,
+    calc_taux_equipement,
+)
+
+# Importé au premier tableau (import, édition ou détail de la flotte)
+pd = module_differe("pandas")
+
+COLONNES_FLOTTE = ["type", "valeur", "duree", "hauteur", "classe", "franchise"]
+
+# Clé de taux : deux équipements de même clé ont le même taux
+CLE_TAUX = ["type", "classe", "hauteur", "duree", "franchise"]
+
+FRANCHISE_DEFAUT = next(iter(RABAIS_FRANCHISE_EQUIPEMENTS))
+
+# Modalités des colonnes catégorielles
+MODALITES_FLOTTE = {
+    "type": TYPES_EQUIPEMENTS,
+    "hauteur": HAUTEURS_GRUE,
+    "classe": CLASSES_EQUIPEMENTS,
+    "franchise": list(RABAIS_FRANCHISE_EQUIPEMENTS.keys()),
+}
+
+# En-têtes acceptés dans les fichiers importés (après mise en minuscules)
+ALIAS_COLONNES = {
+    "type d'équipement": "type",
+    "type d'equipement": "type",
+    "valeur à neuf": "valeur",
+    "valeur a neuf": "valeur",
+    "valeur à neuf (fcfa)": "valeur",
+    "durée": "duree",
+    "durée (mois)": "duree",
+    "duree (mois)": "duree",
+    "hauteur grue": "hauteur",
+}
+
+# Nombre maximal d'erreurs détaillées dans le message de validation
+MAX_ERREURS_AFFICHEES = 10
+
+# =========================================================
+# CONSTRUCTION ET IMPORT
+# =========================================================
+
+def valider_flotte(df, numeros=None):
+    """
+    Vérifie et normalise un tableau d'équipements (une ligne par équipement).
+
+    Les colonnes type, valeur et duree sont obligatoires ; classe (engins et
+    grues à tour), hauteur (grues à tour) et franchise (défaut : standard)
+    sont complétées si absentes. Lève ValueError en listant les lignes
+    invalides (numérotées par `numeros`, par défaut le numéro de ligne du
+    fichier), sinon retourne le tableau normalisé (colonnes COLONNES_FLOTTE).
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower()).rename(columns=ALIAS_COLONNES)
+    manquantes = [c for c in ("type", "valeur", "duree") if c not in df.columns]
+    if manquantes:
+        raise ValueError(f"Colonnes obligatoires manquantes : {', '.join(manquantes)}")
+    df = df.reindex(columns=COLONNES_FLOTTE).reset_index(drop=True)
+
+    def texte(colonne):
+        valeurs = df[colonne].astype("string").str.strip()
+        return valeurs.where(valeurs.notna() & (valeurs != ""), None).astype(object)
+
+    for colonne in MODALITES_FLOTTE:
+        df[colonne] = texte(colonne)
+    df["franchise"] = df["franchise"].fillna(FRANCHISE_DEFAUT)
+    valeur = pd.to_numeric(df["valeur"], errors="coerce")
+    duree = pd.to_numeric(df["duree"], errors="coerce")
+
+    grue = (df["type"] == "Grue à tour").to_numpy()
+    avec_classe = grue | df["type"].isin(list(TARIFS_ENGINS)).to_numpy()
+    controles = [
+        (~df["type"].isin(TYPES_EQUIPEMENTS).to_numpy(), "type inconnu"),
+        ((valeur.isna() | (valeur < 0) | (valeur % 1 != 0)).to_numpy(), "valeur invalide"),
+        (~duree.isin(list(COEF_DUREE_EQUIPEMENTS)).to_numpy(), "duree invalide (1 à 12 mois)"),
+        (avec_classe & ~df["classe"].isin(CLASSES_EQUIPEMENTS).to_numpy(), "classe invalide"),
+        (grue & ~df["hauteur"].isin(HAUTEURS_GRUE).to_numpy(), "hauteur invalide"),
+        (~df["franchise"].isin(MODALITES_FLOTTE["franchise"]).to_numpy(), "franchise inconnue"),
+    ]
+    if numeros is None:
+        # Numéro de ligne du fichier (l'en-tête est la ligne 1)
+        numeros = np.arange(len(df)) + 2
+    erreurs = []
+    for masque, message in controles:
+        erreurs.extend((int(numeros[i]), message) for i in np.flatnonzero(masque))
+    if erreurs:
+        erreurs.sort()
+        details = "; ".join(f"ligne {ligne} : {message}" for ligne, message in erreurs[:MAX_ERREURS_AFFICHEES])
+        if len(erreurs) > MAX_ERREURS_AFFICHEES:
+            details += f" (+{len(erreurs) - MAX_ERREURS_AFFICHEES} autres)"
+        raise ValueError(f"{len(erreurs)} erreur(s) dans la flotte : {details}")
+
+    # Classe et hauteur ne concernent que certains types : ignorées ailleurs
+    df["classe"] = df["classe"].where(avec_classe, None)
+    df["hauteur"] = df["hauteur"].where(grue, None)
+    df["valeur"] = valeur.astype(np.int64)
+    df["duree"] = duree.astype(np.int8)
+    return df
+
+
+def lire_flotte(fichier, nom=None):
+    """Lit une flotte depuis un fichier .xlsx ou .csv (chemin ou fichier ouvert)"""
+    nom = (nom or getattr(fichier, "name", None) or str(fichier)).lower()
+    if nom.endswith(".xlsx"):
+        # openpyxl en lecture seule : plus rapide que pd.read_excel
+        from openpyxl import load_workbook
+
+        classeur = load_workbook(fichier, read_only=True, data_only=True)
+        try:
+            lignes = list(classeur.active.iter_rows(values_only=True))
+        finally:
+            classeur.close()
+        entetes = lignes[0] if lignes else ()
+        df = pd.DataFrame(lignes[1:], columns=entetes, dtype=object)
+    else:
+        df = pd.read_csv(fichier, sep=None, engine="python", dtype=str, encoding="utf-8-sig")
+    return Flotte.depuis_dataframe(valider_flotte(df.dropna(how="all")))
+
+# =========================================================
+# STOCKAGE COMPACT
+# =========================================================
+
+# Colonnes stockées sous forme de codes (-1 : sans objet)
+COLONNES_CODEES = ["type", "hauteur", "classe", "franchise"]
+
+
+class Flotte:
+    """
+    Flotte d'équipements en tableaux NumPy de capacité croissante.
+
+    Chaque équipement occupe un emplacement dont le numéro sert d'identifiant
+    (stable tant que la flotte n'est pas compactée). Les ajouts doublent la
+    capacité au besoin et les suppressions marquent l'emplacement comme
+    libre ; les emplacements libres sont récupérés quand ils deviennent
+    majoritaires. Ajout, suppression et suppression en masse sont donc en
+    O(1) amorti par équipement.
+    """
+
+    CAPACITE_INITIALE = 16
+
+    def __init__(self, capacite=CAPACITE_INITIALE):
+        self._codes = {colonne: np.full(capacite, -1, dtype=np.int8) for colonne in COLONNES_CODEES}
+        self._duree = np.zeros(capacite, dtype=np.int8)
+        self._valeur = np.zeros(capacite, dtype=np.int64)
+        self._actif = np.zeros(capacite, dtype=bool)
+        self._taille = 0    # emplacements utilisés (actifs ou supprimés)
+        self._nb_actifs = 0
+
+    @classmethod
+    def depuis_dataframe(cls, df):
+        """Construit une flotte depuis un tableau validé (voir valider_flotte)"""
+        flotte = cls(max(len(df), cls.CAPACITE_INITIALE))
+        n = len(df)
+        for colonne in COLONNES_CODEES:
+            flotte._codes[colonne][:n] = pd.Categorical(df[colonne], categories=MODALITES_FLOTTE[colonne]).codes
+        flotte._duree[:n] = df["duree"].to_numpy()
+        flotte._valeur[:n] = df["valeur"].to_numpy()
+        flotte._actif[:n] = True
+        flotte._taille = flotte._nb_actifs = n
+        return flotte
+
+    def __len__(self):
+        return self._nb_actifs
+
+    def __bool__(self):
+        return self._nb_actifs > 0
+
+    @property
+    def nbytes(self):
+        """Mémoire occupée par les tableaux (octets)"""
+        return sum(codes.nbytes for codes in self._codes.values()) + \
+            self._duree.nbytes + self._valeur.nbytes + self._actif.nbytes
+
+    def _reserver(self, nombre):
+        """Garantit la place pour `nombre` équipements de plus (capacité doublée)"""
+        besoin = self._taille + nombre
+        capacite = len(self._actif)
+        if besoin <= capacite:
+            return
+        while capacite < besoin:
+            capacite *= 2
+
+        def agrandir(tableau, remplissage):
+            nouveau = np.full(capacite, remplissage, dtype=tableau.dtype)
+            nouveau[:self._taille] = tableau[:self._taille]
+            return nouveau
+
+        self._codes = {colonne: agrandir(codes, -1) for colonne, codes in self._codes.items()}
+        self._duree = agrandir(self._duree, 0)
+        self._valeur = agrandir(self._valeur, 0)
+        self._actif = agrandir(self._actif, False)
+
+    def ajouter(self, equipement):
+        """Ajoute un équipement (dict de COLONNES_FLOTTE) et retourne son identifiant"""
+        self._reserver(1)
+        i = self._taille
+        for colonne in COLONNES_CODEES:
+            valeur = equipement.get(colonne)
+            self._codes[colonne][i] = MODALITES_FLOTTE[colonne].index(valeur) if valeur else -1
+        self._duree[i] = equipement["duree"]
+        self._valeur[i] = equipement["valeur"]
+        self._actif[i] = True
+        self._taille += 1
+        self._nb_actifs += 1
+        return i
+
+    def etendre(self, autre):
+        """Ajoute à la suite tous les équipements d'une autre flotte"""
+        masque = autre._actif[:autre._taille]
+        n = int(masque.sum())
+        self._reserver(n)
+        debut, fin = self._taille, self._taille + n
+        for colonne in COLONNES_CODEES:
+            self._codes[colonne][debut:fin] = autre._codes[colonne][:autre._taille][masque]
+        self._duree[debut:fin] = autre._duree[:autre._taille][masque]
+        self._valeur[debut:fin] = autre._valeur[:autre._taille][masque]
+        self._actif[debut:fin] = True
+        self._taille = fin
+        self._nb_actifs += n
+
+    def supprimer(self, identifiants):
+        """Supprime un équipement ou une liste d'équipements (identifiants)"""
+        identifiants = np.atleast_1d(np.asarray(identifiants, dtype=np.intp))
+        identifiants = identifiants[(identifiants >= 0) & (identifiants < self._taille)]
+        identifiants = identifiants[self._actif[identifiants]]
+        self._actif[identifiants] = False
+        self._nb_actifs -= len(np.unique(identifiants))
+        if self._taille - self._nb_actifs > max(self._nb_actifs, self.CAPACITE_INITIALE):
+            self._compacter()
+
+    def vider(self):
+        self.__init__()
+
+    def _compacter(self):
+        """Récupère les emplacements supprimés (les identifiants changent)"""
+        masque = self._actif[:self._taille]
+        n = self._nb_actifs
+        for codes in self._codes.values():
+            codes[:n] = codes[:self._taille][masque]
+            codes[n:] = -1
+        self._duree[:n] = self._duree[:self._taille][masque]
+        self._valeur[:n] = self._valeur[:self._taille][masque]
+        self._actif[:n] = True
+        self._actif[n:] = False
+        self._taille = n
+
+    def identifiants(self):
+        """Identifiants des équipements présents, dans l'ordre d'ajout"""
+        return np.flatnonzero(self._actif[:self._taille])
+
+    def _colonnes(self):
+        """Codes, durées et valeurs des équipements présents"""
+        ids = self.identifiants()
+        codes = {colonne: self._codes[colonne][ids] for colonne in COLONNES_CODEES}
+        return ids, codes, self._duree[ids], self._valeur[ids]
+
+    def vers_dataframe(self):
+        """Tableau des équipements présents (index : identifiants)"""
+        ids, codes, duree, valeur = self._colonnes()
+        colonnes = {
+            colonne: pd.Categorical.from_codes(codes[colonne], categories=MODALITES_FLOTTE[colonne])
+            for colonne in COLONNES_CODEES
+        }
+        colonnes["valeur"] = valeur
+        colonnes["duree"] = duree
+        return pd.DataFrame(colonnes, index=ids)[COLONNES_FLOTTE]
+
+    def __iter__(self):
+        """Équipements présents sous forme de dicts (format de calc_prime_equipements)"""
+        ids, codes, duree, valeur = self._colonnes()
+        for k in range(len(ids)):
+            yield _decoder(codes, duree, valeur, k)
+
+
+def _decoder(codes, duree, valeur, k):
+    """Équipement à la position k des colonnes codées, sous forme de dict"""
+    equipement = {
+        colonne: MODALITES_FLOTTE[colonne][codes[colonne][k]] if codes[colonne][k] >= 0 else None
+        for colonne in COLONNES_CODEES
+    }
+    equipement["duree"] = int(duree[k])
+    equipement["valeur"] = int(valeur[k])
+    return equipement
+
+# =========================================================
+# TARIFICATION GROUPÉE
+# =========================================================
+
+def _taux_par_cle(flotte, calcul, dtype):
+    """Applique `calcul` (taux d'un équipement) une fois par clé distincte et le diffuse à la flotte"""
+    _, codes, duree, valeur = flotte._colonnes()
+    if not len(duree):
+        return np.empty(0, dtype=dtype)
+    # Clé entière unique par combinaison (codes décalés de 1 pour « sans objet »)
+    cle = np.ravel_multi_index(
+        [codes[colonne] + 1 for colonne in COLONNES_CODEES] + [duree],
+        [len(MODALITES_FLOTTE[colonne]) + 1 for colonne in COLONNES_CODEES] + [max(COEF_DUREE_EQUIPEMENTS) + 1],
+    )
+    _, premiers, groupes = np.unique(cle, return_index=True, return_inverse=True)
+    taux_groupes = np.array([calcul(_decoder(codes, duree, valeur, k)) for k in premiers], dtype=dtype)
+    return taux_groupes[groupes]
+
+
+def taux_flotte(flotte, baremes=BAREMES_REFERENCE):
+    """
+    Taux (‰, durée et franchise appliquées) de chaque équipement présent.
+
+    Le taux n'est calculé (calc_taux_equipement) qu'une fois par clé distincte.
+    """
+    return _taux_par_cle(flotte, lambda eq: calc_taux_equipement(eq, baremes), np.float64)
+
+
+def taux_flotte_fcfa(flotte, baremes=BAREMES_REFERENCE):
+    """Taux entiers (échelle montants.ECHELLE_TAUX) de chaque équipement présent"""
+    return _taux_par_cle(flotte, lambda eq: taux_equipement_fcfa(eq, baremes), np.int64)
+
+
+def tarifer_flotte(flotte, baremes=BAREMES_REFERENCE):
+    """
+    Retourne le détail par équipement : le tableau de la flotte complété des
+    colonnes taux (‰) et prime (FCFA entiers, dont la somme est prime_flotte_fcfa).
+    """
+    detail = flotte.vers_dataframe()
+    detail["taux"] = taux_flotte(flotte, baremes)
+    detail["prime"] = appliquer_taux_tableau(
+        detail["valeur"].to_numpy(dtype=np.int64), taux_flotte_fcfa(flotte, baremes)
+    )
+    return detail
+
+
+def prime_flotte(flotte, baremes=BAREMES_REFERENCE):
+    """Prime totale A21/A22 de la flotte (mêmes additions que calc_prime_equipements)"""
+    if not flotte:
+        return 0
+    _, _, _, valeur = flotte._colonnes()
+    primes = valeur.astype(np.float64) * (taux_flotte(flotte, baremes) / 1000)
+    return sum(primes.tolist())
+
+
+def prime_flotte_fcfa(flotte, baremes=BAREMES_REFERENCE):
+    """Prime totale A21/A22 en FCFA entiers (mêmes francs que calc_prime_equipements_fcfa)"""
+    if not flotte:
+        return 0
+    _, _, _, valeur = flotte._colonnes()
+    return int(appliquer_taux_tableau(valeur, taux_flotte_fcfa(flotte, baremes)).sum())
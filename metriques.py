@@ -0,0 +1,259 @@
+"""
+Mesures de performance : durées par étape et compteurs d'événements.
+
+Les durées sont rangées dans des histogrammes à bornes fixes (au format des
+histogrammes Prometheus) : une mesure coûte deux lectures d'horloge et un
+incrément sous verrou, et la mémoire ne dépend que du nombre d'étapes. Le p99
+d'une étape se lit ensuite côté Prometheus (histogram_quantile).
+
+Export :
+    - texte_prometheus() : format d'exposition Prometheus (servi par
+      serveur_cotation.py sur GET /metriques) ;
+    - TRC_METRIQUES_FICHIER : fichier réécrit toutes les
+      TRC_METRIQUES_INTERVALLE secondes (collecteur « textfile » de
+      node_exporter), voir exporter_periodiquement() ;
+    - TRC_JOURNAL_COTATIONS : une ligne JSON par cotation et par PDF, avec la
+      durée de chaque étape, dans ce fichier ("-" : sortie d'erreur).
+
+Les processus de rendu PDF transmettent leurs mesures au processus principal
+(extraire() / fusionner(), voir file_rendus.py).
+"""
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Bornes supérieures (s) des histogrammes de durée
+BORNES = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+PREFIXE = "trc"
+
+FICHIER = os.environ.get("TRC_METRIQUES_FICHIER")
+INTERVALLE_EXPORT = float(os.environ.get("TRC_METRIQUES_INTERVALLE", 15))
+JOURNAL_COTATIONS = os.environ.get("TRC_JOURNAL_COTATIONS")
+
+journal = logging.getLogger(__name__)
+journal_cotations = logging.getLogger(f"{__name__}.cotations")
+if JOURNAL_COTATIONS:
+    _sortie = logging.StreamHandler(sys.stderr) if JOURNAL_COTATIONS == "-" else \
+        logging.FileHandler(JOURNAL_COTATIONS, encoding="utf-8")
+    _sortie.setFormatter(logging.Formatter("%(message)s"))
+    journal_cotations.addHandler(_sortie)
+    journal_cotations.setLevel(logging.INFO)
+    journal_cotations.propagate = False
+
+_verrou = threading.Lock()
+# étape -> [effectifs par borne (dernier : au-delà), somme des durées]
+_durees = {}
+# événement -> nombre
+_evenements = {}
+# Étapes mesurées par le thread courant pendant une trace (voir trace())
+_local = threading.local()
+
+# =========================================================
+# MESURE
+# =========================================================
+
+def observer(etape, duree):
+    """Ajoute une durée (s) à l'histogramme de `etape`"""
+    rang = bisect.bisect_left(BORNES, duree)
+    with _verrou:
+        histogramme = _durees.get(etape)
+        if histogramme is None:
+            histogramme = _durees[etape] = [[0] * (len(BORNES) + 1), 0.0]
+        histogramme[0][rang] += 1
+        histogramme[1] += duree
+    etapes = getattr(_local, "etapes", None)
+    if etapes is not None:
+        etapes[etape] = etapes.get(etape, 0.0) + duree
+
+
+def compter(evenement, nombre=1):
+    with _verrou:
+        _evenements[evenement] = _evenements.get(evenement, 0) + nombre
+
+
+class Chrono:
+    """
+    Mesure la durée d'un bloc `with` ou de chaque appel d'une fonction
+    décorée :
+
+        with Chrono("tarification"):
+            ...
+
+        @Chrono("pdf")
+        def generate_pdf(data): ...
+    """
+
+    __slots__ = ("etape", "debut")
+
+    def __init__(self, etape):
+        self.etape = etape
+
+    def __enter__(self):
+        self.debut = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observer(self.etape, time.perf_counter() - self.debut)
+
+    def __call__(self, fonction):
+        etape = self.etape
+
+        def chronometree(*args, **kwargs):
+            debut = time.perf_counter()
+            try:
+                return fonction(*args, **kwargs)
+            finally:
+                observer(etape, time.perf_counter() - debut)
+
+        chronometree.__name__ = fonction.__name__
+        chronometree.__doc__ = fonction.__doc__
+        chronometree.__wrapped__ = fonction
+        return chronometree
+
+
+class Tours:
+    """
+    Durées successives des sections d'un traitement : marquer(section)
+    enregistre le temps écoulé depuis la marque précédente sous
+    « prefixe.section ».
+    """
+
+    __slots__ = ("prefixe", "debut")
+
+    def __init__(self, prefixe):
+        self.prefixe = prefixe
+        self.debut = time.perf_counter()
+
+    def marquer(self, section):
+        maintenant = time.perf_counter()
+        observer(f"{self.prefixe}.{section}", maintenant - self.debut)
+        self.debut = maintenant
+
+
+@contextmanager
+def trace():
+    """
+    Collecte les durées des étapes mesurées par ce thread dans le bloc `with`
+    (dict étape -> secondes), pour les journaliser avec la cotation.
+    """
+    precedentes = getattr(_local, "etapes", None)
+    _local.etapes = etapes = {}
+    try:
+        yield etapes
+    finally:
+        _local.etapes = precedentes
+
+
+def journaliser(evenement, **champs):
+    """Ligne JSON de l'événement dans le journal des cotations (s'il est activé)"""
+    if JOURNAL_COTATIONS:
+        ligne = {"horodatage": round(time.time(), 3), "evenement": evenement, **champs}
+        journal_cotations.info(json.dumps(ligne, ensure_ascii=False, default=str))
+
+# =========================================================
+# TRANSFERT ENTRE PROCESSUS
+# =========================================================
+
+def extraire():
+    """Mesures accumulées par ce processus depuis le dernier appel (remises à zéro)"""
+    global _durees, _evenements
+    with _verrou:
+        etat = {"durees": _durees, "evenements": _evenements}
+        _durees, _evenements = {}, {}
+    return etat
+
+
+def fusionner(etat):
+    """Ajoute les mesures d'un autre processus (résultat de extraire())"""
+    with _verrou:
+        for etape, (effectifs, somme) in etat["durees"].items():
+            histogramme = _durees.get(etape)
+            if histogramme is None:
+                histogramme = _durees[etape] = [[0] * (len(BORNES) + 1), 0.0]
+            histogramme[0] = [a + b for a, b in zip(histogramme[0], effectifs)]
+            histogramme[1] += somme
+        for evenement, nombre in etat["evenements"].items():
+            _evenements[evenement] = _evenements.get(evenement, 0) + nombre
+
+# =========================================================
+# EXPORT
+# =========================================================
+
+def _etiquette(valeur):
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def texte_prometheus():
+    """Mesures au format d'exposition texte de Prometheus (version 0.0.4)"""
+    with _verrou:
+        durees = {etape: (list(effectifs), somme) for etape, (effectifs, somme) in _durees.items()}
+        evenements = dict(_evenements)
+
+    nom = f"{PREFIXE}_etape_duree_secondes"
+    lignes = [
+        f"# HELP {nom} Durée des étapes (rerun, tarification, rendu PDF et ses sections...)",
+        f"# TYPE {nom} histogram",
+    ]
+    for etape in sorted(durees):
+        effectifs, somme = durees[etape]
+        etiquette = f'etape="{_etiquette(etape)}"'
+        cumul = 0
+        for borne, effectif in zip(BORNES, effectifs):
+            cumul += effectif
+            lignes.append(f'{nom}_bucket{{{etiquette},le="{borne}"}} {cumul}')
+        cumul += effectifs[-1]
+        lignes.append(f'{nom}_bucket{{{etiquette},le="+Inf"}} {cumul}')
+        lignes.append(f"{nom}_sum{{{etiquette}}} {somme!r}")
+        lignes.append(f"{nom}_count{{{etiquette}}} {cumul}")
+
+    nom = f"{PREFIXE}_evenements_total"
+    lignes += [f"# HELP {nom} Nombre d'événements (cotations, PDF, refus...)", f"# TYPE {nom} counter"]
+    for evenement in sorted(evenements):
+        lignes.append(f'{nom}{{evenement="{_etiquette(evenement)}"}} {evenements[evenement]}')
+    return "\n".join(lignes) + "\n"
+
+
+def ecrire_fichier(chemin=None):
+    """Écrit texte_prometheus() dans `chemin` (remplacement atomique)"""
+    chemin = chemin or FICHIER
+    provisoire = f"{chemin}.{os.getpid()}.tmp"
+    with open(provisoire, "w", encoding="utf-8") as fichier:
+        fichier.write(texte_prometheus())
+    os.replace(provisoire, chemin)
+
+
+_exportateur = None
+
+def exporter_periodiquement(chemin=None, intervalle=INTERVALLE_EXPORT):
+    """
+    Réécrit le fichier de mesures toutes les `intervalle` secondes (thread de
+    fond, un seul par processus). Sans chemin ni TRC_METRIQUES_FICHIER, ne
+    fait rien.
+    """
+    global _exportateur
+    chemin = chemin or FICHIER
+    if not chemin:
+        return
+    with _verrou:
+        if _exportateur is not None:
+            return
+        _exportateur = threading.Thread(target=_exporter, args=(chemin, intervalle), name="metriques", daemon=True)
+    _exportateur.start()
+
+
+def _exporter(chemin, intervalle):
+    while True:
+        try:
+            ecrire_fichier(chemin)
+        except OSError:
+            journal.exception("Échec de l'écriture des mesures dans %s", chemin)
+        time.sleep(intervalle)
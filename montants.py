@@ -0,0 +1,313 @@
+"""
+Montants exacts en francs CFA entiers.
+
+tarification.price_quote et portefeuille.price_portfolio calculent en
+flottants et n'arrondissent qu'à l'affichage : d'un lot à l'autre, le PDF,
+l'interface et les exports comptables peuvent différer d'un franc. Ce
+module reprend les mêmes calculs en arithmétique entière :
+
+- montants en FCFA entiers (int, ou int64 pour les tableaux NumPy) ;
+- taux en entiers (1 ‰ = ECHELLE_TAUX), compilés depuis les barèmes en
+  décimal exact : ils ne sont pas arrondis ;
+- arrondi au franc le plus proche (demi-franc arrondi à l'écart de zéro),
+  à chaque étape et seulement là :
+    1. montants saisis (valeur des travaux, primes DT, valeurs à neuf) ;
+    2. chaque prime de garantie = montant × taux effectif de la garantie ;
+    3. accessoires = 6 % de la prime nette ;
+    4. taxes = 14,5 % de (prime nette + accessoires)
+  (taux des barèmes de référence ; chaque version a les siens, voir
+  tarification.Baremes).
+  Prime nette et prime TTC sont des sommes exactes.
+
+Les fonctions scalaires (int Python) et vectorisées (int64, sans dépassement
+pour des taux inférieurs à 92 ‰ et des primes sur 63 bits) donnent les mêmes
+francs, ligne par ligne.
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import lru_cache
+
+import numpy as np
+
+from tarification import (
+    AXES_CUBE, BAREMES_REFERENCE, FORME_CUBE, TAUX_EXISTANTS, TAUX_RC, TAUX_TRAVAUX,
+    QuoteResult, get_cube, get_taux_base, indice_cube,
+)
+
+# Taux entiers : 1 ‰ = ECHELLE_TAUX ; prime = montant × taux / DIVISEUR_TAUX.
+# Dix décimales suffisent à écrire exactement tous les taux des barèmes (les
+# suppléments RC en ajoutent jusqu'à huit aux deux des taux de base).
+ECHELLE_TAUX = 10 ** 10
+DIVISEUR_TAUX = 1000 * ECHELLE_TAUX
+
+# Découpage du reste du montant pour le produit vectorisé (voir appliquer_taux_tableau)
+_COUPURE = 10 ** 6
+
+# Plus grand dénominateur des accessoires et taxes calculés en int64 (taux
+# inférieurs à 100 % : bas × facteur < 3·10⁹ × 3·10⁹ tient sur 63 bits)
+_DENOMINATEUR_MAX = 3 * 10 ** 9
+
+# Taux effectifs (appliqués au montant des travaux) de la dernière dimension
+# du cube entier
+TAUX_FCFA = ["travaux", "maintenance", "rc", "existants"]
+TAUX_FCFA_TRAVAUX, TAUX_FCFA_MAINTENANCE, TAUX_FCFA_RC, TAUX_FCFA_EXISTANTS = range(len(TAUX_FCFA))
+
+# =========================================================
+# ARITHMÉTIQUE SCALAIRE
+# =========================================================
+
+def _decimal(valeur):
+    """Valeur décimale d'un coefficient ou montant tel qu'il est écrit (1.27, 0.925)"""
+    return Decimal(str(valeur))
+
+
+def _arrondir(numerateur, denominateur):
+    """numerateur / denominateur arrondi au plus proche (demi à l'écart de zéro)"""
+    quotient, reste = divmod(abs(numerateur), denominateur)
+    if 2 * reste >= denominateur:
+        quotient += 1
+    return quotient if numerateur >= 0 else -quotient
+
+
+def fcfa(montant):
+    """Montant saisi (int, float ou chaîne décimale) arrondi au franc ; ValueError si ce n'est pas un nombre fini"""
+    if isinstance(montant, (int, np.integer)):
+        return int(montant)
+    if isinstance(montant, float) and montant.is_integer():
+        return int(montant)
+    try:
+        valeur = _decimal(montant)
+        if valeur.is_finite():
+            return int(valeur.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        pass
+    raise ValueError(f"Montant invalide : {montant!r}")
+
+
+def taux_entier(taux):
+    """Taux (‰, float tel qu'écrit ou Decimal) en entier à l'échelle ECHELLE_TAUX"""
+    if not isinstance(taux, Decimal):
+        taux = _decimal(taux)
+    return int((taux * ECHELLE_TAUX).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def appliquer_taux(montant, taux):
+    """Prime (FCFA) d'un montant (FCFA entiers) au taux entier `taux`"""
+    return _arrondir(montant * taux, DIVISEUR_TAUX)
+
+
+@lru_cache(maxsize=None)
+def proportions(baremes=BAREMES_REFERENCE):
+    """Taux d'accessoires et de taxes d'une version en fractions exactes ((6, 100) -> (3, 50))"""
+    return (
+        _decimal(baremes.taux_accessoires).as_integer_ratio(),
+        _decimal(baremes.taux_taxes).as_integer_ratio(),
+    )
+
+
+def calc_accessoires_fcfa(prime_nette, baremes=BAREMES_REFERENCE):
+    """Accessoires (part de la prime nette), au franc"""
+    (numerateur, denominateur), _ = proportions(baremes)
+    return _arrondir(prime_nette * numerateur, denominateur)
+
+
+def calc_taxes_fcfa(prime_nette, accessoires, baremes=BAREMES_REFERENCE):
+    """Taxes (part de la prime nette et des accessoires), au franc"""
+    _, (numerateur, denominateur) = proportions(baremes)
+    return _arrondir((prime_nette + accessoires) * numerateur, denominateur)
+
+# =========================================================
+# ARITHMÉTIQUE VECTORISÉE (int64)
+# =========================================================
+
+def fcfa_tableau(montants):
+    """Tableau de montants saisis arrondis au franc (int64)"""
+    montants = np.asarray(montants)
+    if np.issubdtype(montants.dtype, np.integer):
+        return montants.astype(np.int64)
+    montants = montants.astype(np.float64)
+    return np.copysign(np.floor(np.abs(montants) + 0.5), montants).astype(np.int64)
+
+
+def _produit_arrondi(montants, facteurs, denominateur):
+    """
+    montants × facteurs / denominateur arrondi comme _arrondir (petits
+    facteurs : bas × facteur < denominateur × facteur tient sur 64 bits).
+    Facteurs et dénominateurs peuvent varier d'une ligne à l'autre.
+    """
+    montants = np.asarray(montants, dtype=np.int64)
+    if np.max(denominateur) > _DENOMINATEUR_MAX:
+        # Taux écrits avec trop de décimales (0.06999999999999999) : _arrondir en entiers Python
+        lignes = np.broadcast(montants, facteurs, denominateur)
+        return np.array(
+            [_arrondir(int(m) * int(f), int(d)) for m, f, d in lignes], dtype=np.int64
+        ).reshape(lignes.shape)
+    haut, bas = np.divmod(np.abs(montants), denominateur)
+    quotient, reste = np.divmod(bas * facteurs, denominateur)
+    resultat = haut * facteurs + quotient + (2 * reste >= denominateur)
+    return np.where(montants < 0, -resultat, resultat)
+
+
+def appliquer_taux_tableau(montants, taux):
+    """
+    Primes (int64) de montants (FCFA) aux taux entiers `taux`, mêmes arrondis
+    qu'appliquer_taux. Le montant est découpé en
+    haut × DIVISEUR_TAUX + b1 × _COUPURE + b0 pour que chaque produit
+    intermédiaire tienne sur 64 bits :
+        montant × taux / DIVISEUR_TAUX
+            = haut × taux + (b1 × taux) / (DIVISEUR_TAUX / _COUPURE) + b0 × taux / DIVISEUR_TAUX
+    """
+    montants = np.asarray(montants, dtype=np.int64)
+    taux = np.asarray(taux, dtype=np.int64)
+    taux_abs = np.abs(taux)
+    haut, reste = np.divmod(np.abs(montants), DIVISEUR_TAUX)
+    b1, b0 = np.divmod(reste, _COUPURE)
+    q1, r1 = np.divmod(b1 * taux_abs, DIVISEUR_TAUX // _COUPURE)
+    quotient, reste = np.divmod(r1 * _COUPURE + b0 * taux_abs, DIVISEUR_TAUX)
+    resultat = haut * taux_abs + q1 + quotient + (2 * reste >= DIVISEUR_TAUX)
+    return np.where((montants < 0) != (taux < 0), -resultat, resultat)
+
+
+def calc_accessoires_tableau(prime_nette, numerateurs, denominateurs):
+    """Accessoires (int64) de chaque prime nette (fractions de proportions(), par ligne ou communes)"""
+    return _produit_arrondi(prime_nette, numerateurs, denominateurs)
+
+
+def calc_taxes_tableau(prime_nette, accessoires, numerateurs, denominateurs):
+    """Taxes (int64) de chaque prime nette et de ses accessoires"""
+    return _produit_arrondi(np.asarray(prime_nette) + accessoires, numerateurs, denominateurs)
+
+# =========================================================
+# TAUX ENTIERS
+# =========================================================
+
+@lru_cache(maxsize=None)
+def get_cube_fcfa(baremes=BAREMES_REFERENCE):
+    """
+    Taux effectifs entiers (TAUX_FCFA) de chaque combinaison du cube de taux
+    d'une version des barèmes.
+
+    Mêmes étapes que get_cube (franchise, déblais, calc_taux_rc), mais en
+    décimal exact (sans arrondi, voir ECHELLE_TAUX). Les taux sont
+    ceux appliqués au montant des travaux : maintenance = 10 % du taux
+    franchise appliqué, existants = demi-taux travaux sur 20 % du montant.
+    """
+    cube = np.zeros(FORME_CUBE + (len(TAUX_FCFA),), dtype=np.int64)
+    for idx in np.ndindex(*FORME_CUBE):
+        (type_travaux, usage_key, structure, duree_key, franchise_key,
+         deblais, trafic_key, prox_key, rc_croisee) = (
+            modalites[i] for modalites, i in zip(AXES_CUBE.values(), idx)
+        )
+        taux_base = _decimal(get_taux_base(type_travaux, 18 if duree_key == "18m" else 12, usage_key, structure, baremes))
+        taux_base_franchise = taux_base * _decimal(baremes.franchise_coef[franchise_key])
+        taux_net_travaux = taux_base_franchise
+        if deblais:
+            taux_net_travaux += Decimal("0.15")
+        params = baremes.rc_params[type_travaux]
+        taux_rc = max(taux_net_travaux * _decimal(params["pct"]), _decimal(params["min"]))
+        supplements = baremes.rc_supplements
+        taux_rc *= _decimal(supplements["trafic"][trafic_key]) * _decimal(supplements["proximite"][prox_key])
+        if rc_croisee:
+            taux_rc *= Decimal("1.10")
+        cube[idx] = [
+            taux_entier(taux_net_travaux),
+            taux_entier(taux_base_franchise * Decimal("0.10")),
+            taux_entier(taux_rc),
+            taux_entier(taux_net_travaux * Decimal("0.5") * Decimal("0.2")),
+        ]
+    cube.setflags(write=False)
+    return cube
+
+
+@lru_cache(maxsize=None)
+def _taux_equipement_fcfa(baremes, type_equipement, hauteur, classe, duree, franchise):
+    if type_equipement == "Grue à tour":
+        taux_annuel = baremes.tarifs_grues_tour[hauteur][classe]
+    elif type_equipement in baremes.tarifs_engins:
+        taux_annuel = baremes.tarifs_engins[type_equipement][classe]
+    else:
+        taux_annuel = baremes.tarifs_baraquements[type_equipement]
+    return taux_entier(
+        _decimal(taux_annuel)
+        * _decimal(baremes.coef_duree_equipements[duree])
+        * _decimal(baremes.rabais_franchise_equipements[franchise])
+    )
+
+
+def taux_equipement_fcfa(eq, baremes=BAREMES_REFERENCE):
+    """Taux entier d'un équipement A21/A22 (mêmes barèmes que calc_taux_equipement)"""
+    return _taux_equipement_fcfa(baremes, eq['type'], eq.get('hauteur'), eq.get('classe'), eq['duree'], eq['franchise'])
+
+
+def calc_prime_equipements_fcfa(equipements, baremes=BAREMES_REFERENCE):
+    """Prime totale A21/A22 : somme des primes de chaque équipement, chacune au franc"""
+    return sum(appliquer_taux(fcfa(eq['valeur']), taux_equipement_fcfa(eq, baremes)) for eq in equipements)
+
+# =========================================================
+# MOTEUR DE COTATION
+# =========================================================
+
+def price_quote_fcfa(q, baremes=BAREMES_REFERENCE):
+    """
+    Même cotation que price_quote, en FCFA entiers : toutes les primes du
+    QuoteResult sont des int (les taux restent en ‰ pour l'affichage).
+    """
+    if q.mode_manuel:
+        prime_nette = fcfa(q.prime_nette_manuelle)
+        accessoires = fcfa(q.accessoires_manuels)
+        taxes = calc_taxes_fcfa(prime_nette, accessoires, baremes)
+        return QuoteResult(
+            prime_nette=prime_nette,
+            accessoires=accessoires,
+            taxes=taxes,
+            prime_ttc=prime_nette + accessoires + taxes,
+        )
+
+    indice = indice_cube(
+        q.type_travaux, q.duree, q.usage_key, q.structure, q.franchise_key, q.ext_deblais,
+        q.rc_suppl_trafic_key, q.rc_suppl_prox_key, q.ext_rc_croisee
+    )
+    taux = get_cube(baremes)[indice]
+    taux_fcfa = get_cube_fcfa(baremes)[indice].tolist()
+    montant = fcfa(q.montant)
+
+    prime_travaux = appliquer_taux(montant, taux_fcfa[TAUX_FCFA_TRAVAUX])
+    prime_maintenance = appliquer_taux(montant, taux_fcfa[TAUX_FCFA_MAINTENANCE]) if q.ext_maintenance else 0
+    prime_rc = appliquer_taux(montant, taux_fcfa[TAUX_FCFA_RC]) if q.ext_rc else 0
+    prime_existants = appliquer_taux(montant, taux_fcfa[TAUX_FCFA_EXISTANTS]) if q.ext_existants else 0
+
+    if q.prime_equipements is not None:
+        prime_equipements = fcfa(q.prime_equipements)
+    else:
+        prime_equipements = calc_prime_equipements_fcfa(q.equipements, baremes)
+
+    prime_maint_etendue = fcfa(q.prime_maint_etendue)
+    prime_maint_const = fcfa(q.prime_maint_const)
+    prime_materiel = fcfa(q.prime_materiel)
+    prime_baraquement = fcfa(q.prime_baraquement)
+    prime_gemp = fcfa(q.prime_gemp)
+    prime_extensions_dt = prime_maint_etendue + prime_maint_const + prime_materiel + prime_baraquement + prime_gemp
+    prime_nette = prime_travaux + prime_maintenance + prime_rc + prime_existants + prime_equipements + prime_extensions_dt
+    accessoires = calc_accessoires_fcfa(prime_nette, baremes)
+    taxes = calc_taxes_fcfa(prime_nette, accessoires, baremes)
+
+    return QuoteResult(
+        taux_net_travaux=float(taux[TAUX_TRAVAUX]),
+        taux_rc=float(taux[TAUX_RC]) if q.ext_rc else 0,
+        taux_existants=float(taux[TAUX_EXISTANTS]) if q.ext_existants else 0,
+        prime_travaux=prime_travaux,
+        prime_maintenance=prime_maintenance,
+        prime_rc=prime_rc,
+        prime_existants=prime_existants,
+        prime_equipements=prime_equipements,
+        nb_equipements=len(q.equipements),
+        prime_maint_etendue=prime_maint_etendue,
+        prime_maint_const=prime_maint_const,
+        prime_materiel=prime_materiel,
+        prime_baraquement=prime_baraquement,
+        prime_gemp=prime_gemp,
+        prime_extensions_dt=prime_extensions_dt,
+        prime_nette=prime_nette,
+        accessoires=accessoires,
+        taxes=taxes,
+        prime_ttc=prime_nette + accessoires + taxes,
+    )
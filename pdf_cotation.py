@@ -0,0 +1,1030 @@
+"""
+Génération du PDF de proposition de cotation TRC (modèle Leadway Assurance).
+
+Module indépendant de Streamlit : generate_pdf() peut être appelé depuis
+l'interface comme depuis les traitements par lot.
+"""
+import copy
+import datetime
+import hashlib
+import io
+import json
+import os
+import threading
+from functools import lru_cache
+
+from demarrage import module_differe
+from metriques import Chrono, Tours
+
+# Importés au premier PDF : le processus de l'interface n'en a pas besoin
+fpdf = module_differe("fpdf")
+ttLib = module_differe("fontTools.ttLib")
+
+# Logo Leadway (à côté de ce module, quel que soit le répertoire courant)
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "leadway logo all formats big-02.png")
+
+# Polices DejaVu (support UTF-8), par style
+POLICES_DEJAVU = {
+    '': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    'B': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+}
+
+# Version de fpdf2 dont ajouter_polices et ajouter_logo reproduisent les
+# structures internes (celle de requirements.txt). Avec une autre version, les
+# API publiques add_font et image sont utilisées : plus lent, mais exact.
+VERSION_FPDF_VERIFIEE = "2.8.9"
+
+# Largeur d'affichage du logo (mm) et résolution à laquelle il est pré-réduit
+LARGEUR_LOGO_MM = 35
+RESOLUTION_LOGO_DPI = 300
+
+# Dictionnaire des clauses
+CLAUSES = {
+    "obligatoires": {
+        "Bâtiment": [
+            "C01 : Installations de lutte contre les incendies",
+            "B03 : Conduits Câbles Souterrains",
+            "C06 : Conditions spéciales (pluies, ruissellements, inondations)",
+        ],
+        "Assainissement": [
+            "B03 : Conduits Câbles Souterrains",
+            "B05 : Dommages Récoltes Forêts Cultures",
+            "C06 : Conditions spéciales (pluies, ruissellements, inondations)",
+            "B09 : Travaux en tranchées",
+            "Clause 117 : Conduites d'eau et égouts",
+        ],
+        "Route": [
+            "B03 : Conduits Câbles Souterrains",
+            "B05 : Dommages Récoltes Forêts Cultures",
+            "C06 : Conditions spéciales (pluies, ruissellements, inondations)",
+            "B09 : Travaux en tranchées",
+        ],
+    },
+    "extensions": {
+        "A05": "Maintenance visite (clause A05)",
+        "A06": "Maintenance étendue (clause A06)",
+        "A07": "Maintenance constructeur (clause A07)",
+        "A17": "Responsabilité Civile Croisée (clause A17)",
+        "A20": "Dommages aux Existants (clause A20)",
+        "A21": "Matériel et installations de chantier (clause A21)",
+        "A22": "Baraquements provisoires (clause A22)",
+        "FANAF01": "Garantie Environnement, Modification Paysagère (clause FANAF01)",
+    },
+}
+
+# =========================================================
+# EXCLUSIONS PAR DÉFAUT (Nouveau champ)
+# =========================================================
+EXCLUSIONS_DEFAUT = """- Erosion naturelle
+- Coffrage, cintres et echafaudages
+- Tassement de terrain en dehors des tassements accidentels
+- Dommage cause par les vibrations, la suppression des points d'appuis
+- Frais d'assechement et d'injection
+- Mauvais beton,
+- Greve, Emeute, Mouvement populaire
+- Dommages aux Recoltes Forets Cultures
+- RC Professionnelle,
+- Faute intentionnelle des preposes de l'assure
+- Reserves du bureau de controle
+- Travaux de demolition et travaux sur les structures et murs porteurs"""
+
+# =========================================================
+# TEXTES FIXES DU PDF (identiques pour toutes les cotations)
+# =========================================================
+PARAGRAPHES_FIXES = {
+    'territoire': "Les garanties s'exercent exclusivement sur le territoire ivoirien.",
+    'intro_exclusions': "En plus des exclusions habituelles, sont egalement exclus :",
+    'intro_documents': "La presente offre est soumise au prospect sous reserve de la transmission obligatoire des documents suivants avant souscription :",
+    'note_finale': "NB : La presente offre est soumise au prospect sous reserve du placement en reassurance facultative de l'excedent de capitaux sur cette affaire.",
+}
+
+# Police (style, taille) de chaque paragraphe fixe
+POLICE_PARAGRAPHES_FIXES = {
+    'territoire': ("", 9),
+    'intro_exclusions': ("", 9),
+    'intro_documents': ("", 9),
+    'note_finale': ("B", 9),
+}
+
+DOCUMENTS_A_TRANSMETTRE = [
+    "Cahier des Clauses Techniques et Particulieres (CCTP)",
+    "Planning detaille des travaux",
+    "Descriptif technique des travaux",
+    "Rapport geotechnique (Etude de sol)",
+]
+
+CLAUSES_A_JOINDRE = [
+    "Installations de lutte contre les Incendies (clause C01)",
+    "Conditions speciales concernant les mesures de securite contre les pluies, ruissellements et inondations (clause C06)",
+    "Maintenance etendue (clause A06)",
+    "Garantie heures supplementaires et expeditions a grande Vitesse (A11)",
+    "Transport Terrestre (A13)",
+    "Responsabilite Civile Croisee (clause A17)",
+    "Planning des travaux (Clause B14)",
+    "Mesures de securite contre les pluies, ruissellements et inondations (clause C06)",
+    "Garantie des biens adjacents et/ou des biens existants (Clause A20)",
+    "Garantie des Baraquements et Entrepots de chantier (Clause A22)",
+]
+
+# =========================================================
+# FONCTIONS
+# =========================================================
+
+def date_document(data):
+    """Date imprimée sur la cotation : date_cotation ('jj.mm.aaaa') ou, à défaut, aujourd'hui"""
+    try:
+        return datetime.datetime.strptime(data.get("date_cotation"), "%d.%m.%Y").date()
+    except (TypeError, ValueError):
+        return datetime.date.today()
+
+
+def empreinte_pdf_data(pdf_data):
+    """Empreinte stable du contenu de pdf_data (indépendante de l'ordre des clés)"""
+    contenu = json.dumps(pdf_data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(contenu.encode("utf-8")).hexdigest()
+
+@Chrono("pdf")
+def generate_pdf(data):
+    """
+    Génère un PDF de proposition de cotation TRC selon le modèle Leadway Assurance
+    """
+    # Durée de chaque section (mesures « pdf.<section> », voir metriques.py)
+    sections = Tours("pdf")
+    pdf = fpdf.FPDF()
+    # Date de création fixée par les données : même pdf_data, même PDF octet pour octet
+    # (l'identifiant /ID du fichier en dépend aussi)
+    pdf.set_creation_date(datetime.datetime.combine(date_document(data), datetime.time(), datetime.timezone.utc))
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    
+    def table_row_multicell(pdf, widths, texts, height=5, align=['L','C','C','C'], border=1, fill=False, font_style=''):
+        """
+        Crée une ligne de tableau avec support multi-lignes pour chaque cellule.
+        widths: liste des largeurs de colonnes
+        texts: liste des textes pour chaque colonne
+        height: hauteur de ligne minimale
+        align: alignement pour chaque colonne
+        border: style de bordure (0=aucune, 1=bordure)
+        fill: remplissage de fond
+        font_style: style de police ('B' pour gras, '' pour normal)
+        """
+        # Sauvegarder la position de départ
+        start_x = pdf.get_x()
+        start_y = pdf.get_y()
+        
+        # Sauvegarder le style de police actuel
+        current_font = pdf.font_family
+        current_size = pdf.font_size_pt
+        current_style = pdf.font_style
+        
+        # Appliquer le style si spécifié
+        if font_style:
+            pdf.set_font(current_font, font_style, current_size)
+        
+        # Découper chaque cellule une seule fois : sert au calcul de la hauteur et au dessin
+        cellules = [decouper_lignes(pdf, width, height, text, alignment) if text else []
+                    for width, text, alignment in zip(widths, texts, align)]
+        max_height = max([height] + [len(lignes) * height for lignes in cellules])
+        
+        # Dessiner les bordures de la ligne complète
+        if border:
+            pdf.rect(start_x, start_y, sum(widths), max_height)
+            # Dessiner les séparateurs verticaux
+            x_pos = start_x
+            for width in widths[:-1]:
+                x_pos += width
+                pdf.line(x_pos, start_y, x_pos, start_y + max_height)
+        
+        # Remplir chaque cellule avec le texte
+        x_pos = start_x
+        for width, text, alignment, lignes in zip(widths, texts, align, cellules):
+            pdf.set_xy(x_pos, start_y)
+            
+            # Dessiner le texte sans bordure (déjà dessinée)
+            if text:
+                # Centrer verticalement si le texte est plus court que max_height
+                text_height = len(lignes) * height
+                y_offset = (max_height - text_height) / 2 if text_height < max_height else 0
+                pdf.set_xy(x_pos, start_y + y_offset)
+                dessiner_lignes(pdf, width, height, lignes, alignment, fill)
+            else:
+                pdf.multi_cell(width, height, text, border=0, align=alignment, fill=fill)
+            
+            x_pos += width
+        
+        # Restaurer le style de police original
+        pdf.set_font(current_font, current_style, current_size)
+        
+        # Se positionner après la ligne
+        pdf.set_xy(start_x, start_y + max_height)
+    
+    def caracteristique_row(pdf, left_label, left_value, right_label, right_value, font_name):
+        """
+        Crée une ligne de caractéristique avec 2 colonnes (gauche et droite) avec retour à la ligne automatique.
+        Les labels restent en place, seules les valeurs font un retour à la ligne.
+        """
+        start_y = pdf.get_y()
+        
+        # Largeurs des colonnes
+        label_w = 45
+        value_w = 50
+        spacing = 5  # espace entre les 2 colonnes
+        right_label_w = 40
+        right_x = pdf.l_margin + label_w + value_w + spacing
+        right_value_w = pdf.w - pdf.l_margin - label_w - value_w - spacing - right_label_w - pdf.r_margin
+        
+        # Découper les valeurs une seule fois, dans la police où elles seront écrites
+        pdf.set_font(font_name, "", 9)
+        lines_left = decouper_lignes(pdf, value_w, 5, clean_text(f": {left_value}")) if left_value else []
+        lines_right = decouper_lignes(pdf, right_value_w, 5, clean_text(f": {right_value}")) if right_value else []
+        
+        # Calculer la hauteur nécessaire pour chaque côté
+        max_height = 6
+        if left_label and left_value:
+            max_height = max(max_height, len(lines_left) * 5)
+        if right_label and right_value:
+            max_height = max(max_height, len(lines_right) * 5)
+        
+        # Dessiner la colonne gauche
+        if left_label:
+            # Label gauche (en gras, reste en place)
+            pdf.set_xy(pdf.l_margin, start_y)
+            pdf.set_font(font_name, "B", 9)
+            pdf.cell(label_w, 6, clean_text(left_label), 0, 0, 'L')
+            
+            # Valeur gauche (peut faire retour à la ligne)
+            if left_value:
+                pdf.set_font(font_name, "", 9)
+                pdf.set_xy(pdf.l_margin + label_w, start_y)
+                dessiner_lignes(pdf, value_w, 5, lines_left)
+        
+        # Dessiner la colonne droite
+        if right_label:
+            # Label droit (en gras, reste en place)
+            pdf.set_xy(right_x, start_y)
+            pdf.set_font(font_name, "B", 9)
+            pdf.cell(right_label_w, 6, clean_text(right_label), 0, 0, 'L')
+            
+            # Valeur droite (peut faire retour à la ligne)
+            if right_value:
+                pdf.set_font(font_name, "", 9)
+                pdf.set_xy(right_x + right_label_w, start_y)
+                dessiner_lignes(pdf, right_value_w, 5, lines_right)
+        
+        # Se positionner après la ligne (en utilisant la hauteur max)
+        pdf.set_xy(pdf.l_margin, start_y + max_height)
+    
+    # Utiliser DejaVu pour supporter UTF-8
+    try:
+        with Chrono("pdf.polices"):
+            ajouter_polices(pdf, 'DejaVu')
+        font_name = "DejaVu"
+    except FileNotFoundError:
+        # Polices DejaVu absentes du système
+        font_name = "Arial"
+    
+    def clean_text(text):
+        return nettoyer_texte(text, font_name)
+    
+    gabarit = compiler_gabarit(font_name)
+    sections.marquer("preparation")
+    
+    def format_amount_fr(amount):
+        """Formats a number with space as a thousand separator and no decimal part."""
+        # Use locale-independent formatting, then replace comma with space
+        # Assumes f-string formatting uses comma for thousands in the environment
+        return f"{amount:,.0f}".replace(",", " ")
+
+    
+    # ============================================================
+    # PAGE 1 - EN-TÊTE ET INFORMATIONS GÉNÉRALES
+    # ============================================================
+    
+    # Logo et date
+    today = date_document(data)
+    logo_path = LOGO_PATH
+    
+    # Vérifier si le logo existe et l'ajouter
+    if os.path.exists(logo_path):
+        # Ajouter le logo tout en haut à gauche
+        try:
+            # Position de départ
+            start_y = pdf.get_y()
+            
+            # Ajouter le logo (largeur 35mm)
+            with Chrono("pdf.image"):
+                ajouter_logo(pdf, logo_path, x=pdf.l_margin, y=start_y)
+            
+            # Positionner la date à droite, alignée avec le haut
+            pdf.set_xy(pdf.w - pdf.r_margin - 70, start_y)
+            pdf.set_font(font_name, "B", 12)
+            pdf.cell(70, 10, clean_text(f"Abidjan, le {today.strftime('%d.%m.%Y')}"), 0, 1, 'R')
+            
+            # Se positionner bien après le logo (25mm après le début pour laisser de l'espace)
+            pdf.set_y(start_y + 25)
+            pdf.ln(5)
+            
+        except OSError:
+            # Si le logo ne peut pas être chargé, afficher le texte par défaut
+            pdf.set_font(font_name, "B", 12)
+            pdf.cell(100, 10, clean_text("LEADWAY"), 0, 0, 'L')
+            pdf.cell(0, 10, clean_text(f"Abidjan, le {today.strftime('%d.%m.%Y')}"), 0, 1, 'R')
+            pdf.set_font(font_name, "", 10)
+            pdf.cell(100, 5, clean_text("Assurance"), 0, 1, 'L')
+            pdf.ln(5)
+    else:
+        # Si le fichier logo n'existe pas, afficher le texte par défaut
+        pdf.set_font(font_name, "B", 12)
+        pdf.cell(100, 10, clean_text("LEADWAY"), 0, 0, 'L')
+        pdf.cell(0, 10, clean_text(f"Abidjan, le {today.strftime('%d.%m.%Y')}"), 0, 1, 'R')
+        pdf.set_font(font_name, "", 10)
+        pdf.cell(100, 5, clean_text("Assurance"), 0, 1, 'L')
+        pdf.ln(5)
+    
+    # BANDEAU JAUNE - TITRE PRINCIPAL
+    pdf.set_fill_color(255, 204, 0)
+    pdf.set_font(font_name, "B", 16)
+    pdf.cell(0, 10, clean_text("OFFRE D'ASSURANCE"), 0, 1, 'C', fill=True)
+    pdf.set_font(font_name, "B", 14)
+    pdf.cell(0, 8, clean_text("TOUS RISQUES CHANTIER"), 0, 1, 'C', fill=True)
+    pdf.set_font(font_name, "B", 12)
+    prospect_text = f"Prospect : {data.get('souscripteur', 'N/A').upper()}"
+    pdf.cell(0, 8, clean_text(prospect_text), 0, 1, 'C', fill=True)
+    
+    pdf.ln(5)
+    pdf.set_font(font_name, "", 9)
+    intro_text = f"Comme suite a votre demande de cotation du {data.get('date_demande', today.strftime('%d/%m/%Y'))} nous vous presentons ci-dessous les conditions de garanties et de primes pour la couverture TRC sollicitee."
+    dessiner_lignes(pdf, pdf.epw, 5, decouper_lignes(pdf, pdf.epw, 5, clean_text(intro_text)))
+    
+    pdf.ln(5)
+    sections.marquer("entete")
+    
+    # SECTION 1 : CARACTÉRISTIQUES DU RISQUE
+    pdf.set_font(font_name, "B", 11)
+    pdf.cell(0, 8, clean_text("1.    CARACTERISTIQUES DU RISQUE"), 0, 1, 'L')
+    pdf.ln(2)
+    
+    pdf.set_font(font_name, "", 9)
+    
+    # Informations en tableau 2 colonnes
+    caracteristiques_data = [
+        ("Nom ou raison sociale", data.get('souscripteur', '-'), 
+         "Duree des travaux", f"{data.get('duree', '-')} mois (Date de debut a preciser)"),
+        ("Situation du chantier", data.get('situation_geo', '-'), 
+         "Maitre d'ouvrage", data.get('maitre_ouvrage', '-')),
+        ("Nature du chantier", data.get('nature_travaux', '-'), 
+         "Maitre d'oeuvre", data.get('maitrise_oeuvre', '-')),
+        ("", "", 
+         "Controle Technique", data.get('bureau_controle', '-')),
+        ("Montant des travaux", f"{format_amount_fr(data.get('montant', 0))} F CFA", 
+         "Duree de Maintenance", f"{data.get('duree_maintenance', '-')} mois"),
+    ]
+    
+    for left_label, left_value, right_label, right_value in caracteristiques_data:
+        caracteristique_row(pdf, left_label, left_value, right_label, right_value, font_name)
+    
+    pdf.ln(5)
+    sections.marquer("caracteristiques")
+    
+    # SECTION 2 : GARANTIES ACCORDEES
+    pdf.set_font(font_name, "B", 11)
+    pdf.cell(0, 8, clean_text("2.    GARANTIES ACCORDEES"), 0, 1, 'L')
+    pdf.ln(2)
+    
+    pdf.set_font(font_name, "", 9)
+    pdf.cell(10, 6, clean_text("-"), 0, 0, 'L')
+    pdf.cell(0, 6, clean_text("Dommages directs a l'ouvrage"), 0, 1, 'L')
+    pdf.cell(10, 6, clean_text("-"), 0, 0, 'L')
+    pdf.cell(0, 6, clean_text("RC+ RC Croisee"), 0, 1, 'L')
+    
+    pdf.ln(5)
+    sections.marquer("garanties")
+    
+    # ============================================================
+    # SECTION 3 : PRIMES (Anciennement Section 4)
+    # ============================================================
+    
+    pdf.set_font(font_name, "B", 11)
+    pdf.cell(0, 8, clean_text("3.    PRIMES"), 0, 1, 'L')
+    pdf.ln(2)
+    
+    # Tableau des primes
+    pdf.set_font(font_name, "", 9)
+    
+    primes_data = [
+        ("Prime nette previsionnelle Initiale", format_amount_fr(data.get('prime_nette', 0)), "F CFA"),
+        ("Reduction commerciale", format_amount_fr(data.get('reduction_commerciale', 0)), "F CFA"),
+        ("Prime nette previsionnelle finale", format_amount_fr(data.get('prime_nette_finale', data.get('prime_nette', 0))), "F CFA"),
+        ("Accessoires", format_amount_fr(data.get('accessoires', 0)), "F CFA"),
+        ("Taxes", format_amount_fr(data.get('taxes', 0)), "F CFA"),
+    ]
+    
+    for label, value, devise in primes_data:
+        pdf.set_font(font_name, "B", 9)
+        pdf.cell(80, 6, clean_text(label), 0, 0, 'L')
+        pdf.set_font(font_name, "", 9)
+        pdf.cell(10, 6, ":", 0, 0, 'C')
+        pdf.cell(50, 6, clean_text(value), 0, 0, 'R')
+        pdf.cell(0, 6, clean_text(devise), 0, 1, 'L')
+    
+    # Prime TTC
+    pdf.set_fill_color(255, 204, 0)
+    pdf.set_font(font_name, "B", 10)
+    pdf.cell(80, 7, clean_text("Prime TTC"), 0, 0, 'L', fill=True)
+    pdf.cell(10, 7, ":", 0, 0, 'C', fill=True)
+    pdf.cell(50, 7, format_amount_fr(data.get('prime_ttc', 0)), 0, 0, 'R', fill=True)
+    pdf.cell(0, 7, clean_text("F CFA"), 0, 1, 'L', fill=True)
+    
+    pdf.ln(10)
+    sections.marquer("primes")
+    
+    # ============================================================
+    # SECTION 4 : LIMITES DE GARANTIES ET FRANCHISES (Anciennement Section 3)
+    # ============================================================
+    
+    pdf.add_page() # Ajout d'un saut de page
+    
+    pdf.set_font(font_name, "B", 11)
+    pdf.cell(0, 8, clean_text("4.    LIMITES DE GARANTIES ET FRANCHISES"), 0, 1, 'L')
+    pdf.ln(2)
+    
+    pdf.set_font(font_name, "", 9)
+    dessiner_lignes(pdf, pdf.epw, 5, gabarit['territoire'])
+    
+    pdf.ln(3)
+    
+    # TABLEAU DES GARANTIES
+    
+    # En-tête du tableau
+    pdf.set_fill_color(255, 204, 0)  # Jaune
+    pdf.set_font(font_name, "B", 9)
+    
+    # Ajustement des largeurs de colonnes
+    col1_w = 95  # Désignation des garanties (inchangé)
+    col2_w = 25  # Statut (Réduit de 30 à 25)
+    col3_w = 30  # Capitaux (Réduit de 35 à 30)
+    col4_w = 40  # Franchises (Augmenté de 30 à 40)
+    
+    pdf.cell(col1_w, 6, clean_text("DESIGNATION DES GARANTIES"), 1, 0, 'C', fill=True)
+    pdf.cell(col2_w, 6, clean_text("STATUT"), 1, 0, 'C', fill=True)
+    pdf.cell(col3_w, 6, clean_text("CAPITAUX"), 1, 0, 'C', fill=True)
+    pdf.cell(col4_w, 6, clean_text("FRANCHISES"), 1, 1, 'C', fill=True)
+    
+    # I- DOMMAGES DIRECTS A L'OUVRAGE
+    pdf.set_fill_color(200, 200, 200)  # Gris clair
+    pdf.set_font(font_name, "B", 9)
+    pdf.cell(col1_w + col2_w + col3_w + col4_w, 6, clean_text("I-        DOMMAGES DIRECTS A L'OUVRAGE"), 1, 1, 'L', fill=True)
+    
+    pdf.set_font(font_name, "", 7)
+    
+    # Période des travaux (Ligne 1)
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Periode des travaux"), 
+                        clean_text("Garanti"), 
+                        format_amount_fr(data.get('montant', 0)), 
+                        clean_text("Evnts. Naturels et maintenance")],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'],
+                       font_style='B')
+    
+    # Période de maintenance (Ligne 2)
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Periode de maintenance"), 
+                        clean_text("Garanti"), 
+                        format_amount_fr(data.get('montant', 0)), 
+                        clean_text("10% mini 15 000 000")],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'],
+                       font_style='B')
+    
+    # Extension de garanties (ligne titre)
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Extension de garanties"), "", "", ""],
+                       height=5,
+                       align=['L', 'C', 'C', 'C'],
+                       font_style='B')
+    
+    # Liste complète des extensions selon l'image - DYNAMIQUE
+    
+    # Honoraires d'expert
+    honoraires_statut = "Garanti" if data.get('ext_honoraires_expert') else "Exclu"
+    honoraires_cap = data.get('honoraires_capitaux', '-') if data.get('ext_honoraires_expert') else '-'
+    honoraires_fran = data.get('honoraires_franchises', '-') if data.get('ext_honoraires_expert') else '-'
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Honoraires d'expert"), 
+                        clean_text(honoraires_statut), 
+                        clean_text(honoraires_cap if honoraires_cap else 'Selon bareme des experts'), 
+                        clean_text(honoraires_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Dommages aux biens et existants
+    existants_statut = "Garanti" if data.get('ext_existants') else "Exclu"
+    existants_cap = data.get('existants_capitaux', '-')
+    existants_fran = data.get('existants_franchises', '-')
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Dommages aux biens et existants"), 
+                        clean_text(existants_statut), 
+                        clean_text(existants_cap), 
+                        clean_text(existants_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Erreur de conception
+    erreur_statut = "Garanti" if data.get('ext_erreur_conception') else "Exclu"
+    erreur_cap = data.get('erreur_capitaux', '-')
+    erreur_fran = data.get('erreur_franchises', '-')
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Erreur de conception (Y compris parties viciees)"), 
+                        clean_text(erreur_statut), 
+                        clean_text(erreur_cap), 
+                        clean_text(erreur_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Engins de chantier
+    engins_statut = "Garanti" if (data.get('ext_materiel') or data.get('ext_baraquement')) else "Exclu"
+    engins_cap = data.get('materiel_capitaux', '-') if data.get('ext_materiel') else '-'
+    engins_fran = data.get('materiel_franchises', '-') if data.get('ext_materiel') else '-'
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Engins de chantier"), 
+                        clean_text(engins_statut), 
+                        clean_text(engins_cap), 
+                        clean_text(engins_fran)],
+                       height=5,
+                       align=['L', 'C', 'C', 'C'])
+    
+    # Heures supplémentaires
+    heures_statut = "Garanti" if data.get('ext_heures_suppl') else "Exclu"
+    heures_cap = data.get('heures_capitaux', '-') if data.get('ext_heures_suppl') else '-'
+    heures_fran = data.get('heures_franchises', '-') if data.get('ext_heures_suppl') else '-'
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Heures supplementaires, Travail de nuit, Transport a grande vitesse"), 
+                        clean_text(heures_statut), 
+                        clean_text(heures_cap), 
+                        clean_text(heures_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Vol des biens entreposés
+    vol_statut = "Garanti" if data.get('ext_vol_entrepose') else "Exclu"
+    vol_cap = data.get('vol_entrepose_capitaux', '-') if data.get('ext_vol_entrepose') else '-'
+    vol_fran = data.get('vol_entrepose_franchises', '-') if data.get('ext_vol_entrepose') else '-'
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Vol des biens entreposes hors chantier"), 
+                        clean_text(vol_statut), 
+                        clean_text(vol_cap), 
+                        clean_text(vol_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Transport terrestre
+    trans_terr_statut = "Garanti" if data.get('ext_transport_terrestre') else "Exclu"
+    trans_terr_cap = data.get('transport_terrestre_capitaux', '-') if data.get('ext_transport_terrestre') else '-'
+    trans_terr_fran = data.get('transport_terrestre_franchises', '-') if data.get('ext_transport_terrestre') else '-'
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Transport terrestre"), 
+                        clean_text(trans_terr_statut), 
+                        clean_text(trans_terr_cap), 
+                        clean_text(trans_terr_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Transport aérien
+    trans_aer_statut = "Garanti" if data.get('ext_transport_aerien') else "Exclu"
+    trans_aer_cap = data.get('transport_aerien_capitaux', '-') if data.get('ext_transport_aerien') else '-'
+    trans_aer_fran = data.get('transport_aerien_franchises', '-') if data.get('ext_transport_aerien') else '-'
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Transport aerien"), 
+                        clean_text(trans_aer_statut), 
+                        clean_text(trans_aer_cap), 
+                        clean_text(trans_aer_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Baraquement
+    baraq_statut = "Garanti" if data.get('ext_baraquement') else "Exclu"
+    baraq_cap = data.get('baraquement_capitaux', '-') if data.get('ext_baraquement') else '-'
+    baraq_fran = data.get('baraquement_franchises', '-') if data.get('ext_baraquement') else '-'
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Baraquement, entrepot, bureaux provisoires"), 
+                        clean_text(baraq_statut), 
+                        clean_text(baraq_cap), 
+                        clean_text(baraq_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Conduits et Souterrains
+    conduits_statut = "Garanti" if data.get('ext_conduits_souterrains') else "Exclu"
+    conduits_cap = data.get('conduits_capitaux', '-') if data.get('ext_conduits_souterrains') else '-'
+    conduits_fran = data.get('conduits_franchises', '-') if data.get('ext_conduits_souterrains') else '-'
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Conduits et Souterrains"), 
+                        clean_text(conduits_statut), 
+                        clean_text(conduits_cap), 
+                        clean_text(conduits_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Tempête, GEMP
+    gemp_statut = "Garanti" if data.get('ext_gemp') else "Exclu"
+    gemp_cap = data.get('gemp_capitaux', '-') if data.get('ext_gemp') else '-'
+    gemp_fran = "10% mini 15 000 000" if data.get('ext_gemp') else '-'
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Tempete, Ouragan, Cyclone, GEMP inondation"), 
+                        clean_text(gemp_statut), 
+                        clean_text(gemp_cap if gemp_cap else format_amount_fr(data.get('montant', 0))), 
+                        clean_text(gemp_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Frais de déblai
+    deblai_statut = "Garanti" if data.get('ext_deblais') else "Exclu"
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Frais de deblai et demolition"), 
+                        clean_text(deblai_statut), 
+                        clean_text("5% de l'indemnite" if data.get('ext_deblais') else '-'), 
+                        clean_text("Neant" if data.get('ext_deblais') else '-')],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # II- RC + RC CROISEE
+    pdf.set_fill_color(200, 200, 200)
+    pdf.set_font(font_name, "B", 9)
+    rc_title = "II-        RC + RC CROISEE"
+    pdf.cell(col1_w + col2_w + col3_w + col4_w, 6, clean_text(rc_title), 1, 1, 'L', fill=True)
+    
+    pdf.set_font(font_name, "", 7)
+    
+    # Statut RC
+    rc_statut = "Garanti" if data.get('ext_rc') else "Exclu"
+    rc_cap = data.get('rc_capitaux', '-') if data.get('ext_rc') else '-'
+    rc_fran = data.get('rc_franchises', '-') if data.get('ext_rc') else '-'
+    
+    # Ligne 2: Tous Dommages confondus dont
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Tous Dommages confondus dont"), "", clean_text(rc_cap if rc_cap else ''), ""],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Ligne 3: Dommages matériels et immatériels consécutifs
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("- Dommages materiels et immateriels consecutifs avec un capital epuisable pour la duree des travaux"),
+                        clean_text("Garanti" if data.get('ext_rc') else "Exclu"),
+                        clean_text("500 000 000" if data.get('ext_rc') else '-'),
+                        clean_text(rc_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    # Ligne 4: Vol par préposés au préjudice des tiers
+    vol_prep_statut = "Garanti" if data.get('ext_vol_preposes') else "Exclu"
+    vol_prep_cap = data.get('vol_preposes_capitaux', '-') if data.get('ext_vol_preposes') else '-'
+    vol_prep_fran = data.get('vol_preposes_franchises', '-') if data.get('ext_vol_preposes') else '-'
+    
+    vol_cap_text = ""
+    if data.get('ext_vol_preposes'):
+        vol_cap_text = clean_text("10% des dommages materiels dans la limite de 50 000 000")
+    else:
+        vol_cap_text = "-"
+    
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("- Vol par preposes au prejudice des tiers"),
+                        clean_text(vol_prep_statut),
+                        vol_cap_text,
+                        clean_text(vol_prep_fran)],
+                       height=5,
+                       align=['L', 'C', 'C', 'C'])
+    
+    # Ligne 5: Défense et Recours
+    defense_statut = "Garanti" if data.get('ext_defense_recours') else "Exclu"
+    defense_cap = data.get('defense_recours_capitaux', '-') if data.get('ext_defense_recours') else '-'
+    defense_fran = data.get('defense_recours_franchises', '-') if data.get('ext_defense_recours') else '-'
+    
+    table_row_multicell(pdf, 
+                       [col1_w, col2_w, col3_w, col4_w],
+                       [clean_text("Defense et Recours"),
+                        clean_text(defense_statut),
+                        clean_text(defense_cap if defense_cap else "1 000 000"),
+                        clean_text(defense_fran)],
+                       height=5,
+                       align=['L', 'C', 'R', 'C'])
+    
+    pdf.ln(5)
+    sections.marquer("limites")
+    
+    # ============================================================
+    # SECTION 5 : EXCLUSIONS (Vérification de la Correction Robuste)
+    # ============================================================
+    
+    pdf.set_font(font_name, "B", 11)
+    pdf.cell(0, 8, clean_text("5.    EXCLUSIONS"), 0, 1, 'L')
+    pdf.ln(2)
+    
+    pdf.set_font(font_name, "", 9)
+    dessiner_lignes(pdf, pdf.epw, 5, gabarit['intro_exclusions'])
+    pdf.ln(2)
+    
+    # Utilisation du contenu du champ exclusions (passé via data)
+    exclusions_content = data.get('exclusions_spe', EXCLUSIONS_DEFAUT)
+    exclusions_list = [line.strip() for line in exclusions_content.split('\n') if line.strip()]
+    
+    pdf.set_font(font_name, "", 8)
+    
+    # Paramètres de largeur pour la correction de l'erreur FPDF
+    puce_indent = 5 # Indentation pour la puce (x)
+
+    for exclusion in exclusions_list:
+        
+        # Enlever le tiret si l'utilisateur l'a laissé
+        if exclusion.startswith('- '):
+            exclusion = exclusion[2:] 
+        
+        # 1. On se repositionne à la marge gauche (par défaut)
+        pdf.set_x(pdf.l_margin) 
+        
+        # 2. On affiche le tiret dans une petite cellule qui ne fait PAS de saut de ligne (ln=0)
+        pdf.cell(puce_indent, 5, "-", 0, 0, 'L') 
+        
+        # 3. On affiche le texte restant dans une multi_cell (0 pour la largeur prend le reste de la ligne).
+        largeur = pdf.w - pdf.r_margin - pdf.get_x()
+        dessiner_lignes(pdf, largeur, 5, decouper_lignes(pdf, largeur, 5, clean_text(exclusion)))
+    
+    pdf.ln(5)
+    sections.marquer("exclusions")
+    
+    # SECTION 6 : DOCUMENTS À TRANSMETTRE
+    pdf.set_font(font_name, "B", 11)
+    pdf.cell(0, 8, clean_text("6.    DOCUMENTS A TRANSMETTRE"), 0, 1, 'L')
+    pdf.ln(2)
+    
+    pdf.set_font(font_name, "", 9)
+    pdf.set_text_color(255, 0, 0)
+    dessiner_lignes(pdf, pdf.epw, 5, gabarit['intro_documents'])
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(2)
+    
+    pdf.set_font(font_name, "", 8)
+    for doc in gabarit['documents']:
+        pdf.cell(10, 5, "_", 0, 0, 'L')
+        pdf.cell(0, 5, doc, 0, 1, 'L')
+    
+    pdf.ln(5)
+    sections.marquer("documents")
+    
+    # SECTION 7 : CLAUSES À JOINDRE AU CONTRAT
+    pdf.set_font(font_name, "B", 11)
+    pdf.cell(0, 8, clean_text("7.    CLAUSES A JOINDRE AU CONTRAT"), 0, 1, 'L')
+    pdf.ln(2)
+    
+    pdf.set_font(font_name, "", 8)
+    for clause in gabarit['clauses']:
+        pdf.cell(10, 5, "_", 0, 0, 'L')
+        pdf.cell(0, 5, clause, 0, 1, 'L')
+    
+    pdf.ln(5)
+    
+    # Note finale
+    pdf.set_font(font_name, "B", 9)
+    pdf.set_text_color(255, 0, 0)
+    dessiner_lignes(pdf, pdf.epw, 5, gabarit['note_finale'])
+    pdf.set_text_color(0, 0, 0)
+    
+    pdf.ln(10)
+    
+    # Signature simple
+    pdf.set_font(font_name, "B", 10)
+    pdf.cell(0, 6, clean_text("Leadway Assurance"), 0, 1, 'R')
+    sections.marquer("clauses")
+    
+    # Obtenir la sortie PDF comme bytes
+    with Chrono("pdf.output"):
+        output = pdf.output()
+    
+    # Convertir en bytes selon le type
+    if isinstance(output, bytes):
+        return output
+    elif isinstance(output, bytearray):
+        return bytes(output)
+    elif isinstance(output, memoryview):
+        return output.tobytes()
+    elif hasattr(output, 'getvalue'):  # BytesIO
+        return output.getvalue()
+    elif isinstance(output, str):
+        return output.encode('latin-1')
+    else:
+        # Forcer la conversion en bytes
+        return bytes(output)
+
+
+# =========================================================
+# GABARIT (partie fixe du PDF compilée une fois par police)
+# =========================================================
+
+REMPLACEMENTS_ACCENTS = {
+    'œ': 'oe', 'Œ': 'OE', 'à': 'a', 'â': 'a', 'ä': 'a',
+    'é': 'e', 'è': 'e', 'ê': 'e', 'ë': 'e',
+    'î': 'i', 'ï': 'i', 'ô': 'o', 'ö': 'o',
+    'ù': 'u', 'û': 'u', 'ü': 'u', 'ç': 'c',
+    'À': 'A', 'Â': 'A', 'Ä': 'A',
+    'É': 'E', 'È': 'E', 'Ê': 'E', 'Ë': 'E',
+    'Î': 'I', 'Ï': 'I', 'Ô': 'O', 'Ö': 'O',
+    'Ù': 'U', 'Û': 'U', 'Ü': 'U', 'Ç': 'C'
+}
+
+TABLE_ACCENTS = str.maketrans(REMPLACEMENTS_ACCENTS)
+
+def retirer_accents(text):
+    """Remplace les caractères accentués par leur équivalent sans accent (œ -> oe)"""
+    return text.translate(TABLE_ACCENTS)
+
+def nettoyer_texte(text, font_name):
+    """Remplace les caractères accentués si la police n'est pas Unicode (repli Arial)"""
+    if font_name == "Arial":
+        return retirer_accents(text)
+    return text
+
+@lru_cache(maxsize=None)
+def compiler_gabarit(font_name):
+    """
+    Prépare une fois pour toutes le contenu fixe du PDF pour une police :
+    textes nettoyés des listes (documents, clauses) et paragraphes fixes déjà
+    découpés en lignes. Chaque cotation n'a plus qu'à les dessiner et à mettre
+    en page ses champs variables.
+    """
+    pdf = _pdf_mesure()
+    gabarit = {
+        'documents': [nettoyer_texte(doc, font_name) for doc in DOCUMENTS_A_TRANSMETTRE],
+        'clauses': [nettoyer_texte(clause, font_name) for clause in CLAUSES_A_JOINDRE],
+    }
+    for cle, texte in PARAGRAPHES_FIXES.items():
+        style, taille = POLICE_PARAGRAPHES_FIXES[cle]
+        pdf.set_font(font_name, style, taille)
+        gabarit[cle] = decouper_lignes(pdf, pdf.epw, 5, nettoyer_texte(texte, font_name))
+    return gabarit
+
+# =========================================================
+# MESURE DU TEXTE (découpage en lignes mémorisé)
+# =========================================================
+
+# Nombre de textes découpés gardés en mémoire (libellés répétés d'une cotation à l'autre)
+TAILLE_CACHE_LIGNES = 4096
+
+@lru_cache(maxsize=TAILLE_CACHE_LIGNES)
+def _decouper(famille, style, taille, largeur, marge, hauteur, texte, align):
+    pdf = _pdf_mesure()
+    pdf.c_margin = marge
+    pdf.set_font(famille, style, taille)
+    return tuple(pdf.multi_cell(largeur, hauteur, texte, border=0, align=align, split_only=True))
+
+_mesure_locale = threading.local()
+
+def _pdf_mesure():
+    """Document de mesure propre au thread, avec les mêmes polices que les cotations"""
+    pdf = getattr(_mesure_locale, "pdf", None)
+    if pdf is None:
+        pdf = fpdf.FPDF()
+        pdf.add_page()
+        try:
+            ajouter_polices(pdf, 'DejaVu')
+        except FileNotFoundError:
+            pass
+        _mesure_locale.pdf = pdf
+    return pdf
+
+def decouper_lignes(pdf, largeur, hauteur, texte, align='L'):
+    """
+    Découpe `texte` en lignes pour une cellule de `largeur` mm dans la police
+    courante de `pdf`. Le résultat est mémorisé par (police, taille, largeur, texte).
+    """
+    return _decouper(pdf.font_family, pdf.font_style, pdf.font_size_pt, largeur, pdf.c_margin,
+                     hauteur, texte, align)
+
+def dessiner_lignes(pdf, largeur, hauteur, lignes, align='L', fill=False):
+    """Écrit des lignes déjà découpées les unes sous les autres, comme multi_cell"""
+    x = pdf.get_x()
+    for ligne in lignes:
+        pdf.set_x(x)
+        pdf.cell(largeur, hauteur, ligne, border=0, align=align, fill=fill, new_x="LEFT", new_y="NEXT")
+    pdf.set_x(pdf.l_margin)
+
+# =========================================================
+# RESSOURCES DU PDF (chargées une fois par processus)
+# =========================================================
+
+def internes_fpdf_verifies():
+    """Vrai si la version installée de fpdf2 est celle dont les structures internes sont reproduites"""
+    return fpdf.__version__ == VERSION_FPDF_VERIFIEE
+
+@lru_cache(maxsize=None)
+def _police_modele(style):
+    """Analyse une police DejaVu une seule fois : retourne (police fpdf, octets du fichier TTF)"""
+    chemin = POLICES_DEJAVU[style]
+    modele = fpdf.FPDF()
+    with Chrono("pdf.add_font"):
+        modele.add_font('DejaVu', style, chemin)
+    with open(chemin, 'rb') as fichier:
+        octets = fichier.read()
+    return modele.fonts[f"dejavu{style}"], octets
+
+def ajouter_polices(pdf, famille):
+    """
+    Ajoute les polices DejaVu au document à partir des modèles du processus.
+
+    Les tables déjà analysées (cmap, largeurs, glyphes) sont partagées ; seuls
+    l'objet fontTools (que fpdf réduit au sous-ensemble utilisé à la sortie) et
+    la table de sous-ensemble sont propres à chaque document. Hors de la
+    version VERSION_FPDF_VERIFIEE, chaque document analyse ses polices (add_font).
+    """
+    if not internes_fpdf_verifies():
+        for style, chemin in POLICES_DEJAVU.items():
+            pdf.add_font(famille, style, chemin)
+        return
+    for style in POLICES_DEJAVU:
+        modele, octets = _police_modele(style)
+        police = copy.copy(modele)
+        police.i = len(pdf.fonts) + 1
+        police.fontkey = f"{famille.lower()}{style}"
+        police.ttfont = ttLib.TTFont(io.BytesIO(octets), recalcTimestamp=False, lazy=True)
+        police.cw = modele.cw.copy()
+        police.missing_glyphs = []
+        police.biggest_size_pt = 0
+        police._hbfont = None
+        police.subset = fpdf.fonts.SubsetMap(police)
+        pdf.fonts[police.fontkey] = police
+
+def _dimensions_logo(logo_path):
+    """Taille en pixels du logo réduit à RESOLUTION_LOGO_DPI pour LARGEUR_LOGO_MM"""
+    from PIL import Image
+
+    with Image.open(logo_path) as image:
+        largeur, hauteur = image.size
+    largeur_px = min(largeur, round(LARGEUR_LOGO_MM / 25.4 * RESOLUTION_LOGO_DPI))
+    return largeur_px, round(hauteur * largeur_px / largeur)
+
+@lru_cache(maxsize=None)
+def _logo_modele(logo_path):
+    """Décode et réduit le logo une seule fois (structures de fpdf VERSION_FPDF_VERIFIEE)"""
+    cache = fpdf.image_datastructures.ImageCache()
+    _, _, info = fpdf.image_parsing.preload_image(cache, logo_path, dims=_dimensions_logo(logo_path))
+    return info, dict(cache.icc_profiles)
+
+@lru_cache(maxsize=None)
+def _logo_octets(logo_path):
+    """Logo réduit une seule fois, en PNG (pour l'API publique image)"""
+    from PIL import Image
+
+    with Image.open(logo_path) as image:
+        reduit = image.resize(_dimensions_logo(logo_path), Image.LANCZOS)
+    tampon = io.BytesIO()
+    reduit.save(tampon, "PNG")
+    return tampon.getvalue()
+
+def ajouter_logo(pdf, logo_path, x, y):
+    """
+    Place le logo (LARGEUR_LOGO_MM de large) : l'image décodée du processus
+    est mise dans le cache d'images du document, ou, hors de la version
+    VERSION_FPDF_VERIFIEE, le PNG réduit passe par l'API publique
+    """
+    if not internes_fpdf_verifies():
+        pdf.image(io.BytesIO(_logo_octets(logo_path)), x=x, y=y, w=LARGEUR_LOGO_MM)
+        return
+    info, icc_profiles = _logo_modele(logo_path)
+    info = type(info)(info)
+    info["i"] = len(pdf.image_cache.images) + 1
+    info["usages"] = 0
+    pdf.image_cache.icc_profiles.update(icc_profiles)
+    pdf.image_cache.images[logo_path] = info
+    pdf.image(logo_path, x=x, y=y, w=LARGEUR_LOGO_MM)
+
+def precharger_ressources():
+    """
+    Charge dans le processus courant les polices et le logo du PDF, pour que
+    le premier document généré (interface ou worker de génération en masse)
+    ne paie pas leur analyse.
+    """
+    if not internes_fpdf_verifies():
+        if os.path.exists(LOGO_PATH):
+            _logo_octets(LOGO_PATH)
+        return
+    for style in POLICES_DEJAVU:
+        _police_modele(style)
+    if os.path.exists(LOGO_PATH):
+        _logo_modele(LOGO_PATH)
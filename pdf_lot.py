@@ -0,0 +1,159 @@
+"""
+Génération en masse des PDF de cotation.
+
+Les appels à generate_pdf() sont répartis sur un pool de processus (un par
+cœur disponible). Chaque PDF est écrit dans l'archive ZIP dès qu'il est prêt :
+aucun fichier temporaire, et seul un nombre borné de PDF est en mémoire à un
+instant donné.
+
+Usage :
+    python pdf_lot.py cotations.jsonl cotations.zip [--workers 8]
+
+Le fichier d'entrée contient un dictionnaire pdf_data (JSON) par ligne. Une
+cotation dont le rendu échoue n'interrompt pas le lot : elle est listée, avec
+son erreur, dans le fichier erreurs.txt de l'archive.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Nombre de rendus en attente par worker (borne la mémoire des PDF non écrits)
+RENDUS_PAR_WORKER = 4
+
+# Fichier de l'archive listant les cotations dont le PDF n'a pas pu être généré
+FICHIER_ERREURS = "erreurs.txt"
+
+journal = logging.getLogger(__name__)
+
+
+def nb_workers_disponibles():
+    """Nombre de cœurs utilisables par ce processus"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _initialiser_worker():
+    """Exécuté une fois par processus : importe fpdf et charge les ressources du PDF"""
+    import pdf_cotation
+
+    pdf_cotation.precharger_ressources()
+
+
+def _rendre(indice, data):
+    from pdf_cotation import generate_pdf
+
+    return indice, generate_pdf(data)
+
+
+def nom_fichier_pdf(indice, data):
+    """Nom du PDF dans l'archive (unique grâce à l'indice de la cotation)"""
+    nom = data.get("nom_fichier")
+    if not nom:
+        souscripteur = re.sub(r"[^\w-]+", "_", str(data.get("souscripteur", "")).strip()) or "cotation"
+        nom = f"Cotation_TRC_{souscripteur}"
+    return f"{indice + 1:06d}_{nom.removesuffix('.pdf')}.pdf"
+
+
+def generer_zip(cotations, destination, workers=None, progression=None):
+    """
+    Génère un PDF par dictionnaire de `cotations` et les écrit dans l'archive
+    `destination` (chemin ou fichier binaire ouvert en écriture).
+
+    Un rendu en échec est journalisé et listé dans FICHIER_ERREURS (ajouté à
+    l'archive s'il y en a) ; les autres PDF sont générés normalement.
+
+    `progression(termines, debit)` est appelé après chaque PDF écrit, avec le
+    débit moyen en PDF/seconde. Retourne un dictionnaire de statistiques.
+    """
+    workers = workers or nb_workers_disponibles()
+    max_en_cours = workers * RENDUS_PAR_WORKER
+    cotations = iter(enumerate(cotations))
+    termines = 0
+    erreurs = []
+    debut = time.perf_counter()
+
+    with zipfile.ZipFile(destination, "w", compression=zipfile.ZIP_STORED) as archive, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_initialiser_worker) as pool:
+        en_cours = {}
+
+        def soumettre():
+            while len(en_cours) < max_en_cours:
+                suivant = next(cotations, None)
+                if suivant is None:
+                    return
+                indice, data = suivant
+                if not isinstance(data, dict):
+                    erreurs.append(f"{indice + 1:06d}\tpdf_data invalide : objet JSON attendu")
+                    continue
+                en_cours[pool.submit(_rendre, indice, data)] = nom_fichier_pdf(indice, data)
+
+        soumettre()
+        while en_cours:
+            faits, _ = wait(en_cours, return_when=FIRST_COMPLETED)
+            for futur in faits:
+                nom = en_cours.pop(futur)
+                try:
+                    _, pdf_bytes = futur.result()
+                except Exception as e:
+                    journal.exception("Échec du rendu de %s", nom)
+                    erreurs.append(f"{nom}\t{type(e).__name__}: {e}")
+                    continue
+                # Les PDF sont déjà compressés par fpdf : stockage sans recompression
+                archive.writestr(nom, pdf_bytes)
+                termines += 1
+                if progression:
+                    progression(termines, termines / (time.perf_counter() - debut))
+            soumettre()
+
+        if erreurs:
+            archive.writestr(FICHIER_ERREURS, "\n".join(sorted(erreurs)) + "\n")
+
+    duree = time.perf_counter() - debut
+    return {
+        "pdf": termines,
+        "erreurs": len(erreurs),
+        "workers": workers,
+        "duree_s": duree,
+        "pdf_par_seconde": termines / duree if duree else 0.0,
+    }
+
+
+def lire_jsonl(chemin):
+    """Lit un dictionnaire pdf_data par ligne (les lignes vides sont ignorées)"""
+    with open(chemin, encoding="utf-8") as fichier:
+        for ligne in fichier:
+            if ligne.strip():
+                yield json.loads(ligne)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génération en masse des PDF de cotation TRC")
+    parser.add_argument("entree", help="Fichier JSON Lines (un pdf_data par ligne)")
+    parser.add_argument("sortie", help="Archive ZIP à produire")
+    parser.add_argument("--workers", type=int, default=None, help="Nombre de processus (défaut : cœurs disponibles)")
+    args = parser.parse_args(argv)
+
+    def progression(termines, debit):
+        print(f"\r{termines} PDF générés ({debit:.1f} PDF/s)", end="", file=sys.stderr, flush=True)
+
+    stats = generer_zip(lire_jsonl(args.entree), args.sortie, args.workers, progression)
+    print(
+        f"\n{stats['pdf']} PDF en {stats['duree_s']:.1f} s avec {stats['workers']} processus "
+        f"({stats['pdf_par_seconde']:.1f} PDF/s) -> {args.sortie}",
+        file=sys.stderr,
+    )
+    if stats["erreurs"]:
+        print(f"{stats['erreurs']} PDF en échec : voir {FICHIER_ERREURS} dans l'archive", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
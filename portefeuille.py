@@ -0,0 +1,300 @@
+"""
+Tarification vectorisée d'un portefeuille de chantiers.
+
+price_portfolio() reprend exactement les calculs de tarification.price_quote()
+(même cube de taux, mêmes opérations flottantes dans le même ordre) mais sur
+des tableaux NumPy, ce qui permet de re-tarifer des dizaines de milliers de
+lignes d'un coup.
+
+price_portfolio_fcfa() fait la même tarification en FCFA entiers (int64, voir
+montants.py) : mêmes francs, ligne par ligne, que montants.price_quote_fcfa().
+
+Chaque ligne est tarifiée sous la version des barèmes en vigueur à sa
+date_cotation (aujourd'hui sans date, voir baremes.py) : la version est
+trouvée pour toutes les lignes d'un coup et les taux sont lus dans les cubes
+empilés de toutes les versions.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from baremes import versions_tarif
+
+from montants import (
+    TAUX_FCFA_EXISTANTS, TAUX_FCFA_MAINTENANCE, TAUX_FCFA_RC, TAUX_FCFA_TRAVAUX,
+    appliquer_taux_tableau, calc_accessoires_tableau, calc_taxes_tableau,
+    fcfa_tableau, proportions,
+)
+from tarification import (
+    AXES_CUBE, FORME_CUBE, TAUX_BASE_FRANCHISE, TAUX_TRAVAUX, TAUX_RC,
+    TAUX_EXISTANTS, lire_booleen,
+)
+
+# Colonnes optionnelles et leur valeur par défaut (mêmes défauts que le formulaire)
+COLONNES_DEFAUT = {
+    "usage": None,
+    "structure": None,
+    "franchise": "Normale (x1)",
+    "trafic": "Non applicable",
+    "proximite": "Non applicable",
+    "rc_croisee": False,
+    "ext_maintenance": True,
+    "ext_deblais": True,
+    "ext_rc": False,
+    "ext_existants": False,
+    "prime_equipements": 0.0,
+    "prime_maint_etendue": 0.0,
+    "prime_maint_const": 0.0,
+    "prime_materiel": 0.0,
+    "prime_baraquement": 0.0,
+    "prime_gemp": 0.0,
+    "date_cotation": None,
+}
+
+COLONNES_OBLIGATOIRES = ["type_travaux", "montant", "duree"]
+
+
+def _codes(valeurs, modalites, colonne, masque=None):
+    """Convertit une colonne catégorielle en codes entiers (index dans `modalites`)"""
+    codes = pd.Categorical(valeurs, categories=modalites).codes.astype(np.intp)
+    invalides = codes < 0
+    if masque is not None:
+        invalides &= masque
+    if invalides.any():
+        inconnues = sorted({str(v) for v in np.asarray(valeurs, dtype=object)[invalides]})
+        raise ValueError(f"Valeurs inconnues pour '{colonne}' : {', '.join(inconnues)}")
+    return np.maximum(codes, 0)
+
+
+def _colonne(df, nom):
+    """Colonne `nom` du portefeuille, ou sa valeur par défaut si elle est absente"""
+    if nom in df.columns:
+        return df[nom].to_numpy()
+    return np.full(len(df), COLONNES_DEFAUT[nom], dtype=object)
+
+
+def _drapeau(df, nom):
+    """
+    Colonne booléenne : vrai/faux, 1/0 ou oui/non... (tarification.lire_booleen),
+    cellules vides à la valeur par défaut ; ValueError (lignes citées) sinon
+    """
+    valeurs = _colonne(df, nom)
+    if valeurs.dtype == bool:
+        return valeurs
+    # Conversion par valeur distincte (peu nombreuses), puis appliquée à la colonne
+    serie = pd.Series(valeurs, index=df.index, dtype=object)
+    conversions = {}
+    for valeur in pd.unique(serie[serie.notna()]):
+        try:
+            conversions[valeur] = lire_booleen(valeur)
+        except ValueError:
+            lignes = serie.index[serie.to_numpy() == valeur][:10]
+            raise ValueError(
+                f"Valeur inconnue pour '{nom}' : {valeur!r} (lignes {', '.join(map(str, lignes))})"
+            ) from None
+    return serie.map(conversions).fillna(COLONNES_DEFAUT[nom]).to_numpy(dtype=bool)
+
+
+def _indices_cube(df):
+    """Vérifie les colonnes et retourne l'indice (aplati) de chaque ligne dans le cube de taux"""
+    manquantes = [c for c in COLONNES_OBLIGATOIRES if c not in df.columns]
+    if manquantes:
+        raise ValueError(f"Colonnes obligatoires manquantes : {', '.join(manquantes)}")
+
+    duree = df["duree"].to_numpy()
+
+    # Codes catégoriels (usage et structure ne concernent que les bâtiments)
+    type_code = _codes(df["type_travaux"].to_numpy(), AXES_CUBE["type_travaux"], "type_travaux")
+    batiment = type_code == AXES_CUBE["type_travaux"].index("Bâtiment")
+    codes = (
+        type_code,
+        np.where(batiment, _codes(_colonne(df, "usage"), AXES_CUBE["usage"], "usage", batiment), 0),
+        np.where(batiment, _codes(_colonne(df, "structure"), AXES_CUBE["structure"], "structure", batiment), 0),
+        (duree > 12).astype(np.intp),
+        _codes(_colonne(df, "franchise"), AXES_CUBE["franchise"], "franchise"),
+        _drapeau(df, "ext_deblais").astype(np.intp),
+        _codes(_colonne(df, "trafic"), AXES_CUBE["trafic"], "trafic"),
+        _codes(_colonne(df, "proximite"), AXES_CUBE["proximite"], "proximite"),
+        _drapeau(df, "rc_croisee").astype(np.intp),
+    )
+    return np.ravel_multi_index(codes, FORME_CUBE)
+
+
+def _versions_lignes(df, versions):
+    """
+    Position (dans versions) de la version des barèmes de chaque ligne, selon
+    sa date_cotation (date, jj.mm.aaaa ou aaaa-mm-jj ; aujourd'hui si absente)
+    """
+    dates = np.full(len(df), np.datetime64(datetime.date.today(), "D"))
+    if "date_cotation" in df.columns:
+        cellules = df["date_cotation"]
+        lues = pd.to_datetime(cellules, format="%d.%m.%Y", errors="coerce").fillna(
+            pd.to_datetime(cellules, format="ISO8601", errors="coerce")
+        )
+        vides = cellules.isna() | (cellules.astype(str).str.strip() == "")
+        invalides = lues.isna() & ~vides
+        if invalides.any():
+            lignes = cellules.index[invalides.to_numpy()][:10]
+            raise ValueError(
+                "Date de cotation illisible (jj.mm.aaaa ou aaaa-mm-jj attendu) : "
+                f"lignes {', '.join(map(str, lignes))}"
+            )
+        donnees = lues.to_numpy(dtype="datetime64[D]")
+        dates = np.where(np.isnat(donnees), dates, donnees)
+    positions = versions.indices(dates)
+    if (positions < 0).any():
+        sans = sorted({str(d) for d in dates[positions < 0]})
+        raise ValueError(f"Aucune version des barèmes en vigueur le : {', '.join(sans)}")
+    return positions
+
+
+def _taux_lignes(cubes, positions, indices):
+    """Taux de chaque ligne : case `indices` du cube de sa version (cubes empilés)"""
+    return cubes.reshape(-1, cubes.shape[-1])[positions * np.prod(FORME_CUBE) + indices]
+
+
+def price_portfolio(df, versions=None):
+    """
+    Tarifie un portefeuille de chantiers (une ligne par chantier).
+
+    Colonnes obligatoires : type_travaux, montant, duree.
+    Colonnes optionnelles (voir COLONNES_DEFAUT) : usage, structure, franchise,
+    trafic, proximite, rc_croisee, ext_maintenance, ext_deblais, ext_rc,
+    ext_existants, prime_equipements, les primes des extensions DT et
+    date_cotation.
+
+    `versions` : versions des barèmes (baremes.VersionsTarif ; par défaut
+    celles du répertoire des barèmes).
+
+    Retourne une copie du DataFrame complétée des colonnes de QuoteResult et
+    de la version des barèmes appliquée (version_tarif).
+    """
+    def drapeau(nom):
+        return _drapeau(df, nom)
+
+    def montant_col(nom):
+        return _colonne(df, nom).astype(np.float64)
+
+    versions = versions or versions_tarif()
+    indices = _indices_cube(df)
+    positions = _versions_lignes(df, versions)
+    montant = df["montant"].to_numpy(dtype=np.float64)
+
+    # 1-3. Taux de base, franchise, taux net travaux, RC et existants : une seule lecture des cubes
+    taux = _taux_lignes(versions.cubes, positions, indices)
+    taux_base_franchise = taux[:, TAUX_BASE_FRANCHISE]
+    taux_net_travaux = taux[:, TAUX_TRAVAUX]
+
+    # 4. Prime TRAVAUX
+    prime_travaux = montant * (taux_net_travaux / 1000)
+
+    # 5. Prime MAINTENANCE
+    prime_maintenance = np.where(
+        drapeau("ext_maintenance"), montant * (taux_base_franchise / 1000) * 0.10, 0.0
+    )
+
+    # 6. Prime RC (plancher max(taux × pct, minimum) et suppléments inclus dans le cube)
+    ext_rc = drapeau("ext_rc")
+    taux_rc = np.where(ext_rc, taux[:, TAUX_RC], 0.0)
+    prime_rc = np.where(ext_rc, montant * (taux_rc / 1000), 0.0)
+
+    # 7. Prime EXISTANTS (20 % du montant au demi-taux travaux)
+    ext_existants = drapeau("ext_existants")
+    taux_existants = np.where(ext_existants, taux[:, TAUX_EXISTANTS], 0.0)
+    prime_existants = np.where(ext_existants, (0.2 * montant) * (taux_existants / 1000), 0.0)
+
+    # 8. Totaux + Primes extensions DT
+    prime_equipements = montant_col("prime_equipements")
+    primes_dt = [
+        montant_col(nom)
+        for nom in ("prime_maint_etendue", "prime_maint_const", "prime_materiel", "prime_baraquement", "prime_gemp")
+    ]
+    prime_extensions_dt = primes_dt[0] + primes_dt[1] + primes_dt[2] + primes_dt[3] + primes_dt[4]
+    prime_nette = prime_travaux + prime_maintenance + prime_rc + prime_existants + prime_equipements + prime_extensions_dt
+    accessoires = prime_nette * np.array([b.taux_accessoires for b in versions.versions])[positions]
+    taxes = (prime_nette + accessoires) * np.array([b.taux_taxes for b in versions.versions])[positions]
+
+    resultat = df.copy()
+    resultat["version_tarif"] = np.array([b.version for b in versions.versions], dtype=object)[positions]
+    resultat["taux_net_travaux"] = taux_net_travaux
+    resultat["taux_rc"] = taux_rc
+    resultat["taux_existants"] = taux_existants
+    resultat["prime_travaux"] = prime_travaux
+    resultat["prime_maintenance"] = prime_maintenance
+    resultat["prime_rc"] = prime_rc
+    resultat["prime_existants"] = prime_existants
+    resultat["prime_equipements"] = prime_equipements
+    resultat["prime_extensions_dt"] = prime_extensions_dt
+    resultat["prime_nette"] = prime_nette
+    resultat["accessoires"] = accessoires
+    resultat["taxes"] = taxes
+    resultat["prime_ttc"] = prime_nette + accessoires + taxes
+    return resultat
+
+
+def price_portfolio_fcfa(df, versions=None):
+    """
+    Tarifie un portefeuille comme price_portfolio(), primes en FCFA entiers
+    (int64) : montants saisis arrondis au franc, une prime au franc par
+    garantie, accessoires et taxes arrondis au franc (règles de montants.py).
+    Les taux restent en ‰ (float64).
+    """
+    def drapeau(nom):
+        return _drapeau(df, nom)
+
+    def montant_col(nom):
+        return fcfa_tableau(_colonne(df, nom).astype(np.float64))
+
+    versions = versions or versions_tarif()
+    indices = _indices_cube(df)
+    positions = _versions_lignes(df, versions)
+    montant = fcfa_tableau(df["montant"].to_numpy())
+    zero = np.zeros(len(df), dtype=np.int64)
+
+    # Taux affichés (‰) et taux entiers effectifs sur le montant des travaux
+    taux = _taux_lignes(versions.cubes, positions, indices)
+    taux_fcfa = _taux_lignes(versions.cubes_fcfa, positions, indices)
+
+    prime_travaux = appliquer_taux_tableau(montant, taux_fcfa[:, TAUX_FCFA_TRAVAUX])
+    prime_maintenance = np.where(
+        drapeau("ext_maintenance"), appliquer_taux_tableau(montant, taux_fcfa[:, TAUX_FCFA_MAINTENANCE]), zero
+    )
+    ext_rc = drapeau("ext_rc")
+    taux_rc = np.where(ext_rc, taux[:, TAUX_RC], 0.0)
+    prime_rc = np.where(ext_rc, appliquer_taux_tableau(montant, taux_fcfa[:, TAUX_FCFA_RC]), zero)
+    ext_existants = drapeau("ext_existants")
+    taux_existants = np.where(ext_existants, taux[:, TAUX_EXISTANTS], 0.0)
+    prime_existants = np.where(ext_existants, appliquer_taux_tableau(montant, taux_fcfa[:, TAUX_FCFA_EXISTANTS]), zero)
+
+    prime_equipements = montant_col("prime_equipements")
+    primes_dt = {
+        nom: montant_col(nom)
+        for nom in ("prime_maint_etendue", "prime_maint_const", "prime_materiel", "prime_baraquement", "prime_gemp")
+    }
+    prime_extensions_dt = sum(primes_dt.values())
+    prime_nette = prime_travaux + prime_maintenance + prime_rc + prime_existants + prime_equipements + prime_extensions_dt
+    # Fractions (numérateur, dénominateur) des accessoires et des taxes de chaque ligne
+    fractions = np.array([proportions(b) for b in versions.versions], dtype=np.int64)[positions]
+    accessoires = calc_accessoires_tableau(prime_nette, fractions[:, 0, 0], fractions[:, 0, 1])
+    taxes = calc_taxes_tableau(prime_nette, accessoires, fractions[:, 1, 0], fractions[:, 1, 1])
+
+    resultat = df.copy()
+    resultat["version_tarif"] = np.array([b.version for b in versions.versions], dtype=object)[positions]
+    resultat["taux_taxes"] = np.array([b.taux_taxes * 100 for b in versions.versions])[positions]
+    for nom, primes in primes_dt.items():
+        resultat[nom] = primes
+    resultat["taux_net_travaux"] = taux[:, TAUX_TRAVAUX]
+    resultat["taux_rc"] = taux_rc
+    resultat["taux_existants"] = taux_existants
+    resultat["prime_travaux"] = prime_travaux
+    resultat["prime_maintenance"] = prime_maintenance
+    resultat["prime_rc"] = prime_rc
+    resultat["prime_existants"] = prime_existants
+    resultat["prime_equipements"] = prime_equipements
+    resultat["prime_extensions_dt"] = prime_extensions_dt
+    resultat["prime_nette"] = prime_nette
+    resultat["accessoires"] = accessoires
+    resultat["taxes"] = taxes
+    resultat["prime_ttc"] = prime_nette + accessoires + taxes
+    return resultat
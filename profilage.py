@@ -0,0 +1,189 @@
+"""
+Profilage à la demande d'une exécution (cProfile + tracemalloc).
+
+Réservé aux administrateurs : l'interface ne propose le profilage qu'aux
+sessions ouvertes avec ?profil=<TRC_JETON_PROFILAGE> (aucun jeton défini :
+profilage indisponible). Une Capture n'est créée que pour l'exécution
+demandée ; le reste du temps, rien n'est importé ni mesuré.
+
+Une capture produit :
+    - le dump pstats (python -m pstats capture.pstats, snakeviz...) ;
+    - la table des fonctions les plus coûteuses (temps propre) ;
+    - l'instantané tracemalloc (tracemalloc.Snapshot.load) et ses plus
+      grosses allocations par ligne.
+
+Une seule capture à la fois par processus : tracemalloc est global (démarrage,
+arrêt, pic mémoire), une seconde capture est refusée (CaptureOccupee). Une
+capture jamais arrêtée (exécution en erreur, session fermée) l'est d'office
+après DUREE_MAX_CAPTURE secondes : tracemalloc ne reste pas actif.
+"""
+import datetime
+import hmac
+import logging
+import os
+import tempfile
+import threading
+import time
+
+JETON = os.environ.get("TRC_JETON_PROFILAGE")
+
+# Lignes des tables de fonctions et d'allocations
+TOP_N = 30
+
+# Profondeur des piles enregistrées par tracemalloc
+CADRES_TRACEMALLOC = 10
+
+# Durée (s) au-delà de laquelle une capture restée ouverte est arrêtée d'office
+DUREE_MAX_CAPTURE = 120
+
+journal = logging.getLogger(__name__)
+
+
+# Tenu de demarrer() à arreter() ; un Lock (et non un RLock) car une capture
+# peut être arrêtée par un autre thread que celui qui l'a démarrée
+_verrou_capture = threading.Lock()
+
+
+class CaptureOccupee(RuntimeError):
+    """Une autre capture est déjà en cours dans le processus"""
+
+
+def jeton_valide(jeton):
+    """Vrai si `jeton` ouvre le profilage (comparaison à temps constant)"""
+    return bool(JETON) and hmac.compare_digest(str(jeton or ""), JETON)
+
+
+class Capture:
+    """
+    Profil cProfile et allocations tracemalloc du thread courant entre
+    demarrer() et arreter() (ou dans un bloc `with`).
+    """
+
+    def __init__(self, etiquette):
+        self.etiquette = etiquette
+        self.date = None
+        self.duree = None
+        self.pic_memoire = None
+        self.stats = None
+        self.instantane = None
+        self.expiree = False
+        self._profil = None
+        self._tracemalloc_lance = False
+        self._minuteur = None
+        # Protège l'arrêt (arreter() et l'arrêt d'office du minuteur)
+        self._etat = threading.Lock()
+
+    def demarrer(self):
+        """Démarre la capture ; CaptureOccupee si une autre est en cours"""
+        import cProfile
+        import tracemalloc
+
+        if not _verrou_capture.acquire(blocking=False):
+            raise CaptureOccupee("Une autre capture est en cours dans ce processus")
+        try:
+            self.date = datetime.datetime.now()
+            self._tracemalloc_lance = not tracemalloc.is_tracing()
+            if self._tracemalloc_lance:
+                tracemalloc.start(CADRES_TRACEMALLOC)
+            tracemalloc.reset_peak()
+            self._profil = cProfile.Profile()
+            self._minuteur = threading.Timer(DUREE_MAX_CAPTURE, self._expirer)
+            self._minuteur.daemon = True
+            self._minuteur.start()
+            self._debut = time.perf_counter()
+            self._profil.enable()
+        except BaseException:
+            if self._minuteur is not None:
+                self._minuteur.cancel()
+            if self._tracemalloc_lance and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._profil = None
+            _verrou_capture.release()
+            raise
+        return self
+
+    def arreter(self):
+        """Arrête la capture (sans effet si elle l'est déjà, ou a expiré : expiree)"""
+        import pstats
+        import tracemalloc
+
+        with self._etat:
+            if self._profil is None:
+                return self
+            self._minuteur.cancel()
+            try:
+                self._profil.disable()
+                self.duree = time.perf_counter() - self._debut
+                self.instantane = tracemalloc.take_snapshot().filter_traces([
+                    tracemalloc.Filter(False, tracemalloc.__file__),
+                    tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+                ])
+                self.pic_memoire = tracemalloc.get_traced_memory()[1]
+                if self._tracemalloc_lance:
+                    tracemalloc.stop()
+                self.stats = pstats.Stats(self._profil)
+            finally:
+                self._profil = None
+                _verrou_capture.release()
+        return self
+
+    def _expirer(self):
+        """Arrêt d'office (minuteur) d'une capture restée ouverte DUREE_MAX_CAPTURE secondes"""
+        import tracemalloc
+
+        with self._etat:
+            if self._profil is None:
+                return
+            # Le profileur est propre au thread qui l'a activé : celui-ci est
+            # terminé (session fermée) ou le désactivera à son prochain arreter()
+            self._profil = None
+            self.expiree = True
+            if self._tracemalloc_lance:
+                tracemalloc.stop()
+            _verrou_capture.release()
+        journal.warning("Capture « %s » arrêtée d'office après %d s", self.etiquette, DUREE_MAX_CAPTURE)
+
+    def __enter__(self):
+        return self.demarrer()
+
+    def __exit__(self, *exc):
+        self.arreter()
+
+    def fonctions_chaudes(self, n=TOP_N):
+        """Fonctions triées par temps propre : liste de dicts (une ligne de table chacun)"""
+        lignes = []
+        for (fichier, ligne, nom), (_, appels, propre, cumule, _) in self.stats.stats.items():
+            lignes.append({
+                "fonction": nom,
+                "emplacement": f"{fichier}:{ligne}",
+                "appels": appels,
+                "temps_propre_s": propre,
+                "temps_cumule_s": cumule,
+            })
+        lignes.sort(key=lambda l: l["temps_propre_s"], reverse=True)
+        return lignes[:n]
+
+    def allocations(self, n=TOP_N):
+        """Mémoire encore allouée en fin de capture, par ligne de code (plus grosses d'abord)"""
+        return [
+            {
+                "emplacement": str(statistique.traceback[0]),
+                "taille_octets": statistique.size,
+                "blocs": statistique.count,
+            }
+            for statistique in self.instantane.statistics("lineno")[:n]
+        ]
+
+    def pstats_octets(self):
+        """Dump pstats (format de pstats.Stats.dump_stats)"""
+        import marshal
+
+        return marshal.dumps(self.stats.stats)
+
+    def instantane_octets(self):
+        """Instantané tracemalloc (format de tracemalloc.Snapshot.dump)"""
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, "instantane")
+            self.instantane.dump(chemin)
+            with open(chemin, "rb") as fichier:
+                return fichier.read()
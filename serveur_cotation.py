@@ -0,0 +1,538 @@
+"""
+Service HTTP local de tarification TRC.
+
+Expose aux autres applications (portail courtiers) le calcul du bouton
+"Calculer la prime" (montants.price_quote_fcfa) et generate_pdf(), sans passer
+par l'interface Streamlit. Serveur HTTP/1.1 minimal sur asyncio (bibliothèque
+standard uniquement), avec connexions persistantes :
+
+    GET  /sante       état du service
+    POST /cotation    un QuoteInput en JSON -> décomposition de la prime (JSON) ;
+                      un champ date_cotation (aaaa-mm-jj) fait tarifer sous
+                      les barèmes en vigueur à cette date (voir baremes.py)
+    POST /cotations   un QuoteInput par ligne (NDJSON) -> un résultat par ligne
+                      (NDJSON), renvoyé au fil de la lecture de la demande
+    POST /pdf         un pdf_data en JSON -> PDF de la cotation (attendu)
+    POST /rendus      un pdf_data en JSON -> travail de rendu mis en file (202)
+    GET  /rendus/<empreinte>       statut du travail
+    GET  /rendus/<empreinte>/pdf   PDF terminé (202 tant qu'il est en cours)
+    GET  /metriques   durées par étape et compteurs (format Prometheus)
+
+La tarification (quelques dizaines de microsecondes) est faite dans la boucle
+asyncio ; les PDF sont générés par la file de rendus (file_rendus.py), dont
+la profondeur est bornée : quand elle est pleine, /pdf et /rendus répondent
+503 (avec Retry-After) au lieu de ralentir tous les clients.
+
+Usage :
+    python serveur_cotation.py [--hote 127.0.0.1] [--port 8765] [--workers 4] [--profondeur 16] [--prechauffage]
+    python serveur_cotation.py --charge 20000 [--connexions 16]   (client de mesure)
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import json
+import logging
+import re
+import types
+import signal
+import sys
+import time
+from dataclasses import fields
+
+import metriques
+from baremes import versions_tarif
+from demarrage import prechauffer
+from file_rendus import ECHEC, TERMINE, FileRendus, FileSaturee
+from montants import price_quote_fcfa
+from tarification import (
+    DUREE_MAX, DUREE_MIN, MONTANT_MAX, QuoteInput, decomposition, empreinte_quote, lire_booleen,
+)
+
+HOTE = "127.0.0.1"
+PORT = 8765
+
+# Taille maximale du corps de /cotation et /pdf, et d'une ligne (en-tête HTTP
+# ou demande NDJSON)
+TAILLE_MAX_CORPS = 1024 * 1024
+TAILLE_MAX_LIGNE = 64 * 1024
+
+# Taille des blocs lus dans le corps de /cotations : les résultats d'un bloc
+# sont envoyés avant la lecture du suivant
+TAILLE_BLOC = 64 * 1024
+
+# Connexion persistante fermée après DELAI_INACTIVITE secondes sans requête
+DELAI_INACTIVITE = 60
+
+RAISONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    501: "Not Implemented",
+    503: "Service Unavailable",
+}
+
+TYPE_JSON = "application/json; charset=utf-8"
+TYPE_NDJSON = "application/x-ndjson; charset=utf-8"
+TYPE_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+# Champ -> type annoté (str | None, float | None : None accepté)
+TYPES_QUOTE = {champ.name: champ.type for champ in fields(QuoteInput)}
+CHAMPS_QUOTE = frozenset(TYPES_QUOTE)
+
+# Demande utilisée par le client de mesure (--charge)
+EXEMPLE_QUOTE = {
+    "type_travaux": "Bâtiment",
+    "montant": 100_000_000,
+    "duree": 12,
+    "usage_key": "logement_commercial",
+    "structure": "A",
+    "ext_rc": True,
+    "ext_existants": True,
+}
+
+journal = logging.getLogger(__name__)
+
+
+class ErreurHttp(Exception):
+    """Requête refusée : statut HTTP et message renvoyé au client"""
+
+    def __init__(self, statut, message):
+        super().__init__(message)
+        self.statut = statut
+
+# =========================================================
+# TARIFICATION ET RENDU
+# =========================================================
+
+def _valeur_champ(nom, valeur):
+    """
+    Valeur JSON d'un champ de QuoteInput convertie au type annoté : booléen
+    (true/false, 0/1 ou texte oui/non...), durée de DUREE_MIN à DUREE_MAX
+    mois, montant de 0 à MONTANT_MAX, texte, liste d'objets. ValueError
+    sinon (un "false" texte ne doit pas valoir vrai).
+    """
+    attendu = TYPES_QUOTE[nom]
+    if isinstance(attendu, types.UnionType):
+        if valeur is None:
+            return None
+        attendu = next(t for t in attendu.__args__ if t is not type(None))
+    if attendu is bool:
+        try:
+            booleen = lire_booleen(valeur) if isinstance(valeur, (bool, int, float, str)) else None
+        except ValueError:
+            booleen = None
+        if booleen is None:
+            raise ValueError(f"{nom} : booléen attendu, reçu {valeur!r}")
+        return booleen
+    if attendu is int:
+        # Seul champ entier : la durée (mois), bornée comme dans le formulaire
+        if isinstance(valeur, float) and valeur.is_integer():
+            valeur = int(valeur)
+        if isinstance(valeur, int) and not isinstance(valeur, bool) and DUREE_MIN <= valeur <= DUREE_MAX:
+            return valeur
+        raise ValueError(f"{nom} : entier de {DUREE_MIN} à {DUREE_MAX} attendu, reçu {valeur!r}")
+    if attendu is float:
+        # Montants et primes en FCFA
+        if isinstance(valeur, (int, float)) and not isinstance(valeur, bool) and 0 <= valeur <= MONTANT_MAX:
+            return valeur
+        raise ValueError(f"{nom} : montant de 0 à {MONTANT_MAX:.0e} FCFA attendu, reçu {valeur!r}")
+    if attendu is str:
+        if isinstance(valeur, str):
+            return valeur
+        raise ValueError(f"{nom} : texte attendu, reçu {valeur!r}")
+    if attendu is list:
+        if isinstance(valeur, list) and all(isinstance(element, dict) for element in valeur):
+            return valeur
+        raise ValueError(f"{nom} : liste d'objets attendue")
+    return valeur
+
+
+def lire_quote(donnees):
+    """QuoteInput depuis un objet JSON (mêmes noms de champs, valeurs du type annoté) ; ValueError si invalide"""
+    if not isinstance(donnees, dict):
+        raise ValueError("Un objet JSON est attendu")
+    inconnus = sorted(set(donnees) - CHAMPS_QUOTE)
+    if inconnus:
+        raise ValueError(f"Champs inconnus : {', '.join(inconnus)}")
+    return QuoteInput(**{nom: _valeur_champ(nom, valeur) for nom, valeur in donnees.items()})
+
+
+def lire_baremes(date_cotation):
+    """Version des barèmes en vigueur à date_cotation (aaaa-mm-jj, aujourd'hui si absente) ; ValueError si invalide"""
+    date = None
+    if date_cotation is not None:
+        try:
+            date = datetime.date.fromisoformat(date_cotation)
+        except (TypeError, ValueError):
+            raise ValueError(f"date_cotation invalide (aaaa-mm-jj attendu) : {date_cotation!r}") from None
+    return versions_tarif().version_au(date)
+
+
+def coter(donnees):
+    """Tarifie une demande JSON et retourne le résultat (dict sérialisable) ; ValueError si invalide"""
+    if not isinstance(donnees, dict):
+        raise ValueError("Un objet JSON est attendu")
+    donnees = dict(donnees)
+    baremes = lire_baremes(donnees.pop("date_cotation", None))
+    quote = lire_quote(donnees)
+    debut = time.perf_counter()
+    try:
+        resultat = price_quote_fcfa(quote, baremes)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Paramètres invalides : {e}") from None
+    duree = time.perf_counter() - debut
+    metriques.observer("tarification", duree)
+    metriques.compter("cotation")
+    lignes = [] if quote.mode_manuel else decomposition(quote, resultat)
+    empreinte = empreinte_quote(quote)
+    metriques.journaliser("cotation", source="http", empreinte=empreinte, prime_ttc=resultat.prime_ttc,
+                          etapes={"tarification": duree})
+    return {
+        "empreinte": empreinte,
+        "version_tarif": baremes.version,
+        **vars(resultat),
+        "decomposition": [{"garantie": g, "montant": m, "taux": t} for g, m, t in lignes],
+    }
+
+
+def _json(objet):
+    return json.dumps(objet, ensure_ascii=False).encode("utf-8")
+
+
+def _lire_json(corps):
+    try:
+        return json.loads(corps)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"JSON invalide : {e}") from None
+
+# =========================================================
+# SERVEUR HTTP
+# =========================================================
+
+def _entete(statut, type_contenu, longueur=None, garder=True):
+    """En-tête de réponse ; sans longueur, le corps est envoyé par morceaux (chunked)"""
+    lignes = [f"HTTP/1.1 {statut} {RAISONS[statut]}", f"Content-Type: {type_contenu}"]
+    lignes.append(f"Content-Length: {longueur}" if longueur is not None else "Transfer-Encoding: chunked")
+    if statut == 503:
+        lignes.append("Retry-After: 1")
+    if not garder:
+        lignes.append("Connection: close")
+    return ("\r\n".join(lignes) + "\r\n\r\n").encode("latin-1")
+
+
+def _morceau(donnees):
+    return b"%x\r\n%s\r\n" % (len(donnees), donnees)
+
+
+class ServeurCotation:
+    """Service HTTP de tarification (une instance par processus)"""
+
+    def __init__(self, workers=None, profondeur_max=None):
+        self.workers = workers
+        self.profondeur_max = profondeur_max
+        # (méthode, chemin, traitement, étape mesurée) ; {empreinte} est passé au traitement
+        self._routes = [
+            (
+                methode,
+                re.compile(chemin.replace("{empreinte}", "(?P<empreinte>[0-9a-f]{64})")),
+                traiter,
+                f"http {methode} {chemin}",
+            )
+            for methode, chemin, traiter in [
+                ("GET", "/sante", self._sante),
+                ("GET", "/metriques", self._metriques),
+                ("POST", "/cotation", self._cotation),
+                ("POST", "/cotations", self._cotations),
+                ("POST", "/pdf", self._pdf),
+                ("POST", "/rendus", self._soumettre_rendu),
+                ("GET", "/rendus/{empreinte}", self._statut_rendu),
+                ("GET", "/rendus/{empreinte}/pdf", self._pdf_rendu),
+            ]
+        ]
+        self._serveur = None
+        self.file = None
+
+    async def demarrer(self, hote=HOTE, port=PORT):
+        self.file = FileRendus(self.workers, self.profondeur_max)
+        self._serveur = await asyncio.start_server(self._servir_connexion, hote, port, limit=TAILLE_MAX_LIGNE)
+        return self._serveur
+
+    async def arreter(self):
+        self._serveur.close()
+        await self._serveur.wait_closed()
+        self.file.fermer()
+
+    def _router(self, methode, cible):
+        """Traitement, paramètres de chemin et nom d'étape d'une requête"""
+        chemin = cible.partition("?")[0]
+        methodes = []
+        for methode_route, modele, traiter, etape in self._routes:
+            correspondance = modele.fullmatch(chemin)
+            if correspondance is None:
+                continue
+            if methode_route == methode:
+                return traiter, correspondance.groupdict(), etape
+            methodes.append(methode_route)
+        if methodes:
+            raise ErreurHttp(405, f"Méthode {methode} non autorisée (attendue : {', '.join(methodes)})")
+        raise ErreurHttp(404, f"Ressource inconnue : {cible}")
+
+    async def _servir_connexion(self, lecteur, ecrivain):
+        try:
+            while await self._servir_requete(lecteur, ecrivain):
+                pass
+        except (asyncio.IncompleteReadError, ConnectionError, TimeoutError, ValueError):
+            # Client parti, inactif, ou ligne trop longue (ValueError de readline)
+            pass
+        finally:
+            ecrivain.close()
+
+    async def _servir_requete(self, lecteur, ecrivain):
+        """Traite une requête ; retourne False si la connexion doit être fermée"""
+        ligne = await asyncio.wait_for(lecteur.readline(), DELAI_INACTIVITE)
+        if not ligne:
+            return False
+        entetes = {}
+        while (entete := await lecteur.readline()) not in (b"\r\n", b"\n", b""):
+            nom, _, valeur = entete.decode("latin-1").partition(":")
+            entetes[nom.strip().lower()] = valeur.strip()
+
+        longueur = 0
+        garder = False
+        try:
+            try:
+                methode, cible, version = ligne.decode("latin-1").split()
+            except ValueError:
+                raise ErreurHttp(400, "Ligne de requête invalide") from None
+            connexion = entetes.get("connection", "").lower()
+            garder = connexion != "close" if version == "HTTP/1.1" else connexion == "keep-alive"
+            if "transfer-encoding" in entetes:
+                raise ErreurHttp(501, "Corps par morceaux non pris en charge : indiquer Content-Length")
+            contenu = entetes.get("content-length", "0")
+            if not contenu.isdigit():
+                raise ErreurHttp(400, "Content-Length invalide")
+            longueur = int(contenu)
+            traiter, parametres, etape = self._router(methode, cible)
+            with metriques.Chrono(etape):
+                return await traiter(lecteur, ecrivain, longueur, garder, **parametres)
+        except ErreurHttp as e:
+            statut, message = e.statut, str(e)
+        except FileSaturee as e:
+            statut, message = 503, f"Génération des PDF saturée, réessayer plus tard : {e}"
+        except ValueError as e:
+            statut, message = 400, str(e) or "Requête invalide"
+        except (asyncio.IncompleteReadError, ConnectionError):
+            raise
+        except Exception:
+            journal.exception("Échec du traitement de %r", ligne)
+            statut, message = 500, "Erreur interne"
+        # Corps éventuellement non lu : la connexion ne peut pas être réutilisée
+        garder = garder and longueur == 0
+        corps = _json({"erreur": message})
+        ecrivain.write(_entete(statut, TYPE_JSON, len(corps), garder) + corps)
+        await ecrivain.drain()
+        return garder
+
+    async def _lire_corps(self, lecteur, longueur):
+        if longueur > TAILLE_MAX_CORPS:
+            raise ErreurHttp(413, f"Corps limité à {TAILLE_MAX_CORPS} octets")
+        return await lecteur.readexactly(longueur)
+
+    async def _repondre(self, ecrivain, corps, garder, type_contenu=TYPE_JSON, statut=200):
+        ecrivain.write(_entete(statut, type_contenu, len(corps), garder) + corps)
+        await ecrivain.drain()
+        return garder
+
+    async def _lire_pdf_data(self, lecteur, longueur):
+        donnees = _lire_json(await self._lire_corps(lecteur, longueur))
+        if not isinstance(donnees, dict):
+            raise ValueError("Un objet JSON (pdf_data) est attendu")
+        return donnees
+
+    async def _sante(self, lecteur, ecrivain, longueur, garder):
+        return await self._repondre(ecrivain, _json({"statut": "ok", "rendus": self.file.charge()}), garder)
+
+    async def _metriques(self, lecteur, ecrivain, longueur, garder):
+        corps = metriques.texte_prometheus().encode("utf-8")
+        return await self._repondre(ecrivain, corps, garder, TYPE_PROMETHEUS)
+
+    async def _cotation(self, lecteur, ecrivain, longueur, garder):
+        donnees = _lire_json(await self._lire_corps(lecteur, longueur))
+        return await self._repondre(ecrivain, _json(coter(donnees)), garder)
+
+    async def _cotations(self, lecteur, ecrivain, longueur, garder):
+        """
+        Tarifie une demande par ligne et renvoie un résultat par ligne (avec son
+        indice, ou un champ "erreur"), bloc par bloc, sans attendre la fin du
+        corps : la mémoire utilisée ne dépend pas de la taille du lot.
+        """
+        ecrivain.write(_entete(200, TYPE_NDJSON, garder=garder))
+        reste, tampon, indice = longueur, b"", 0
+        while True:
+            if reste:
+                bloc = await lecteur.readexactly(min(reste, TAILLE_BLOC))
+                reste -= len(bloc)
+                *lignes, tampon = (tampon + bloc).split(b"\n")
+            else:
+                # Dernière ligne sans retour à la ligne final
+                lignes, tampon = [tampon], b""
+            sortie = []
+            for ligne in lignes:
+                if not ligne.strip():
+                    continue
+                try:
+                    resultat = {"indice": indice, **coter(_lire_json(ligne))}
+                except ValueError as e:
+                    resultat = {"indice": indice, "erreur": str(e)}
+                except Exception:
+                    # L'en-tête 200 est déjà parti : l'échec reste propre à la ligne
+                    journal.exception("Échec de la cotation de la ligne %d", indice)
+                    resultat = {"indice": indice, "erreur": "Erreur interne"}
+                sortie.append(_json(resultat))
+                indice += 1
+            trop_longue = len(tampon) > TAILLE_MAX_LIGNE
+            if trop_longue:
+                sortie.append(_json({"indice": indice, "erreur": f"Ligne limitée à {TAILLE_MAX_LIGNE} octets"}))
+            if sortie:
+                ecrivain.write(_morceau(b"\n".join(sortie) + b"\n"))
+                await ecrivain.drain()
+            if trop_longue or not (reste or tampon):
+                break
+        ecrivain.write(_morceau(b""))
+        await ecrivain.drain()
+        # Après une ligne trop longue, le reste du corps n'est pas lu : connexion fermée
+        return garder and not trop_longue
+
+    async def _pdf(self, lecteur, ecrivain, longueur, garder):
+        empreinte = self.file.soumettre(await self._lire_pdf_data(lecteur, longueur))
+        pdf = await asyncio.wrap_future(self.file.travail(empreinte))
+        return await self._repondre(ecrivain, pdf, garder, "application/pdf")
+
+    async def _soumettre_rendu(self, lecteur, ecrivain, longueur, garder):
+        empreinte = self.file.soumettre(await self._lire_pdf_data(lecteur, longueur))
+        etat = {"empreinte": empreinte, "statut": self.file.statut(empreinte)}
+        return await self._repondre(ecrivain, _json(etat), garder, statut=202)
+
+    async def _statut_rendu(self, lecteur, ecrivain, longueur, garder, empreinte):
+        etat = self.file.statut(empreinte)
+        if etat is None:
+            raise ErreurHttp(404, f"Rendu inconnu : {empreinte}")
+        return await self._repondre(ecrivain, _json({"empreinte": empreinte, "statut": etat}), garder)
+
+    async def _pdf_rendu(self, lecteur, ecrivain, longueur, garder, empreinte):
+        etat = self.file.statut(empreinte)
+        if etat is None:
+            raise ErreurHttp(404, f"Rendu inconnu : {empreinte}")
+        if etat == ECHEC:
+            raise ErreurHttp(500, "La génération du PDF a échoué")
+        if etat != TERMINE:
+            return await self._repondre(ecrivain, _json({"empreinte": empreinte, "statut": etat}), garder, statut=202)
+        return await self._repondre(ecrivain, self.file.resultat(empreinte), garder, "application/pdf")
+
+
+async def servir(hote=HOTE, port=PORT, workers=None, profondeur_max=None, prechauffage=False):
+    """
+    Démarre le service et le fait tourner jusqu'à interruption. Avec
+    `prechauffage`, le cube de taux et les workers PDF sont chargés dès le
+    démarrage (les requêtes sont servies pendant ce temps).
+    """
+    serveur = ServeurCotation(workers, profondeur_max)
+    ecoute = await serveur.demarrer(hote, port)
+    print(f"Service de cotation sur http://{hote}:{port} ({serveur.file.workers} processus PDF)", file=sys.stderr)
+    if prechauffage:
+        durees = await asyncio.to_thread(prechauffer, serveur.file, modules=[])
+        detail = ", ".join(f"{etape} {duree * 1000:.0f} ms" for etape, duree in durees.items())
+        print(f"Préchauffage terminé ({detail})", file=sys.stderr)
+    # Arrêt propre (pool de rendus compris) sur SIGTERM comme sur Ctrl+C
+    with contextlib.suppress(NotImplementedError):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        await ecoute.serve_forever()
+    finally:
+        await serveur.arreter()
+
+# =========================================================
+# CLIENT DE MESURE
+# =========================================================
+
+async def mesurer_debit(hote=HOTE, port=PORT, nb_requetes=10000, connexions=16, quote=None):
+    """
+    Envoie nb_requetes POST /cotation répartis sur `connexions` connexions
+    persistantes et retourne un dictionnaire de statistiques.
+    """
+    corps = _json(quote or EXEMPLE_QUOTE)
+    requete = (
+        f"POST /cotation HTTP/1.1\r\nHost: {hote}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(corps)}\r\n\r\n"
+    ).encode("latin-1") + corps
+    erreurs = 0
+
+    async def client(n):
+        nonlocal erreurs
+        lecteur, ecrivain = await asyncio.open_connection(hote, port)
+        try:
+            for _ in range(n):
+                ecrivain.write(requete)
+                statut = await lecteur.readline()
+                longueur = 0
+                while (entete := await lecteur.readline()) not in (b"\r\n", b""):
+                    if entete.lower().startswith(b"content-length:"):
+                        longueur = int(entete[15:])
+                await lecteur.readexactly(longueur)
+                if not statut.startswith(b"HTTP/1.1 200"):
+                    erreurs += 1
+        finally:
+            ecrivain.close()
+
+    repartition = [nb_requetes // connexions + (i < nb_requetes % connexions) for i in range(connexions)]
+    debut = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in repartition if n))
+    duree = time.perf_counter() - debut
+    return {
+        "requetes": nb_requetes,
+        "erreurs": erreurs,
+        "connexions": connexions,
+        "duree_s": duree,
+        "requetes_par_seconde": nb_requetes / duree if duree else 0.0,
+    }
+
+# =========================================================
+# POINT D'ENTRÉE
+# =========================================================
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Service HTTP local de tarification TRC")
+    parser.add_argument("--hote", default=HOTE, help=f"Adresse d'écoute (défaut : {HOTE})")
+    parser.add_argument("--port", type=int, default=PORT, help=f"Port d'écoute (défaut : {PORT})")
+    parser.add_argument("--workers", type=int, default=None, help="Processus de génération PDF (défaut : cœurs disponibles)")
+    parser.add_argument("--profondeur", type=int, default=None, help="Rendus PDF acceptés en file avant refus (503)")
+    parser.add_argument("--prechauffage", action="store_true",
+                        help="Charger le cube de taux et lancer les workers PDF dès le démarrage")
+    parser.add_argument("--charge", type=int, metavar="N", help="Client de mesure : envoie N cotations au service déjà démarré")
+    parser.add_argument("--connexions", type=int, default=16, help="Connexions simultanées du client de mesure")
+    args = parser.parse_args(argv)
+
+    if args.charge:
+        stats = asyncio.run(mesurer_debit(args.hote, args.port, args.charge, args.connexions))
+        print(
+            f"{stats['requetes']} cotations en {stats['duree_s']:.2f} s sur {stats['connexions']} connexions "
+            f"({stats['requetes_par_seconde']:.0f} req/s, {stats['erreurs']} en erreur)",
+            file=sys.stderr,
+        )
+        return 1 if stats["erreurs"] else 0
+
+    logging.basicConfig()
+    try:
+        asyncio.run(servir(args.hote, args.port, args.workers, args.profondeur, args.prechauffage))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
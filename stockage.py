@@ -0,0 +1,404 @@
+"""
+Historique des cotations (base SQLite locale).
+
+Chaque cotation calculée est enregistrée avec son pdf_data, sa décomposition
+et ses primes. Les écritures passent par une file traitée par un thread
+dédié qui les regroupe en transactions : l'interface n'attend jamais le
+disque. Le pdf_data est stocké compressé, et les PDF (compressés eux aussi)
+dans une table séparée qui n'est lue que lorsqu'on les demande et dont la
+taille est bornée (les PDF les moins récemment utilisés sont supprimés).
+
+La base est en mode WAL : les lectures (recherche, réouverture) ne sont pas
+bloquées par les écritures en cours. Les champs libres (nature des travaux,
+situation géographique, intervenants) sont indexés en texte intégral (FTS5)
+au fil des enregistrements, sans accents, pour rechercher_texte().
+"""
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+from pdf_cotation import empreinte_pdf_data, retirer_accents
+
+# Base par défaut (à côté de ce module), modifiable par variable d'environnement
+CHEMIN_BASE = os.environ.get(
+    "TRC_BASE_COTATIONS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "cotations.db"),
+)
+
+# Écritures regroupées : au plus TAILLE_LOT par transaction, en attendant au
+# plus DELAI_LOT secondes que le lot se remplisse
+TAILLE_LOT = 200
+DELAI_LOT = 0.2
+
+# Nombre maximal d'écritures en attente (au-delà, enregistrer() attend le thread)
+MAX_EN_ATTENTE = 10000
+
+NIVEAU_COMPRESSION = 6
+
+# Taille maximale (octets compressés) des PDF conservés : au-delà, les moins
+# récemment utilisés sont supprimés. generate_pdf() étant déterministe, un PDF
+# supprimé est régénéré à l'identique depuis le pdf_data de la cotation.
+TAILLE_MAX_PDFS = int(os.environ.get("TRC_TAILLE_MAX_PDFS", 256 * 1024 * 1024))
+
+journal = logging.getLogger(__name__)
+
+# Colonnes indexées pour la recherche
+COLONNES_RECHERCHE = ["souscripteur", "intermediaire", "maitre_ouvrage", "type_travaux", "date_cotation"]
+
+# Colonnes renvoyées par rechercher() (sans les données volumineuses)
+COLONNES_RESUME = [
+    "id", "empreinte", "cree_le", "souscripteur", "intermediaire", "maitre_ouvrage",
+    "type_travaux", "date_cotation", "montant", "prime_nette", "prime_ttc",
+]
+
+# Recherche plein texte : au-delà de CANDIDATS_RECHERCHE correspondances,
+# seules les plus récentes sont classées par pertinence (temps de réponse
+# borné, moins de 100 ms, même pour un mot présent dans des centaines de
+# milliers de cotations ; en deçà, toutes le sont)
+CANDIDATS_RECHERCHE = 20000
+
+# Champs de pdf_data indexés en texte intégral
+CHAMPS_TEXTE = ["nature_travaux", "situation_geo", "entreprise_principale", "autres_intervenants"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cotations (
+    id INTEGER PRIMARY KEY,
+    empreinte TEXT NOT NULL UNIQUE,
+    cree_le TEXT NOT NULL,
+    souscripteur TEXT,
+    intermediaire TEXT,
+    maitre_ouvrage TEXT,
+    type_travaux TEXT,
+    date_cotation TEXT,
+    montant REAL,
+    prime_nette REAL,
+    prime_ttc REAL,
+    pdf_data BLOB NOT NULL,
+    decomposition TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cotations_souscripteur ON cotations (souscripteur);
+CREATE INDEX IF NOT EXISTS idx_cotations_intermediaire ON cotations (intermediaire);
+CREATE INDEX IF NOT EXISTS idx_cotations_maitre_ouvrage ON cotations (maitre_ouvrage);
+CREATE INDEX IF NOT EXISTS idx_cotations_type_travaux ON cotations (type_travaux);
+CREATE INDEX IF NOT EXISTS idx_cotations_date_cotation ON cotations (date_cotation);
+CREATE TABLE IF NOT EXISTS pdfs (
+    empreinte TEXT PRIMARY KEY,
+    pdf BLOB NOT NULL,
+    taille INTEGER NOT NULL DEFAULT 0,
+    dernier_acces REAL NOT NULL DEFAULT 0
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS cotations_fts USING fts5(
+    nature_travaux, situation_geo, entreprise_principale, autres_intervenants,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3 4 5 6'
+);
+"""
+
+INSERTION_COTATION = (
+    "INSERT OR IGNORE INTO cotations (empreinte, cree_le, souscripteur, intermediaire, "
+    "maitre_ouvrage, type_travaux, date_cotation, montant, prime_nette, prime_ttc, "
+    "pdf_data, decomposition) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+INSERTION_PDF = "INSERT OR IGNORE INTO pdfs (empreinte, pdf, taille, dernier_acces) VALUES (?, ?, ?, ?)"
+
+ACCES_PDF = "UPDATE pdfs SET dernier_acces = ? WHERE empreinte = ?"
+
+# Taille totale des PDF enregistrés (parcours de l'index idx_pdfs_dernier_acces, qui la contient)
+TAILLE_PDFS = "SELECT coalesce(sum(taille), 0) FROM pdfs INDEXED BY idx_pdfs_dernier_acces"
+
+# Supprime les PDF les moins récemment utilisés au-delà de la taille maximale
+# (exécutée seulement quand la taille totale la dépasse)
+EVICTION_PDFS = (
+    "DELETE FROM pdfs WHERE rowid IN ("
+    "SELECT rowid FROM (SELECT rowid, sum(taille) OVER (ORDER BY dernier_acces DESC) AS cumul "
+    "FROM pdfs INDEXED BY idx_pdfs_dernier_acces) WHERE cumul > ?)"
+)
+
+INSERTION_TEXTE = (
+    f"INSERT INTO cotations_fts (rowid, {', '.join(CHAMPS_TEXTE)}) "
+    f"VALUES (?, {', '.join('?' * len(CHAMPS_TEXTE))})"
+)
+
+
+def _date_iso(date_cotation):
+    """'17.10.2026' -> '2026-10-17' (ordre chronologique = ordre alphabétique)"""
+    try:
+        return datetime.datetime.strptime(date_cotation, "%d.%m.%Y").date().isoformat()
+    except (TypeError, ValueError):
+        return date_cotation
+
+
+def _texte(valeur):
+    """Valeurs de pdf_data : '-' (champ vide) est stocké comme NULL"""
+    return None if valeur in (None, "", "-") else str(valeur)
+
+
+def _textes_indexes(pdf_data):
+    """Champs libres de pdf_data tels qu'indexés (sans accents, comme clean_text)"""
+    return tuple(retirer_accents(_texte(pdf_data.get(champ)) or "") for champ in CHAMPS_TEXTE)
+
+
+def _conditions(criteres, prefixe=""):
+    """Conditions SQL (égalité exacte) et valeurs pour les critères renseignés"""
+    conditions, valeurs = [], []
+    for colonne, valeur in criteres.items():
+        if colonne not in COLONNES_RECHERCHE:
+            raise ValueError(f"Critère de recherche inconnu : {colonne}")
+        if valeur in (None, ""):
+            continue
+        conditions.append(f"{prefixe}{colonne} = ?")
+        valeurs.append(_date_iso(valeur) if colonne == "date_cotation" else valeur)
+    return conditions, valeurs
+
+
+class MagasinCotations:
+    """
+    Historique des cotations dans une base SQLite.
+
+    enregistrer() et enregistrer_pdf() ne font que déposer l'écriture dans
+    une file ; un thread l'écrit avec les suivantes dans une même transaction.
+    Les lectures utilisent une connexion par thread.
+    """
+
+    def __init__(self, chemin=CHEMIN_BASE, taille_lot=TAILLE_LOT, delai_lot=DELAI_LOT,
+                 taille_max_pdfs=TAILLE_MAX_PDFS):
+        self.chemin = chemin
+        self.taille_lot = taille_lot
+        self.delai_lot = delai_lot
+        self.taille_max_pdfs = taille_max_pdfs
+        self._lecteurs = threading.local()
+        connexion = self._connecter()
+        connexion.executescript(SCHEMA)
+        self._migrer(connexion)
+        self._indexer_manquantes(connexion)
+        connexion.close()
+        self._file = queue.Queue(maxsize=MAX_EN_ATTENTE)
+        self._ecrivain = threading.Thread(target=self._ecrire_en_continu, name="ecrivain-cotations", daemon=True)
+        self._ecrivain.start()
+        atexit.register(self.fermer)
+
+    def _connecter(self):
+        connexion = sqlite3.connect(self.chemin, timeout=30)
+        connexion.execute("PRAGMA journal_mode=WAL")
+        connexion.execute("PRAGMA synchronous=NORMAL")
+        connexion.row_factory = sqlite3.Row
+        return connexion
+
+    def _migrer(self, connexion):
+        """Ajoute aux bases plus anciennes les colonnes de suivi des PDF (taille, dernier accès)"""
+        colonnes = {ligne["name"] for ligne in connexion.execute("PRAGMA table_info(pdfs)")}
+        with connexion:
+            if "taille" not in colonnes:
+                connexion.execute("ALTER TABLE pdfs ADD COLUMN taille INTEGER NOT NULL DEFAULT 0")
+                connexion.execute("ALTER TABLE pdfs ADD COLUMN dernier_acces REAL NOT NULL DEFAULT 0")
+                connexion.execute("UPDATE pdfs SET taille = length(pdf)")
+            connexion.execute(
+                "CREATE INDEX IF NOT EXISTS idx_pdfs_dernier_acces ON pdfs (dernier_acces, taille)"
+            )
+
+    def _indexer_manquantes(self, connexion):
+        """Indexe en texte intégral les cotations enregistrées avant la création de l'index"""
+        dernier = connexion.execute("SELECT coalesce(max(rowid), 0) FROM cotations_fts").fetchone()[0]
+        lignes = connexion.execute("SELECT id, pdf_data FROM cotations WHERE id > ?", (dernier,))
+        with connexion:
+            connexion.executemany(INSERTION_TEXTE, (
+                (ligne["id"], *_textes_indexes(json.loads(zlib.decompress(ligne["pdf_data"]))))
+                for ligne in lignes.fetchall()
+            ))
+
+    def _lecteur(self):
+        """Connexion de lecture propre au thread appelant"""
+        connexion = getattr(self._lecteurs, "connexion", None)
+        if connexion is None:
+            connexion = self._lecteurs.connexion = self._connecter()
+        return connexion
+
+    # =========================================================
+    # ÉCRITURES (asynchrones, regroupées)
+    # =========================================================
+
+    def enregistrer(self, pdf_data, quote, resultat, lignes_decomposition):
+        """
+        Met en file l'enregistrement d'une cotation et retourne son empreinte.
+
+        Une cotation déjà enregistrée (même pdf_data) n'est pas dupliquée.
+        """
+        empreinte = empreinte_pdf_data(pdf_data)
+        ligne = (
+            empreinte,
+            datetime.datetime.now().isoformat(timespec="seconds"),
+            _texte(pdf_data.get("souscripteur")),
+            _texte(pdf_data.get("intermediaire")),
+            _texte(pdf_data.get("maitre_ouvrage")),
+            quote.type_travaux,
+            _date_iso(pdf_data.get("date_cotation")),
+            float(quote.montant),
+            float(resultat.prime_nette),
+            float(resultat.prime_ttc),
+            json.dumps(pdf_data, ensure_ascii=False, default=str),
+            json.dumps(lignes_decomposition, ensure_ascii=False),
+        )
+        # La compression et l'indexation sont faites par le thread d'écriture
+        self._file.put(("cotation", (ligne, _textes_indexes(pdf_data))))
+        return empreinte
+
+    def enregistrer_pdf(self, empreinte, pdf_bytes):
+        """Met en file l'enregistrement (compressé) du PDF d'une cotation"""
+        self._file.put(("pdf", (empreinte, pdf_bytes, time.time())))
+
+    def _ecrire_en_continu(self):
+        connexion = self._connecter()
+        # Taille totale des PDF, tenue à jour au fil des insertions (ce thread
+        # est le seul à écrire dans la base) et relue après une éviction ou un
+        # lot perdu : l'éviction ne parcourt la table que si la borne est dépassée
+        taille_pdfs = connexion.execute(TAILLE_PDFS).fetchone()[0]
+        arret = False
+        while not arret:
+            lot = [self._file.get()]
+            while len(lot) < self.taille_lot:
+                try:
+                    lot.append(self._file.get(timeout=self.delai_lot))
+                except queue.Empty:
+                    break
+            try:
+                with connexion:
+                    for nature, contenu in lot:
+                        if nature == "cotation":
+                            ligne, textes = contenu
+                            pdf_data = zlib.compress(ligne[-2].encode("utf-8"), NIVEAU_COMPRESSION)
+                            curseur = connexion.execute(INSERTION_COTATION, (*ligne[:-2], pdf_data, ligne[-1]))
+                            # Index texte mis à jour seulement pour une nouvelle cotation
+                            if curseur.rowcount:
+                                connexion.execute(INSERTION_TEXTE, (curseur.lastrowid, *textes))
+                        elif nature == "pdf":
+                            empreinte, pdf_bytes, instant = contenu
+                            pdf = zlib.compress(pdf_bytes, NIVEAU_COMPRESSION)
+                            if connexion.execute(INSERTION_PDF, (empreinte, pdf, len(pdf), instant)).rowcount:
+                                taille_pdfs += len(pdf)
+                            else:
+                                # PDF déjà enregistré : seul son dernier accès change
+                                connexion.execute(ACCES_PDF, (instant, empreinte))
+                        elif nature == "acces":
+                            empreinte, instant = contenu
+                            connexion.execute(ACCES_PDF, (instant, empreinte))
+                        else:
+                            arret = True
+                    if taille_pdfs > self.taille_max_pdfs:
+                        connexion.execute(EVICTION_PDFS, (self.taille_max_pdfs,))
+                        taille_pdfs = connexion.execute(TAILLE_PDFS).fetchone()[0]
+            except sqlite3.Error:
+                # Le lot est perdu mais le thread continue de servir les suivants
+                journal.exception("Échec de l'enregistrement de %d cotation(s)", len(lot))
+                taille_pdfs = connexion.execute(TAILLE_PDFS).fetchone()[0]
+            finally:
+                for _ in lot:
+                    self._file.task_done()
+        connexion.close()
+
+    def attendre(self):
+        """Bloque jusqu'à ce que toutes les écritures en file soient faites"""
+        self._file.join()
+
+    def fermer(self):
+        """Écrit ce qui reste en file puis arrête le thread d'écriture"""
+        if self._ecrivain.is_alive():
+            self._file.put(("arret", None))
+            self._ecrivain.join()
+
+    # =========================================================
+    # LECTURES
+    # =========================================================
+
+    def rechercher(self, limite=50, **criteres):
+        """
+        Cotations les plus récentes correspondant aux critères (égalité exacte
+        sur les colonnes de COLONNES_RECHERCHE ; date_cotation au format
+        'jj.mm.aaaa' ou 'aaaa-mm-jj'). Retourne des dicts sans pdf_data ni PDF.
+        """
+        conditions, valeurs = _conditions(criteres)
+        requete = f"SELECT {', '.join(COLONNES_RESUME)} FROM cotations"
+        if conditions:
+            requete += " WHERE " + " AND ".join(conditions)
+        requete += " ORDER BY id DESC LIMIT ?"
+        return [dict(ligne) for ligne in self._lecteur().execute(requete, (*valeurs, limite))]
+
+    def rechercher_texte(self, texte, limite=20, **criteres):
+        """
+        Recherche plein texte (nature des travaux, situation géographique,
+        intervenants), sans tenir compte des accents ni de la casse. Le
+        dernier mot est cherché comme préfixe (saisie en cours), les autres
+        comme mots entiers. Les résultats sont classés par pertinence (BM25)
+        parmi toutes les correspondances, ou les CANDIDATS_RECHERCHE plus
+        récentes s'il y en a davantage, et contiennent un extrait (champ
+        `extrait`, calculé pour les seuls résultats renvoyés). Les critères
+        sont ceux de rechercher().
+        """
+        mots = re.findall(r"\w+", retirer_accents(texte).lower())
+        if not mots:
+            return []
+        requete_fts = " ".join(f'"{mot}"' for mot in mots[:-1])
+        # Préfixe d'au moins deux lettres (index de préfixes de 2 à 6 lettres)
+        requete_fts += f' "{mots[-1]}"*' if len(mots[-1]) > 1 else f' "{mots[-1]}"'
+        conditions, valeurs = _conditions(criteres, "c.")
+        lecteur = self._lecteur()
+        # 1. Classement (rank seul) des candidats, les plus récents d'abord à pertinence égale
+        classement = lecteur.execute(
+            "SELECT rowid FROM ("
+            "SELECT f.rowid, f.rank FROM cotations_fts f JOIN cotations c ON c.id = f.rowid "
+            f"WHERE {' AND '.join(['cotations_fts MATCH ?', *conditions])} "
+            "ORDER BY f.rowid DESC LIMIT ?"
+            ") ORDER BY rank, rowid DESC LIMIT ?",
+            (requete_fts, *valeurs, CANDIDATS_RECHERCHE, limite),
+        ).fetchall()
+        ids = [ligne[0] for ligne in classement]
+        if not ids:
+            return []
+        marques = ", ".join("?" * len(ids))
+        # 2. Extraits des seuls résultats, en un parcours de leur plage de rowid
+        # (relire l'index ligne par ligne coûte un parcours par ligne pour un préfixe long)
+        extraits = dict(lecteur.execute(
+            f"SELECT rowid, CASE WHEN rowid IN ({marques}) "
+            "THEN snippet(cotations_fts, -1, '[', ']', '…', 12) END AS extrait "
+            "FROM cotations_fts WHERE cotations_fts MATCH ? AND rowid BETWEEN ? AND ? AND extrait IS NOT NULL",
+            (*ids, requete_fts, min(ids), max(ids)),
+        ).fetchall())
+        lignes = {
+            ligne["id"]: dict(ligne)
+            for ligne in lecteur.execute(
+                f"SELECT {', '.join(COLONNES_RESUME)} FROM cotations WHERE id IN ({marques})", ids
+            )
+        }
+        return [{**lignes[i], "extrait": extraits.get(i)} for i in ids if i in lignes]
+
+    def charger(self, empreinte):
+        """Cotation complète (pdf_data et décomposition décodés), ou None"""
+        ligne = self._lecteur().execute(
+            "SELECT * FROM cotations WHERE empreinte = ?", (empreinte,)
+        ).fetchone()
+        if ligne is None:
+            return None
+        cotation = dict(ligne)
+        cotation["pdf_data"] = json.loads(zlib.decompress(cotation["pdf_data"]))
+        cotation["decomposition"] = json.loads(cotation["decomposition"])
+        return cotation
+
+    def charger_pdf(self, empreinte):
+        """
+        PDF enregistré d'une cotation (décompressé), ou None s'il n'a jamais été
+        généré ou a été supprimé pour rester sous taille_max_pdfs
+        """
+        ligne = self._lecteur().execute("SELECT pdf FROM pdfs WHERE empreinte = ?", (empreinte,)).fetchone()
+        if ligne is None:
+            return None
+        # Date de dernier accès mise à jour par le thread d'écriture (ordre LRU)
+        self._file.put(("acces", (empreinte, time.time())))
+        return zlib.decompress(ligne["pdf"])
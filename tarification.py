@@ -0,0 +1,570 @@
+"""
+Moteur de tarification TRC (Tous Risques Chantier) - Assur Defender.
+
+Ce module ne dépend ni de Streamlit, ni de pandas, ni de fpdf : il peut être
+importé par les traitements par lot et les services pour obtenir une prime
+sans charger l'interface.
+
+Les barèmes écrits ici sont la version de référence (BAREMES_REFERENCE) ;
+les révisions datées sont lues depuis des fichiers par baremes.py et passées
+aux fonctions de tarification (paramètre `baremes`).
+"""
+import datetime
+import hashlib
+import json
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+import numpy as np
+
+# =========================================================
+# BARÈMES (Basés sur les images)
+# =========================================================
+TARIFS_BATIMENT = {
+    "logement_commercial": {
+        "A": {"12m": 1.10, "18m": 1.27},
+        "B": {"12m": 1.27, "18m": 1.44},
+    },
+    "public_industriel": {
+        "A": {"12m": 1.27, "18m": 1.61},
+        "B": {"12m": 1.44, "18m": 1.78},
+    },
+}
+
+TARIF_ASSAINISSEMENT = {"12m": 2.21, "18m": 2.55}
+TARIF_ROUTES = {"12m": 1.78, "18m": 2.12}
+
+# Options pour la structure (pour le selectbox)
+STRUCTURE_OPTIONS = {
+    "Type A (Béton armé/acier, portée < 10m)": "A",
+    "Type B (Acier/précontraint, portée 10-15m)": "B",
+}
+
+# Coefficients de franchise basés sur les images
+FRANCHISE_COEF = {
+    "Normale (x1)": 1.0,
+    "Multipliée par 2 (Rabais 7,5%)": 0.925,
+    "Multipliée par 5 (Rabais 15%)": 0.85,
+    "Multipliée par 10 (Rabais 25%)": 0.75,
+    "Divisée par 2 (Augmentation 25%)": 1.25,
+}
+
+# Paramètres RC (Taux / Minimum)
+RC_PARAMS = {
+    "Bâtiment": {"pct": 0.15, "min": 0.35},
+    "Assainissement": {"pct": 0.20, "min": 0.40},
+    "Route": {"pct": 0.20, "min": 0.40},
+}
+
+# Suppléments RC (basés sur les images)
+RC_SUPPLEMENTS = {
+    "trafic": {
+        "Non applicable": 1.0,
+        "Trafic faible (+15%)": 1.15,
+        "Trafic moyen (+30%)": 1.30,
+        "Trafic intense (+60%)": 1.60,
+    },
+    "proximite": {
+        "Non applicable": 1.0,
+        "< 50m (non mitoyen) (+30%)": 1.30,
+        "de 50 à 100 m (+10%)": 1.10,
+        "de 100 à 200 m (+5%)": 1.05,
+    },
+}
+
+# =========================================================
+# BARÈMES INSTALLATIONS ET ÉQUIPEMENTS DE CHANTIER (A21, A22)
+# =========================================================
+
+# Taux annuels pour grues à tour (en ‰)
+TARIFS_GRUES_TOUR = {
+    "< 30M": {
+        "Classe 1": 8.5,
+        "Classe 2": 11.05,
+        "Classe 3": 13.06,
+    },
+    "> 30M": {
+        "Classe 1": 10.2,
+        "Classe 2": 12.75,
+        "Classe 3": 15.3,
+    }
+}
+
+# Taux annuels pour engins mobiles (en ‰)
+TARIFS_ENGINS = {
+    "Grue automobile": {
+        "Classe 1": 12.75,
+        "Classe 2": 17.0,
+        "Classe 3": 21.25,
+    },
+    "Bulldozers, niveleuses, scrapers": {
+        "Classe 1": 8.5,
+        "Classe 2": 12.75,
+        "Classe 3": 17.0,
+    },
+    "Chargeurs, dumpers": {
+        "Classe 1": 8.5,
+        "Classe 2": 12.75,
+        "Classe 3": 17.0,
+    },
+    "Compacteurs vibrants": {
+        "Classe 1": 8.5,
+        "Classe 2": 10.2,
+        "Classe 3": 12.75,
+    },
+    "Sonnettes / extracteurs de pieux": {
+        "Classe 1": 10.2,
+        "Classe 2": 12.75,
+        "Classe 3": 15.3,
+    },
+    "Rouleaux compresseurs": {
+        "Classe 1": 8.5,
+        "Classe 2": 10.2,
+        "Classe 3": 12.75,
+    },
+    "Locomotives de chantier": {
+        "Classe 1": 5.1,
+        "Classe 2": 6.8,
+        "Classe 3": 8.5,
+    },
+}
+
+# Taux pour baraquements provisoires (en ‰)
+TARIFS_BARAQUEMENTS = {
+    "Baraquement de stockage": 4.5,
+    "Bureaux provisoires de chantier": 4.0,
+}
+
+# Coefficients de durée (% du taux annuel)
+COEF_DUREE_EQUIPEMENTS = {
+    1: 0.45,
+    2: 0.50,
+    3: 0.55,
+    4: 0.60,
+    5: 0.65,
+    6: 0.70,
+    7: 0.75,
+    8: 0.80,
+    9: 0.85,
+    10: 0.90,
+    11: 0.95,
+    12: 1.00,
+}
+
+# Rabais franchise pour équipements (franchise supérieure à 10% mini 500K)
+RABAIS_FRANCHISE_EQUIPEMENTS = {
+    "10% mini 500 000 FCFA (standard)": 1.0,
+    "10% mini 1 000 000 FCFA (Rabais 5%)": 0.95,
+    "10% mini 2 000 000 FCFA (Rabais 10%)": 0.90,
+    "10% mini 5 000 000 FCFA (Rabais 15%)": 0.85,
+    "10% mini 10 000 000 FCFA (Rabais 25%)": 0.75,
+    "Franchise divisée par 2 (Majoration 25%)": 1.25,
+}
+
+# Modalités des équipements (ordre de la liste de saisie)
+TYPES_EQUIPEMENTS = ["Grue à tour", *TARIFS_ENGINS, *TARIFS_BARAQUEMENTS]
+CLASSES_EQUIPEMENTS = ["Classe 1", "Classe 2", "Classe 3"]
+HAUTEURS_GRUE = list(TARIFS_GRUES_TOUR.keys())
+
+# Accessoires (part de la prime nette) et taxes (part de la prime nette et des accessoires)
+TAUX_ACCESSOIRES = 0.06
+TAUX_TAXES = 0.145
+
+# =========================================================
+# VERSIONS DES BARÈMES
+# =========================================================
+
+@dataclass(frozen=True, eq=False)
+class Baremes:
+    """
+    Une version des barèmes, en vigueur du `debut` à la `fin` (incluse ;
+    None : sans limite). Les modalités (clés des tables) sont celles des
+    constantes ci-dessus, seules les valeurs changent d'une version à
+    l'autre (voir baremes.py). Comparée par identité : les caches (cube de
+    taux) sont propres à chaque version.
+    """
+    version: str
+    debut: datetime.date | None = None
+    fin: datetime.date | None = None
+    tarifs_batiment: dict = field(default_factory=lambda: TARIFS_BATIMENT)
+    tarif_assainissement: dict = field(default_factory=lambda: TARIF_ASSAINISSEMENT)
+    tarif_routes: dict = field(default_factory=lambda: TARIF_ROUTES)
+    franchise_coef: dict = field(default_factory=lambda: FRANCHISE_COEF)
+    rc_params: dict = field(default_factory=lambda: RC_PARAMS)
+    rc_supplements: dict = field(default_factory=lambda: RC_SUPPLEMENTS)
+    tarifs_grues_tour: dict = field(default_factory=lambda: TARIFS_GRUES_TOUR)
+    tarifs_engins: dict = field(default_factory=lambda: TARIFS_ENGINS)
+    tarifs_baraquements: dict = field(default_factory=lambda: TARIFS_BARAQUEMENTS)
+    coef_duree_equipements: dict = field(default_factory=lambda: COEF_DUREE_EQUIPEMENTS)
+    rabais_franchise_equipements: dict = field(default_factory=lambda: RABAIS_FRANCHISE_EQUIPEMENTS)
+    taux_accessoires: float = TAUX_ACCESSOIRES
+    taux_taxes: float = TAUX_TAXES
+
+# Barèmes écrits ci-dessus : version par défaut des fonctions de ce module
+BAREMES_REFERENCE = Baremes("reference")
+
+# =========================================================
+# FONCTIONS
+# =========================================================
+
+def get_taux_base(type_travaux, duree, usage_key, structure, baremes=BAREMES_REFERENCE):
+    """Retourne le taux de base (‰) en fonction du type de travaux"""
+    duree_key = "18m" if duree > 12 else "12m"
+    
+    if type_travaux == "Bâtiment":
+        return baremes.tarifs_batiment[usage_key][structure][duree_key]
+    elif type_travaux == "Assainissement":
+        return baremes.tarif_assainissement[duree_key]
+    elif type_travaux == "Route":
+        return baremes.tarif_routes[duree_key]
+    else:
+        return 0.0
+
+def calc_prime(montant, taux):
+    """Calcule la prime à partir du montant (FCFA) et du taux (‰)"""
+    return montant * (taux / 1000)
+
+def calc_taux_rc(type_travaux, taux_travaux, trafic_key, prox_key, rc_croisee, baremes=BAREMES_REFERENCE):
+    """Calcule le taux RC final (‰)"""
+    params = baremes.rc_params[type_travaux]
+    taux_base_rc = max(taux_travaux * params["pct"], params["min"])
+    
+    coef_trafic = baremes.rc_supplements["trafic"][trafic_key]
+    coef_prox = baremes.rc_supplements["proximite"][prox_key]
+    taux_rc = taux_base_rc * coef_trafic * coef_prox
+    
+    if rc_croisee:
+        taux_rc *= 1.10
+    
+    return taux_rc
+
+def calc_accessoires(prime_nette, baremes=BAREMES_REFERENCE):
+    """Calcule les accessoires (6% de la prime nette dans les barèmes de référence)"""
+    return prime_nette * baremes.taux_accessoires
+
+def calc_taxes(prime_nette, accessoires, baremes=BAREMES_REFERENCE):
+    """Calcule les taxes (14.5% de (prime nette + accessoires) dans les barèmes de référence)"""
+    return (prime_nette + accessoires) * baremes.taux_taxes
+
+
+def calc_taux_equipement(eq, baremes=BAREMES_REFERENCE):
+    """Calcule le taux final (‰) d'un équipement A21/A22 (durée et franchise appliquées)"""
+    # Déterminer le taux annuel
+    if eq['type'] == "Grue à tour":
+        taux_annuel = baremes.tarifs_grues_tour[eq['hauteur']][eq['classe']]
+    elif eq['type'] in baremes.tarifs_engins:
+        taux_annuel = baremes.tarifs_engins[eq['type']][eq['classe']]
+    else:
+        taux_annuel = baremes.tarifs_baraquements[eq['type']]
+    
+    # Appliquer le coefficient de durée
+    coef_duree = baremes.coef_duree_equipements[eq['duree']]
+    taux_ajuste = taux_annuel * coef_duree
+    
+    # Appliquer le rabais franchise
+    rabais_franchise = baremes.rabais_franchise_equipements[eq['franchise']]
+    return taux_ajuste * rabais_franchise
+
+def calc_prime_equipements(equipements, baremes=BAREMES_REFERENCE):
+    """Calcule la prime totale des équipements et installations (A21/A22)"""
+    prime_totale = 0
+    for eq in equipements:
+        prime_totale += calc_prime(eq['valeur'], calc_taux_equipement(eq, baremes))
+    return prime_totale
+
+# =========================================================
+# CUBE DE TAUX (barèmes précompilés)
+# =========================================================
+
+# Modalités de chaque axe du cube : la position dans la liste est le code entier
+AXES_CUBE = {
+    "type_travaux": list(RC_PARAMS.keys()),
+    "usage": list(TARIFS_BATIMENT.keys()),
+    "structure": list(STRUCTURE_OPTIONS.values()),
+    "duree": ["12m", "18m"],
+    "franchise": list(FRANCHISE_COEF.keys()),
+    "deblais": [False, True],
+    "trafic": list(RC_SUPPLEMENTS["trafic"].keys()),
+    "proximite": list(RC_SUPPLEMENTS["proximite"].keys()),
+    "rc_croisee": [False, True],
+}
+
+# Taux (‰) stockés dans la dernière dimension du cube
+TAUX_CUBE = ["base_franchise", "travaux", "rc", "existants"]
+TAUX_BASE_FRANCHISE, TAUX_TRAVAUX, TAUX_RC, TAUX_EXISTANTS = range(len(TAUX_CUBE))
+
+# Codes entiers par modalité, pour les recherches scalaires
+CODES_CUBE = {axe: {v: i for i, v in enumerate(modalites)} for axe, modalites in AXES_CUBE.items()}
+
+FORME_CUBE = tuple(len(modalites) for modalites in AXES_CUBE.values())
+
+@lru_cache(maxsize=None)
+def get_cube(baremes=BAREMES_REFERENCE):
+    """
+    Compile toutes les combinaisons des barèmes (une version, voir Baremes) en
+    un tableau dense de taux (‰).
+
+    Le cube est indexé par les codes de AXES_CUBE puis par TAUX_CUBE. Il est
+    rempli avec get_taux_base/calc_taux_rc : les taux sont donc identiques au bit
+    près à ceux du calcul direct. Pour les travaux hors bâtiment, usage et
+    structure n'ont pas d'effet (toutes les cases portent le même taux).
+    """
+    cube = np.zeros(FORME_CUBE + (len(TAUX_CUBE),))
+    for idx in np.ndindex(*FORME_CUBE):
+        (type_travaux, usage_key, structure, duree_key, franchise_key,
+         deblais, trafic_key, prox_key, rc_croisee) = (
+            modalites[i] for modalites, i in zip(AXES_CUBE.values(), idx)
+        )
+        taux_base = get_taux_base(type_travaux, 18 if duree_key == "18m" else 12, usage_key, structure, baremes)
+        taux_base_franchise = taux_base * baremes.franchise_coef[franchise_key]
+        taux_net_travaux = taux_base_franchise
+        if deblais:
+            taux_net_travaux += 0.15
+        cube[idx] = (
+            taux_base_franchise,
+            taux_net_travaux,
+            calc_taux_rc(type_travaux, taux_net_travaux, trafic_key, prox_key, rc_croisee, baremes),
+            taux_net_travaux * 0.5,
+        )
+    cube.setflags(write=False)
+    return cube
+
+def indice_cube(type_travaux, duree, usage_key, structure, franchise_key, deblais,
+                trafic_key="Non applicable", prox_key="Non applicable", rc_croisee=False):
+    """Retourne l'indice (tuple de codes) d'une combinaison dans le cube de taux"""
+    if type_travaux != "Bâtiment":
+        # Usage et structure sans effet : première modalité par convention
+        usage_key = AXES_CUBE["usage"][0]
+        structure = AXES_CUBE["structure"][0]
+    return (
+        CODES_CUBE["type_travaux"][type_travaux],
+        CODES_CUBE["usage"][usage_key],
+        CODES_CUBE["structure"][structure],
+        1 if duree > 12 else 0,
+        CODES_CUBE["franchise"][franchise_key],
+        CODES_CUBE["deblais"][bool(deblais)],
+        CODES_CUBE["trafic"][trafic_key],
+        CODES_CUBE["proximite"][prox_key],
+        CODES_CUBE["rc_croisee"][bool(rc_croisee)],
+    )
+
+# =========================================================
+# VALEURS SAISIES (portefeuilles, fichiers de lot, API)
+# =========================================================
+
+# Bornes des saisies (celles du formulaire) : durée en mois, montants en FCFA.
+# MONTANT_MAX garde les primes et leurs sommes sur 63 bits (voir montants.py).
+DUREE_MIN, DUREE_MAX = 1, 60
+MONTANT_MAX = 10 ** 15
+
+# Booléens écrits en texte
+VALEURS_VRAIES = {"1", "true", "vrai", "oui", "o", "x", "yes", "y"}
+VALEURS_FAUSSES = {"", "0", "false", "faux", "non", "n", "no", "none", "nan"}
+
+def lire_booleen(valeur):
+    """
+    Booléen saisi : True/False, 1/0 ou texte (VALEURS_VRAIES, VALEURS_FAUSSES) ;
+    None pour une valeur absente (None, NaN). ValueError sinon
+    """
+    if isinstance(valeur, (bool, np.bool_)):
+        return bool(valeur)
+    if valeur is None or (isinstance(valeur, (float, np.floating)) and np.isnan(valeur)):
+        return None
+    if isinstance(valeur, (int, float, np.number)) and valeur in (0, 1):
+        return bool(valeur)
+    texte = str(valeur).strip().lower()
+    if texte in VALEURS_VRAIES:
+        return True
+    if texte in VALEURS_FAUSSES:
+        return False
+    raise ValueError(f"booléen attendu (oui/non, vrai/faux, 1/0), reçu {valeur!r}")
+
+# =========================================================
+# MOTEUR DE COTATION
+# =========================================================
+
+@dataclass
+class QuoteInput:
+    """Paramètres de tarification d'un chantier (équivalent du formulaire de saisie)"""
+    type_travaux: str = "Bâtiment"
+    montant: float = 0
+    duree: int = 12
+    usage_key: str | None = "logement_commercial"
+    structure: str | None = "A"
+    franchise_key: str = "Normale (x1)"
+    # Extensions standards
+    ext_maintenance: bool = True
+    ext_deblais: bool = True
+    # A17 - Responsabilité civile
+    ext_rc: bool = False
+    rc_suppl_trafic_key: str = "Non applicable"
+    rc_suppl_prox_key: str = "Non applicable"
+    ext_rc_croisee: bool = False
+    # A20 - Dommages aux existants
+    ext_existants: bool = False
+    # A21/A22 - Liste de dicts (type, valeur, duree, hauteur, classe, franchise)
+    # ou flotte en colonnes (voir flotte.py)
+    equipements: list = field(default_factory=list)
+    # Prime A21/A22 déjà calculée (flotte importée) ; None : calculée depuis equipements
+    prime_equipements: float | None = None
+    # Primes saisies des extensions nécessitant validation DT
+    prime_maint_etendue: float = 0.0
+    prime_maint_const: float = 0.0
+    prime_materiel: float = 0.0
+    prime_baraquement: float = 0.0
+    prime_gemp: float = 0.0
+    # Tarification manuelle (hors barème)
+    mode_manuel: bool = False
+    prime_nette_manuelle: float = 0.0
+    accessoires_manuels: float = 0.0
+
+@dataclass
+class QuoteResult:
+    """Décomposition complète de la prime calculée"""
+    taux_net_travaux: float = 0
+    taux_rc: float = 0
+    taux_existants: float = 0
+    prime_travaux: float = 0
+    prime_maintenance: float = 0
+    prime_rc: float = 0
+    prime_existants: float = 0
+    prime_equipements: float = 0
+    nb_equipements: int = 0
+    prime_maint_etendue: float = 0
+    prime_maint_const: float = 0
+    prime_materiel: float = 0
+    prime_baraquement: float = 0
+    prime_gemp: float = 0
+    prime_extensions_dt: float = 0
+    prime_nette: float = 0
+    accessoires: float = 0
+    taxes: float = 0
+    prime_ttc: float = 0
+
+def price_quote(q, baremes=BAREMES_REFERENCE):
+    """
+    Calcule la prime d'un chantier (QuoteInput) sous une version des barèmes
+    (voir baremes.py) et retourne sa décomposition (QuoteResult)
+    """
+    if q.mode_manuel:
+        # MODE MANUEL
+        prime_nette = q.prime_nette_manuelle
+        accessoires = q.accessoires_manuels
+        taxes = calc_taxes(prime_nette, accessoires, baremes)
+        return QuoteResult(
+            prime_nette=prime_nette,
+            accessoires=accessoires,
+            taxes=taxes,
+            prime_ttc=prime_nette + accessoires + taxes,
+        )
+    
+    # MODE AUTOMATIQUE
+    # 1-3. Taux de base, ajustement franchise et taux net travaux (cube précompilé)
+    taux = get_cube(baremes)[indice_cube(
+        q.type_travaux, q.duree, q.usage_key, q.structure, q.franchise_key, q.ext_deblais,
+        q.rc_suppl_trafic_key, q.rc_suppl_prox_key, q.ext_rc_croisee
+    )]
+    taux_base_franchise = float(taux[TAUX_BASE_FRANCHISE])
+    taux_net_travaux = float(taux[TAUX_TRAVAUX])
+    
+    # 4. Prime TRAVAUX
+    prime_travaux = calc_prime(q.montant, taux_net_travaux)
+    
+    # 5. Prime MAINTENANCE
+    prime_maintenance = 0
+    if q.ext_maintenance:
+        prime_maintenance_base = calc_prime(q.montant, taux_base_franchise)
+        prime_maintenance = prime_maintenance_base * 0.10
+    
+    # 6. Prime RC
+    prime_rc = 0
+    taux_rc_final = 0
+    if q.ext_rc:
+        taux_rc_final = float(taux[TAUX_RC])
+        prime_rc = calc_prime(q.montant, taux_rc_final)
+    
+    # 7. Prime EXISTANTS
+    prime_existants = 0
+    taux_existants = 0
+    if q.ext_existants:
+        valeur_existants = 0.2 * q.montant
+        taux_existants = float(taux[TAUX_EXISTANTS])
+        prime_existants = calc_prime(valeur_existants, taux_existants)
+    
+    # 8. Équipements A21/A22
+    if q.prime_equipements is not None:
+        prime_equipements = q.prime_equipements
+    else:
+        prime_equipements = calc_prime_equipements(q.equipements, baremes)
+    
+    # 9. Totaux + Primes extensions DT
+    prime_extensions_dt = q.prime_maint_etendue + q.prime_maint_const + q.prime_materiel + q.prime_baraquement + q.prime_gemp
+    prime_nette = prime_travaux + prime_maintenance + prime_rc + prime_existants + prime_equipements + prime_extensions_dt
+    accessoires = calc_accessoires(prime_nette, baremes)
+    taxes = calc_taxes(prime_nette, accessoires, baremes)
+    
+    return QuoteResult(
+        taux_net_travaux=taux_net_travaux,
+        taux_rc=taux_rc_final,
+        taux_existants=taux_existants,
+        prime_travaux=prime_travaux,
+        prime_maintenance=prime_maintenance,
+        prime_rc=prime_rc,
+        prime_existants=prime_existants,
+        prime_equipements=prime_equipements,
+        nb_equipements=len(q.equipements),
+        prime_maint_etendue=q.prime_maint_etendue,
+        prime_maint_const=q.prime_maint_const,
+        prime_materiel=q.prime_materiel,
+        prime_baraquement=q.prime_baraquement,
+        prime_gemp=q.prime_gemp,
+        prime_extensions_dt=prime_extensions_dt,
+        prime_nette=prime_nette,
+        accessoires=accessoires,
+        taxes=taxes,
+        prime_ttc=prime_nette + accessoires + taxes,
+    )
+
+def empreinte_quote(q):
+    """
+    Empreinte stable des paramètres de tarification (clé des caches de
+    résultats). Quand prime_equipements est fournie, les équipements
+    n'interviennent que par leur nombre.
+    """
+    parametres = dict(vars(q))
+    if q.prime_equipements is not None:
+        parametres["equipements"] = len(q.equipements)
+    else:
+        parametres["equipements"] = list(q.equipements)
+    contenu = json.dumps(parametres, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(contenu.encode("utf-8")).hexdigest()
+
+def decomposition(q, r):
+    """
+    Retourne les lignes du tableau "Décomposition de la prime" sous forme de
+    tuples (garantie, montant, taux en ‰ ou None).
+    """
+    lignes = [("Prime Dommages à l'ouvrage (Travaux)", r.prime_travaux, r.taux_net_travaux)]
+    
+    if q.ext_maintenance:
+        lignes.append(("Prime Maintenance Visite (A05)", r.prime_maintenance, None))
+    if q.ext_rc:
+        lignes.append(("Prime Responsabilité Civile (A17)", r.prime_rc, r.taux_rc))
+    if q.ext_existants:
+        lignes.append(("Prime Dommages aux Existants (A20)", r.prime_existants, r.taux_existants))
+    if r.prime_equipements > 0:
+        lignes.append((f"Prime Équipements et Installations (A21/A22) - {r.nb_equipements} équipement(s)", r.prime_equipements, None))
+    
+    # Extensions DT
+    if r.prime_maint_etendue > 0:
+        lignes.append(("Prime Maintenance étendue (A06)", r.prime_maint_etendue, None))
+    if r.prime_maint_const > 0:
+        lignes.append(("Prime Maintenance constructeur (A07)", r.prime_maint_const, None))
+    if r.prime_materiel > 0:
+        lignes.append(("Prime Matériel et installations (A21)", r.prime_materiel, None))
+    if r.prime_baraquement > 0:
+        lignes.append(("Prime Baraquements provisoires (A22)", r.prime_baraquement, None))
+    if r.prime_gemp > 0:
+        lignes.append(("Prime Garantie Environnement (FANAF01)", r.prime_gemp, None))
+    
+    return lignes
@@ -0,0 +1,102 @@
+"""
+Régression : une demande invalide est refusée (400 sur /cotation, ligne
+"erreur" sur /cotations) sans casser la réponse ni les autres lignes.
+
+    python -m pytest -q tests
+"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from montants import fcfa  # noqa: E402
+from serveur_cotation import EXEMPLE_QUOTE, ServeurCotation  # noqa: E402
+
+MONTANTS_INVALIDES = ["abc", None, float("inf"), float("nan"), "x"]
+
+
+async def _requete(port, chemin, corps):
+    lecteur, ecrivain = await asyncio.open_connection("127.0.0.1", port)
+    ecrivain.write(
+        f"POST {chemin} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(corps)}\r\nConnection: close\r\n\r\n".encode()
+        + corps
+    )
+    await ecrivain.drain()
+    reponse = await lecteur.read()
+    ecrivain.close()
+    entete, _, contenu = reponse.partition(b"\r\n\r\n")
+    statut = int(entete.split()[1])
+    if b"transfer-encoding: chunked" in entete.lower():
+        morceaux = b""
+        while True:
+            taille, _, contenu = contenu.partition(b"\r\n")
+            taille = int(taille, 16)
+            if not taille:
+                break
+            morceaux, contenu = morceaux + contenu[:taille], contenu[taille + 2:]
+        contenu = morceaux
+    return statut, reponse, contenu
+
+
+def _servir(*requetes):
+    async def scenario():
+        serveur = ServeurCotation(workers=1)
+        await serveur.demarrer(port=0)
+        port = serveur._serveur.sockets[0].getsockname()[1]
+        try:
+            return [await _requete(port, chemin, corps) for chemin, corps in requetes]
+        finally:
+            await serveur.arreter()
+
+    return asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("montant", MONTANTS_INVALIDES)
+def test_fcfa_montant_invalide(montant):
+    with pytest.raises(ValueError):
+        fcfa(montant)
+
+
+@pytest.mark.parametrize("champ, valeur", [("montant", "abc"), ("prime_gemp", "x"), ("montant", None)])
+def test_cotation_invalide_400(champ, valeur):
+    corps = json.dumps({**EXEMPLE_QUOTE, champ: valeur}).encode()
+    [(statut, _, contenu)] = _servir(("/cotation", corps))
+    assert statut == 400
+    assert "erreur" in json.loads(contenu)
+
+
+def test_cotations_ligne_invalide():
+    lignes = [EXEMPLE_QUOTE, {**EXEMPLE_QUOTE, "prime_gemp": "x"}, {**EXEMPLE_QUOTE, "montant": None}, EXEMPLE_QUOTE]
+    corps = b"\n".join(json.dumps(ligne).encode() for ligne in lignes)
+    [(statut, reponse, contenu)] = _servir(("/cotations", corps))
+    assert statut == 200
+    assert reponse.count(b"HTTP/1.1") == 1
+    resultats = [json.loads(ligne) for ligne in contenu.splitlines()]
+    assert [r["indice"] for r in resultats] == [0, 1, 2, 3]
+    assert "erreur" in resultats[1] and "erreur" in resultats[2]
+    assert resultats[0]["prime_ttc"] == resultats[3]["prime_ttc"] > 0
+
+
+@pytest.mark.parametrize("champ, valeur", [("ext_rc", "peut-être"), ("ext_rc", [1]), ("montant", True),
+                                           ("duree", 1.5), ("type_travaux", 3), ("equipements", [1]),
+                                           ("montant", -5), ("montant", 1e300), ("prime_gemp", -1),
+                                           ("duree", 0), ("duree", 61)])
+def test_cotation_type_invalide_400(champ, valeur):
+    corps = json.dumps({**EXEMPLE_QUOTE, champ: valeur}).encode()
+    [(statut, _, contenu)] = _servir(("/cotation", corps))
+    assert statut == 400
+    assert champ in json.loads(contenu)["erreur"]
+
+
+def test_cotation_booleen_texte():
+    sans_rc = {**EXEMPLE_QUOTE, "ext_rc": False}
+    [(_, _, attendu), (statut, _, contenu)] = _servir(
+        ("/cotation", json.dumps(sans_rc).encode()),
+        ("/cotation", json.dumps({**EXEMPLE_QUOTE, "ext_rc": "false"}).encode()),
+    )
+    assert statut == 200
+    assert json.loads(contenu)["prime_ttc"] == json.loads(attendu)["prime_ttc"]
@@ -0,0 +1,141 @@
+"""
+Régression : les chemins vectorisés (portefeuille, flotte) donnent, ligne par
+ligne, la même cotation que les chemins scalaires, sous une ou plusieurs
+versions des barèmes.
+
+    python -m pytest -q tests
+"""
+import datetime
+import os
+import sys
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banc_performance import equipements_aleatoires, portefeuille_aleatoire, versions_annuelles  # noqa: E402
+from baremes import VersionsTarif  # noqa: E402
+from flotte import Flotte, prime_flotte, prime_flotte_fcfa, tarifer_flotte  # noqa: E402
+from montants import (  # noqa: E402
+    appliquer_taux, calc_prime_equipements_fcfa, fcfa, price_quote_fcfa, taux_equipement_fcfa,
+)
+from portefeuille import price_portfolio, price_portfolio_fcfa  # noqa: E402
+from tarification import BAREMES_REFERENCE, QuoteInput, calc_prime_equipements, price_quote  # noqa: E402
+
+NB_LIGNES = 300
+
+# Colonne du portefeuille -> champ de QuoteInput (les autres ont le même nom)
+CHAMPS_QUOTE = {
+    "usage": "usage_key",
+    "franchise": "franchise_key",
+    "trafic": "rc_suppl_trafic_key",
+    "proximite": "rc_suppl_prox_key",
+    "rc_croisee": "ext_rc_croisee",
+}
+
+CHAMPS_RESULTAT = [
+    "taux_net_travaux", "taux_rc", "taux_existants", "prime_travaux", "prime_maintenance",
+    "prime_rc", "prime_existants", "prime_equipements", "prime_extensions_dt",
+    "prime_nette", "accessoires", "taxes", "prime_ttc",
+]
+
+PRIMES_DT = ["prime_maint_etendue", "prime_maint_const", "prime_materiel", "prime_baraquement", "prime_gemp"]
+
+
+def _portefeuille(graine, dates=None):
+    """Portefeuille aléatoire avec toutes les colonnes optionnelles renseignées"""
+    rng = np.random.default_rng(graine)
+    df = portefeuille_aleatoire(NB_LIGNES, graine)
+    df["ext_maintenance"] = rng.random(NB_LIGNES) < 0.7
+    df["ext_deblais"] = rng.random(NB_LIGNES) < 0.7
+    for colonne in ["prime_equipements"] + PRIMES_DT:
+        df[colonne] = np.where(rng.random(NB_LIGNES) < 0.3, rng.integers(0, 50_000_000, NB_LIGNES), 0).astype(float)
+    if dates is not None:
+        df["date_cotation"] = dates
+    return df
+
+
+def _quote(ligne):
+    """QuoteInput équivalent à une ligne du portefeuille"""
+    valeurs = {CHAMPS_QUOTE.get(nom, nom): valeur for nom, valeur in ligne.items() if nom != "date_cotation"}
+    valeurs["duree"] = int(valeurs["duree"])
+    return QuoteInput(**valeurs)
+
+
+def _versions():
+    """Versions annuelles, la dernière avec d'autres taux d'accessoires et de taxes et une fin explicite"""
+    versions = versions_annuelles(3).versions
+    versions.append(replace(
+        versions[-1], version="2023", debut=datetime.date(2023, 1, 1), fin=datetime.date(2023, 12, 31),
+        taux_accessoires=versions[-1].taux_accessoires + 0.01, taux_taxes=0.18,
+    ))
+    return VersionsTarif(versions)
+
+
+def _comparer(resultat, attendus):
+    for nom in CHAMPS_RESULTAT:
+        assert resultat[nom].tolist() == [getattr(r, nom) for r in attendus], nom
+
+
+@pytest.mark.parametrize("graine", [0, 1, 2])
+def test_portefeuille_egal_price_quote(graine):
+    df = _portefeuille(graine)
+    attendus = [price_quote(_quote(ligne), BAREMES_REFERENCE) for ligne in df.to_dict("records")]
+    _comparer(price_portfolio(df, VersionsTarif([BAREMES_REFERENCE])), attendus)
+
+
+@pytest.mark.parametrize("graine", [0, 1, 2])
+def test_portefeuille_fcfa_egal_price_quote_fcfa(graine):
+    df = _portefeuille(graine)
+    attendus = [price_quote_fcfa(_quote(ligne), BAREMES_REFERENCE) for ligne in df.to_dict("records")]
+    _comparer(price_portfolio_fcfa(df, VersionsTarif([BAREMES_REFERENCE])), attendus)
+
+
+def test_indices_versions():
+    versions = _versions()
+    rng = np.random.default_rng(3)
+    dates = np.datetime64("2019-06-01") + rng.integers(0, 365 * 6, 2000)
+    attendues = []
+    for date in dates.astype(datetime.date):
+        en_vigueur = [
+            k for k, b in enumerate(versions.versions)
+            if (b.debut or datetime.date.min) <= date
+            and date < (versions.versions[k + 1].debut if k + 1 < len(versions) else datetime.date.max)
+            and (b.fin is None or date <= b.fin)
+        ]
+        attendues.append(en_vigueur[0] if en_vigueur else -1)
+    assert versions.indices(dates).tolist() == attendues
+    assert -1 in attendues and len(set(attendues)) == len(versions) + 1
+
+
+@pytest.mark.parametrize("tarifer, coter", [(price_portfolio, price_quote), (price_portfolio_fcfa, price_quote_fcfa)])
+def test_portefeuille_date(tarifer, coter):
+    versions = _versions()
+    rng = np.random.default_rng(4)
+    debut, fin = np.datetime64("2019-06-01"), np.datetime64("2024-01-01")
+    dates = (debut + rng.integers(0, (fin - debut).astype(int), NB_LIGNES)).astype(datetime.date)
+    df = _portefeuille(5, [d.strftime("%d.%m.%Y") if k % 2 else d.isoformat() for k, d in enumerate(dates)])
+    resultat = tarifer(df, versions)
+    baremes = [versions.version_au(d) for d in dates]
+    assert resultat["version_tarif"].tolist() == [b.version for b in baremes]
+    _comparer(resultat, [coter(_quote(ligne), b) for ligne, b in zip(df.to_dict("records"), baremes)])
+
+
+def test_portefeuille_date_sans_version():
+    df = _portefeuille(6, "15.06.2024")
+    with pytest.raises(ValueError, match="2024-06-15"):
+        price_portfolio_fcfa(df, _versions())
+
+
+@pytest.mark.parametrize("n", [1, 50, 500])
+def test_flotte_egale_equipements(n):
+    equipements = equipements_aleatoires(n, graine=n)
+    flotte = Flotte.depuis_dataframe(pd.DataFrame(equipements))
+    assert prime_flotte_fcfa(flotte) == calc_prime_equipements_fcfa(equipements)
+    assert prime_flotte(flotte) == calc_prime_equipements(equipements)
+    assert tarifer_flotte(flotte)["prime"].tolist() == [
+        appliquer_taux(fcfa(eq["valeur"]), taux_equipement_fcfa(eq)) for eq in equipements
+    ]